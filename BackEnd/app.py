@@ -1,95 +1,332 @@
+import atexit
 import os
-import json
+import threading
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from flask_socketio import SocketIO
-from modules.Combined_Match import run_similarity_analysis
+from flask_socketio import SocketIO, emit, join_room
+from modules.Combined_Match import analyze_similarity, curves_from_points, MATCHER_PARAMS
+from modules.Dataset_Registry import DatasetRegistry
+from modules.Smoothing import SmoothingEngine
+from modules.Job_Manager import JobManager
+from modules.Result_Cache import ResultCache, curves_digest, query_key
+from modules.Worker_Pool import CurvePool
+from modules.Result_Table import SINGLE_PRECISION_VALUES, SORT_KEYS, expand_row, query_rows
+from modules.Response_Encoding import payload_response
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})
 socketio = SocketIO(app, cors_allowed_origins="*")  # Allow cross-origin requests
 
-table_data_path = 'static/Data/tableData.json'  # Path to save tableData.json
-selected_smoothed_data_path = 'static/Data/selectedSmoothedData.json'  # Path to save selectedSmoothedData
-drawing_file_path = 'static/Data/drawing.json'
-smoothed_data_file_path = 'static/Data/selectedSmoothedData.json'
-output_file = 'static/Data/tableData.json'
+# Queries are job-scoped and kept in memory, so concurrent analysts don't overwrite each other
+jobs = JobManager()
 
-smoothness_value = 0.0
+# Results of identical queries are reused; set VIS4NFAD_CACHE_DIR to keep them across restarts
+result_cache = ResultCache(disk_dir=os.environ.get('VIS4NFAD_CACHE_DIR'))
 
-# Ensure the static/Data directory exists
-data_folder = os.path.join(app.static_folder, 'Data')
-if not os.path.exists(data_folder):
-    os.makedirs(data_folder)
+# Loaded by create_app, in the serving process only: worker processes spawned by the pool
+# re-import this module but attach to the dataset through shared memory instead
+dataset = None
+smoothing = None
+workers = None
+_startup_lock = threading.Lock()
+
+def create_app():
+    """
+    Load the dataset, precompute its smoothing ladder and set up the worker pool, once;
+    returns the app. Runs before the first request if the server did not call it.
+    """
+    global dataset, smoothing, workers
+    with _startup_lock:
+        if dataset is not None:
+            return app
+        # Curves are loaded once so queries can reference them by name. A columnar store written
+        # by ChangeDateToNpy.py (static/Data/hcnData) is memory-mapped and preferred over the JSON
+        default_store = os.path.join(app.static_folder, 'Data', 'hcnData')
+        default_dataset = default_store if os.path.isdir(default_store) else os.path.join(app.static_folder, 'Data', 'hcnData.json')
+        loaded = DatasetRegistry.load(os.environ.get('VIS4NFAD_DATASET', default_dataset))
+
+        # Smoothing runs server-side with the frontend's kernel; the smoothness ladder is precomputed
+        smoothing = SmoothingEngine(loaded)
+        smoothing.precompute()
+
+        # Named curves are matched across worker processes that share the dataset and its smoothing
+        # ladder; VIS4NFAD_WORKERS sets their number (default: one per core, 1 to match in-process)
+        n_workers = int(os.environ.get('VIS4NFAD_WORKERS', os.cpu_count() or 1))
+        workers = CurvePool(loaded, processes=n_workers, smoothing=smoothing) if n_workers > 1 else None
+        if workers is not None:
+            atexit.register(workers.close)
+            workers.start()
+        dataset = loaded
+    return app
+
+@app.before_request
+def ensure_started():
+    create_app()
 
 @app.route('/')
 def hello_world():
     return 'Hello World!'
 
-@app.route('/submit', methods=['POST'])
-def submit_drawing():
+@app.route('/jobs', methods=['POST'])
+def submit_job():
     try:
-        data = request.get_json()
+        # Queries are submitted as JSON; binary columns are only used for responses (see Response_Encoding)
+        data = request.get_json(silent=True)
         if not data:
             return jsonify({"error": "No data received"}), 400
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
 
         drawing = data.get('drawing')
         if not drawing:
             return jsonify({"error": "No drawing data provided"}), 400
 
-        filename = os.path.join(data_folder, 'drawing.json')
+        try:
+            smoothness = float(data.get('smoothness') or 0.0)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid smoothness", "details": repr(data.get('smoothness'))}), 400
+        if not 0.0 <= smoothness <= 1.0:
+            return jsonify({"error": "Smoothness must be between 0 and 1", "details": smoothness}), 400
+        curve_names = data.get('curves')
+        selected_smoothed_data = data.get('selectedSmoothedData')
 
-        # Save drawing data to file
-        with open(filename, 'w') as f:
-            json.dump(drawing, f)
-        print(f'Received drawing saved to {filename}')
+        # Curves are referenced by name and smoothed server-side; uploaded points are still accepted.
+        # Cached results are keyed by the data they came from: the dataset version, or a digest of the upload
+        curve_names_from_dataset = bool(curve_names)
+        if curve_names:
+            try:
+                curves = smoothing.curves(curve_names, smoothness)
+            except (KeyError, TypeError) as e:
+                return jsonify({"error": "Unknown curves", "details": str(e)}), 400
+            data_version = dataset.version
+        elif selected_smoothed_data:
+            try:
+                curve_names = [curve['name'] for curve in selected_smoothed_data]
+                curves = curves_from_points(selected_smoothed_data)
+            except (KeyError, IndexError, TypeError, ValueError) as e:
+                return jsonify({"error": "Invalid curves", "details": str(e)}), 400
+            data_version = curves_digest(curves)
+        else:
+            return jsonify({"error": "No curves provided"}), 400
 
-        return jsonify({"message": f"Drawing received and saved to {filename}"}), 200
-    except Exception as e:
-        import traceback
-        print("Exception occurred:")
-        print(traceback.format_exc())
-        return jsonify({"error": "Failed to process the drawing", "details": str(e)}), 500
+        # The key also checks the sketch; a job is only created for a query that is valid
+        try:
+            cache_key = query_key(drawing, curve_names, smoothness, MATCHER_PARAMS, data_version)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            return jsonify({"error": "Invalid drawing", "details": str(e)}), 400
 
-@app.route('/submit_smoothed_data', methods=['POST'])
-def submit_smoothed_data():
-    try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "No data received"}), 400
+        # A client's new, valid query supersedes (cancels) its queries still running
+        job = jobs.create(drawing, curves, smoothness, client=data.get('client'))
+        jobs.supersede(job)
 
-        selected_smoothed_data = data.get('selectedSmoothedData')
-        smoothness = data.get('smoothness')
+        cached_results = result_cache.get(cache_key)
+        if cached_results is not None:
+            jobs.finish(job, cached_results)
+            return jsonify({"message": "Job complete (cached)", "job_id": job.id, "status": job.status}), 200
 
-        # Save selectedSmoothedData to file
-        with open(selected_smoothed_data_path, 'w') as f:
-            json.dump(selected_smoothed_data, f)
+        def on_progress(job):
+            emit_job(job, 'progress_update', {'job_id': job.id, 'progress': job.progress})
 
-        global smoothness_value
-        smoothness_value = smoothness
+        # The best rows so far are streamed while the job runs, as numbered changes to what was last sent
+        def on_partial(rows):
+            update = job.topk.update(rows)
+            if update is not None:
+                emit_job(job, 'topk_update', {'job_id': job.id, **update})
 
         def run_analysis():
-            for progress in run_similarity_analysis(drawing_file_path, smoothed_data_file_path, output_file, smoothness_value):
-                socketio.emit('progress_update', {'progress': progress})
-            socketio.emit('processing_complete', {'message': 'Processing complete', 'status': 'complete'})
+            # Named curves stay in the dataset, so their rows only reference it and are expanded on demand
+            analysis = analyze_similarity(job.drawing, job.curves, job.smoothness, stats=job.stats, pool=workers,
+                                          expand=not curve_names_from_dataset, partial=on_partial, cancel=job.token)
+            jobs.run(job, analysis, on_progress)
+            if job.status == 'complete':
+                # A failure to cache (e.g. a full disk) must not hide the finished results from the client
+                try:
+                    result_cache.put(cache_key, job.results)
+                except Exception:
+                    import traceback
+                    print("Caching the results failed:")
+                    print(traceback.format_exc())
+                emit_job(job, 'processing_complete', {'job_id': job.id, 'message': 'Processing complete', 'status': 'complete'})
+            elif job.status == 'cancelled':
+                emit_job(job, 'processing_complete', {'job_id': job.id, 'message': 'Processing cancelled', 'status': 'cancelled'})
+            else:
+                emit_job(job, 'processing_complete', {'job_id': job.id, 'message': job.error, 'status': 'failed'})
 
         socketio.start_background_task(target=run_analysis)
 
-        return jsonify({"message": f"Smoothed data received and saved"}), 200
+        return jsonify({"message": "Job submitted", "job_id": job.id, "status": job.status}), 202
     except Exception as e:
         import traceback
         print("Exception occurred:")
         print(traceback.format_exc())
-        return jsonify({"error": "Failed to process the smoothed data", "details": str(e)}), 500
+        return jsonify({"error": "Failed to submit the job", "details": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job", "job_id": job_id}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    # The job stops at its next curve and reports 'cancelled' through processing_complete
+    if not jobs.cancel(job_id):
+        return jsonify({"error": "No running job", "job_id": job_id}), 404
+    return jsonify({"message": "Job cancelling", "job_id": job_id}), 202
+
+# Job events go only to the rooms of the submitting client and of the job, not to every
+# connected tab. A tab joins its client room by connecting with ?client=<id>, the id it
+# sends with its submissions; other clients can follow a job with the join_job event
+def client_room(client):
+    return f'client:{client}'
+
+def job_room(job_id):
+    return f'job:{job_id}'
+
+def emit_job(job, event, payload):
+    rooms = [job_room(job.id)] + ([client_room(job.client)] if job.client is not None else [])
+    socketio.emit(event, payload, to=rooms)
+
+@socketio.on('connect')
+def on_connect(auth=None):
+    client = request.args.get('client') or (auth or {}).get('client')
+    if client:
+        join_room(client_room(client))
+
+@socketio.on('join_job')
+def on_join_job(data):
+    job = jobs.get(data.get('job_id'))
+    if job is None:
+        return
+    join_room(job_room(job.id))
+    # Events sent before the client knew the job id, or lost while it reconnected, are replayed
+    # to it: the completion of a finished job, or the progress and streamed rows of a running one
+    if job.status in ('complete', 'failed', 'cancelled'):
+        emit('processing_complete', {'job_id': job.id, 'message': job.error or f'Processing {job.status}', 'status': job.status})
+    else:
+        emit('progress_update', {'job_id': job.id, 'progress': job.progress})
+        # The streamed rows as a whole, as later updates only apply on top of them
+        emit('topk_update', {'job_id': job.id, **job.topk.snapshot()})
+
+@socketio.on('cancel_job')
+def on_cancel_job(data):
+    jobs.cancel(data.get('job_id'))
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job", "job_id": job_id}), 404
+    if job.status == 'failed':
+        return jsonify({"error": "Job failed", "details": job.error}), 500
+    if job.status == 'cancelled':
+        return jsonify({"error": "Job cancelled", "job_id": job_id}), 410
+    if job.status != 'complete':
+        return jsonify(job.to_dict()), 202
+    return table_page(job)
+
+@app.route('/jobs/<job_id>/results/<int:row>', methods=['GET'])
+def get_job_result_row(job_id, row):
+    # One result row with the samples of its segment
+    job = jobs.get(job_id)
+    if job is None or job.status != 'complete':
+        return jsonify({"error": "Unknown or unfinished job", "job_id": job_id}), 404
+    if not 0 <= row < len(job.results):
+        return jsonify({"error": "Unknown row", "row": row}), 404
+    return payload_response({**expand_result(job.results[row]), "Row": row}, request, float32_keys=SINGLE_PRECISION_VALUES)
+
+@app.route('/jobs/<job_id>/segment', methods=['GET'])
+def get_job_segment(job_id):
+    """
+    The samples of one segment of a job's curves at the job's smoothness, e.g.
+    ?hcn=4043/hcn_ne001&start=120&length=64, for rows streamed before the job has results.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job", "job_id": job_id}), 404
+    name = request.args.get('hcn')
+    if name not in dataset:
+        return jsonify({"error": "Unknown curve", "name": name}), 404
+    try:
+        start, length = int(request.args['start']), int(request.args['length'])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Invalid segment"}), 400
+    _, time_values, values = smoothing.curve(name, job.smoothness)
+    if start < 0 or length < 1 or start + length > len(values):
+        return jsonify({"error": "Segment outside the curve", "start": start, "length": length}), 400
+    row = {"Hcn": name, "StartIndex": start, "Length": length, "Smooth": job.smoothness}
+    return payload_response(expand_row(row, time_values, values), request, float32_keys=SINGLE_PRECISION_VALUES)
+
+def expand_result(row):
+    # Rows of named curves are sliced from the smoothed dataset curve they reference
+    if row["Hcn"] not in dataset:
+        return row
+    _, time_values, values = smoothing.curve(row["Hcn"], row["Smooth"])
+    return expand_row(row, time_values, values)
+
+def table_page(job):
+    """
+    One page of a job's results, e.g. ?sort=CombinedSimilarity&order=desc&top_k=50&offset=0&limit=20.
+    Rows reference their segment; expand=1 includes the segment samples of the page's rows.
+    """
+    args = request.args
+    sort = args.get('sort')
+    if sort is not None and sort not in SORT_KEYS:
+        return jsonify({"error": "Invalid sort key", "sort": sort, "keys": list(SORT_KEYS)}), 400
+    order = args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({"error": "Invalid order", "order": order}), 400
+    try:
+        top_k = int(args['top_k']) if 'top_k' in args else None
+        limit = int(args['limit']) if 'limit' in args else None
+        offset = int(args.get('offset', 0))
+    except ValueError:
+        return jsonify({"error": "Invalid paging parameters"}), 400
+    if offset < 0 or any(value is not None and value < 0 for value in (top_k, limit)):
+        return jsonify({"error": "Invalid paging parameters"}), 400
+    rows, total = query_rows(job.results, sort, order == 'desc', top_k, offset, limit)
+    if args.get('expand') in ('1', 'true'):
+        rows = [expand_result(row) for row in rows]
+    return payload_response({"job_id": job.id, "total": total, "offset": offset, "rows": rows}, request,
+                            float32_keys=SINGLE_PRECISION_VALUES)
+
+@app.route('/dataset', methods=['GET'])
+def get_dataset():
+    return jsonify(dataset.describe())
+
+@app.route('/dataset/curve', methods=['GET'])
+def get_dataset_curve():
+    # Smoothed samples of one curve, e.g. /dataset/curve?name=4043/hcn_ne001&smoothness=0.3
+    name = request.args.get('name')
+    if name not in dataset:
+        return jsonify({"error": "Unknown curve", "name": name}), 404
+    try:
+        smoothness = float(request.args.get('smoothness', 0.0))
+    except ValueError:
+        return jsonify({"error": "Invalid smoothness"}), 400
+    name, time_values, values = smoothing.curve(name, smoothness)
+    return payload_response({"name": name, "smoothness": smoothness, "time": time_values, "values": values}, request)
+
+@app.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify(result_cache.stats())
 
 @app.route('/get_table_data', methods=['GET'])
 def get_table_data():
-    try:
-        with open(table_data_path, 'r') as f:
-            table_data = json.load(f)
-        return jsonify(table_data)
-    except Exception as e:
-        return jsonify({"error": "Failed to load table data", "details": str(e)}), 500
+    # Results of the given job, or of the client's most recently completed one, paged as /jobs/<job_id>/results
+    job_id = request.args.get('job_id')
+    client = request.args.get('client')
+    if not job_id and not client:
+        return jsonify({"error": "Failed to load table data", "details": "job_id or client is required"}), 400
+    job = jobs.get(job_id) if job_id else jobs.latest_complete(client)
+    if job is None or job.status != 'complete':
+        return jsonify({"error": "Failed to load table data", "details": "No completed job"}), 404
+    return table_page(job)
 
 if __name__ == '__main__':
+    # The debug reloader runs this twice: in a file watcher and in the process that serves,
+    # which it marks with WERKZEUG_RUN_MAIN; only the latter loads the data up front
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        create_app()
     socketio.run(app, host='0.0.0.0', port=5000, debug=True)
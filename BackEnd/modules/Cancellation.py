@@ -0,0 +1,27 @@
+import threading
+
+
+class AnalysisCancelled(Exception):
+    # Raised inside an analysis whose token has been cancelled
+    pass
+
+
+class CancelToken:
+    """
+    Cancellation flag of one query. Whoever cancels or supersedes the query sets it;
+    the engine checks it between curves and stops with AnalysisCancelled.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise AnalysisCancelled()
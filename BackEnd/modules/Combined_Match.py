@@ -1,18 +1,48 @@
+import heapq
+import time
 import numpy as np
 import json
 from scipy.signal import savgol_filter
-from sklearn.metrics.pairwise import cosine_similarity
-from tqdm import tqdm
-from joblib import Parallel, delayed
+from modules.Window_Scoring import trend_counts, prescreen_windows, score_windows, combine_scores, window_euclidean
+from modules.Trend_Index import TrendQuery
+from modules.Run_Index import trend_runs, candidate_windows
+from modules.Smoothing import SmoothedCurves
+from modules.Interval_NMS import window_nms
+from modules.Result_Table import segment_row, expand_row
 
-def run_similarity_analysis(drawing_file_path, smoothed_data_file_path, output_file, smoothness_value):
-    # Load JSON data
-    with open(drawing_file_path, 'r') as drawing_file:
-        drawing_data = json.load(drawing_file)
+# Tunable matcher parameters; they are part of the result cache key
+MATCHER_PARAMS = {
+    "stretch_factor": 1.5,
+    "savgol_window": 11,
+    "savgol_order": 3,
+    "prescreen_threshold": 1.5,
+    "similarity_threshold": 0.80,
+    "fallback_top_n": 10,
+    "overlap_ratio": 0.0,
+    # The run-length prefilter is lossy (a window can score above the threshold without the sketch's
+    # run structure), so it is off unless run_length_tolerance is set; None skips the amplitude check
+    "run_min_length": 3,
+    "run_length_tolerance": None,
+    "run_amplitude_tolerance": None,
+}
 
-    with open(smoothed_data_file_path, 'r') as smoothed_data_file:
-        smoothed_data = json.load(smoothed_data_file)
+def curves_from_points(smoothed_data):
+    # Convert uploaded {"name", "data": [{"x": [t], "y": v}, ...]} curves to (name, time, values) arrays
+    return [
+        (
+            curve['name'],
+            np.array([point['x'][0] for point in curve['data']], dtype=np.float64),
+            np.array([point['y'] for point in curve['data']], dtype=np.float64),
+        )
+        for curve in smoothed_data
+    ]
 
+def prepare_sketch(drawing_data, params=MATCHER_PARAMS):
+    """
+    The hand-drawn curve in the form every per-curve step needs: its smoothed values,
+    trend (also packed for popcount matching), monotone runs and slope. Plain arrays,
+    so it can be shipped to worker processes once per task.
+    """
     # Extract and preprocess path information
     path_data = drawing_data[0]["path"]
     drawing_x_coords = [command[1] for command in path_data if len(command) > 2]
@@ -22,90 +52,241 @@ def run_similarity_analysis(drawing_file_path, smoothed_data_file_path, output_f
     drawing_y_coords = np.max(drawing_y_coords) - np.array(drawing_y_coords)
 
     # Horizontally stretch the hand-drawn curve to reduce its slope
-    stretch_factor = 1.5  # Adjust this factor to achieve the desired slope reduction
+    stretch_factor = params["stretch_factor"]  # Adjust this factor to achieve the desired slope reduction
     drawing_x_coords = np.array(drawing_x_coords) * stretch_factor
 
     # Smooth the hand-drawn data
-    drawing_y_smooth = savgol_filter(drawing_y_coords, 11, 3)
-    drawing_x_smooth = savgol_filter(drawing_x_coords, 11, 3)
+    drawing_y_smooth = savgol_filter(drawing_y_coords, params["savgol_window"], params["savgol_order"])
+    drawing_x_smooth = savgol_filter(drawing_x_coords, params["savgol_window"], params["savgol_order"])
 
     # Calculate trend and slope of the smoothed hand-drawn data
     drawing_trend = np.sign(np.diff(drawing_y_smooth))
-    drawing_slope = (drawing_y_smooth[-1] - drawing_y_smooth[0]) / (drawing_x_smooth[-1] - drawing_x_smooth[0])
-
-    # Extract trends and slopes of the measured data
-    all_segments = []
-    for curve in smoothed_data:
-        values = [point['y'] for point in curve['data']]
-        trend = np.sign(np.diff(values))
-        for i in range(len(trend) - len(drawing_trend) + 1):
-            segment_trend = trend[i:i + len(drawing_trend)]
-            segment_values = values[i:i + len(drawing_trend) + 1]
-            segment_slope = (segment_values[-1] - segment_values[0]) / (len(segment_values) - 1)
-            time_values = [point['x'][0] for point in curve['data'][i:i + len(drawing_trend) + 1]]
-            all_segments.append((curve['name'], i, segment_trend, segment_values, segment_slope, time_values))
-
-    # Calculate maximum Euclidean distance
-    max_euclidean_distance = np.max([np.linalg.norm(drawing_trend - segment[2]) for segment in all_segments])
-
-    # Define a function to calculate similarities
-    def calculate_similarities(segment, max_dist, draw_slope):
-        cosine_sim = cosine_similarity([drawing_trend], [segment[2]])[0][0]
-        euclidean_dist = np.linalg.norm(drawing_trend - segment[2])
-        normalized_euclidean_dist = 1 - euclidean_dist / max_dist
-        slope_similarity = 1 - np.abs(draw_slope - segment[4]) / max(np.abs(draw_slope), np.abs(segment[4]))
-        combined_similarity = (cosine_sim + normalized_euclidean_dist + slope_similarity) / 3
-        return segment[0], segment[1], combined_similarity, segment[3], segment, segment[5], cosine_sim, euclidean_dist, slope_similarity
-
-    # Filter initial segments
-    initial_filtered_segments = [seg for seg in all_segments if np.sum(np.abs(seg[2] - drawing_trend)) / len(drawing_trend) < 1.5]
-
-    # Parallel computation of similarities
-    total_segments = len(initial_filtered_segments)
-    results = []
-    for i, res in enumerate(Parallel(n_jobs=-1)(delayed(calculate_similarities)(seg, max_euclidean_distance, drawing_slope) for seg in tqdm(initial_filtered_segments, desc="Calculating similarities"))):
-        results.append(res)
-        yield int((i + 1) / total_segments * 100)  # Yield progress
-
-    # Filter segments based on similarity threshold
-    similarity_threshold = 0.80
-    filtered_results = [res for res in results if res[2] >= similarity_threshold]
-
-    # If no segments meet the threshold, select the top 10 highest similarity segments
-    if not filtered_results:
-        filtered_results = sorted(results, key=lambda x: x[2], reverse=True)[:10]
-
-    # Filter highly overlapping segments
-    final_results = []
-    used_indices = set()
-
-    for res in tqdm(filtered_results, desc="Filtering results"):
-        name, index, similarity, segment_values, segment, time_values, cosine_sim, euclidean_dist, slope_similarity = res
-        if all(abs(index - used_index) > len(drawing_trend) for used_index in used_indices):
-            final_results.append(res)
-            used_indices.add(index)
-
-    # Collect detailed information of matched segments
-    matched_segments_info = []
-    for res in final_results:
-        name, index, combined_similarity, segment_values, segment, time_values, cosine_sim, euclidean_dist, slope_similarity = res
-        segment_info = {
-            "Hcn": name,
-            "StartIndex": index,
-            "CombinedSimilarity": combined_similarity,
-            "CosineSimilarity": cosine_sim,
-            "EuclideanDistance": euclidean_dist,
-            "SlopeSimilarity": slope_similarity,
-            "TimeValues": time_values,
-            "MeasurementValues": segment_values,
-            "Trend": segment[2].tolist(),
-            "Slope": segment[4],
-            "Smooth": smoothness_value
-        }
-        matched_segments_info.append(segment_info)
+    return {
+        "trend": drawing_trend,
+        "slope": (drawing_y_smooth[-1] - drawing_y_smooth[0]) / (drawing_x_smooth[-1] - drawing_x_smooth[0]),
+        # Packed once at every word phase; each curve's trend is compared against it with popcounts
+        "query": TrendQuery(drawing_trend),
+        "runs": trend_runs(drawing_y_smooth, params["run_min_length"]),
+    }
+
+
+def curve_max_euclidean(values, curve_number, sketch, trend=None):
+    # Largest Euclidean distance between the sketch trend and any gap-free window of one curve
+    euclidean = window_euclidean(values, sketch["trend"], trend_counts(values, sketch["query"], trend))
+    return np.nanmax(euclidean, initial=-np.inf)
+
+
+def match_curve(values, curve_number, sketch, max_euclidean_distance, params=MATCHER_PARAMS, use_runs=True,
+                trend=None):
+    """
+    Score one curve and reduce it to compact records: its threshold hits after
+    overlap suppression (in start order), its `fallback_top_n` best windows as
+    (score key, -curve number, -position, record) heap entries, and window counts.
+    Windows are scored only if they pass the trend-mismatch prescreen and, with
+    `use_runs`, a run-length match against the sketch's monotone runs. `trend` is the
+    curve's packed trend when the dataset caches it.
+    """
+    drawing_trend = sketch["trend"]
+    counts = trend_counts(values, sketch["query"], trend)
+    indices, n_windows = prescreen_windows(values, drawing_trend, params["prescreen_threshold"], counts)
+    prescreened = len(indices)
+    if use_runs and params["run_length_tolerance"] is not None:
+        runs = trend_runs(values, params["run_min_length"])
+        run_candidates = candidate_windows(runs, sketch["runs"], n_windows, params["run_length_tolerance"],
+                                           params["run_amplitude_tolerance"], params["run_min_length"])
+        indices = np.intersect1d(indices, run_candidates, assume_unique=True)
+    scores = score_windows(values, drawing_trend, sketch["slope"], indices, counts)
+    combined = combine_scores(scores, max_euclidean_distance)
+
+    # Overlap suppression only acts within a curve, so hits are suppressed right here
+    hits = np.flatnonzero(combined >= params["similarity_threshold"])
+    kept = hits[window_nms(np.zeros(len(hits), dtype=np.int64), indices[hits], combined[hits],
+                           len(drawing_trend) + 1, params["overlap_ratio"])]
+
+    # NaN scores sort last, as in a stable descending argsort
+    keys = np.where(np.isnan(combined), -np.inf, combined)
+    best = np.argsort(-keys, kind='stable')[:max(params["fallback_top_n"], 0)]
+    return {
+        "hits": [_candidate(curve_number, k, combined[k], scores) for k in np.sort(kept)],
+        "fallback": [(keys[k], -curve_number, -k, _candidate(curve_number, k, combined[k], scores)) for k in best],
+        "windows": n_windows,
+        "prescreened": prescreened,
+        "scored": len(indices),
+        "threshold_hits": len(hits),
+    }
+
+
+def map_curves(function, curves, args=(), pool=None, cancel=None):
+    """
+    (curve number, function(values, curve number, *args)) for every curve. Curves held
+    by the dataset (a SmoothedCurves sequence) also pass their cached packed trend as
+    `trend=` and are spread over `pool`, a CurvePool, whose workers read them from
+    shared memory, so only the results cross processes; results then arrive in
+    completion order. Other curves are processed in order here. A CancelToken
+    `cancel` is checked between curves (see Cancellation).
+    """
+    dataset_curves = isinstance(curves, SmoothedCurves)
+    if pool is not None and dataset_curves:
+        yield from pool.map(function, curves.names, curves.smoothness, args, cancel, with_trend=True)
+        return
+    for curve_number, (_, _, values) in enumerate(curves):
+        if cancel is not None:
+            cancel.check()
+        if dataset_curves:
+            yield curve_number, function(values, curve_number, *args, trend=curves.trend(curve_number))
+        else:
+            yield curve_number, function(values, curve_number, *args)
+
+
+def analyze_similarity(drawing_data, curves, smoothness_value, params=MATCHER_PARAMS, stats=None, pool=None,
+                       expand=True, partial=None, partial_k=20, partial_interval=0.25, cancel=None):
+    """
+    Match a sketch against curves given as a sequence of (name, time, values) arrays.
+    Every curve is reduced to compact (curve, start, score) records of its winners as
+    soon as it is scored, so memory does not grow with the dataset, and with a `pool`
+    the curves are scored in parallel worker processes; values and times are sliced
+    for the final segments only. A cheap trend-mismatch prescreen, and with
+    params["run_length_tolerance"] set a (lossy) run-length match of the curve's
+    monotone runs against the sketch's, decide which windows are scored at all; if
+    nothing reaches the threshold the fallback ranks every prescreened window. If
+    a `stats` dict is given it receives the window, prescreen,
+    scored and threshold counts. Yields progress percentages and returns the list of
+    matched segment rows when exhausted (use `yield from` or StopIteration.value);
+    without `expand` the rows only reference their window (see Result_Table). A
+    `partial` callback receives the best `partial_k` compact rows found so far, ranked
+    by combined similarity, as soon as the first curve is scored and then at most every
+    `partial_interval` seconds, and once more after the last curve; before any window
+    reaches the threshold they are the best fallback candidates. With a CancelToken
+    `cancel` the analysis stops between curves with AnalysisCancelled once it is set.
+    """
+    sketch = prepare_sketch(drawing_data, params)
+    window_length = len(sketch["trend"]) + 1
+
+    # The combined score normalises by the maximum Euclidean distance over all windows,
+    # so a cheap first pass finds it before any window is ranked
+    max_euclidean_distance = max(
+        (extent for _, extent in map_curves(curve_max_euclidean, curves, (sketch,), pool, cancel)), default=-np.inf
+    )
+
+    # Second pass: per-curve hits are kept in curve order, and a bounded min-heap keeps
+    # the best candidates for the fallback in case nothing reaches the threshold
+    fallback_top_n = params["fallback_top_n"]
+    hits_by_curve = {}
+    fallback_heap = []  # (score key, -curve number, -position, record)
+    best_hits = []  # the partial_k best hits as (combined, -curve number, -start, record), for `partial`
+    totals = {"windows": 0, "prescreened": 0, "scored": 0, "threshold_hits": 0}
+
+    def collect(curve_number, match, totals):
+        for key in totals:
+            totals[key] += match[key]
+        if match["hits"]:
+            hits_by_curve[curve_number] = match["hits"]
+            if partial is not None:
+                for hit in match["hits"]:
+                    entry = (hit["combined"], -curve_number, -hit["index"], hit)
+                    if len(best_hits) < partial_k:
+                        heapq.heappush(best_hits, entry)
+                    elif entry[:3] > best_hits[0][:3]:
+                        heapq.heapreplace(best_hits, entry)
+        for entry in match["fallback"]:
+            if len(fallback_heap) < fallback_top_n:
+                heapq.heappush(fallback_heap, entry)
+            elif entry[:3] > fallback_heap[0][:3]:
+                heapq.heapreplace(fallback_heap, entry)
+
+    matches = map_curves(match_curve, curves, (sketch, max_euclidean_distance, params), pool, cancel)
+    last_partial, pending = -np.inf, False
+
+    def send_partial():
+        ranked = sorted(best_hits or fallback_heap, key=lambda entry: entry[:3], reverse=True)[:partial_k]
+        partial([_row(entry[-1], curves, window_length, smoothness_value) for entry in ranked])
+
+    for done, (curve_number, match) in enumerate(matches, start=1):
+        collect(curve_number, match, totals)
+        pending = partial is not None
+        if pending and time.monotonic() - last_partial >= partial_interval:
+            last_partial, pending = time.monotonic(), False
+            send_partial()
+        yield int(done / len(curves) * 100)  # Yield progress
+    if pending:
+        # The last curves' changes, so the stream ends on the best rows of the whole selection
+        send_partial()
+
+    if not hits_by_curve and params["run_length_tolerance"] is not None:
+        # No window reached the threshold: the fallback ranks every prescreened window, as without
+        # the run filter, rather than only those that had the sketch's run structure
+        fallback_heap.clear()
+        fallback_totals = {"scored": 0}
+        for curve_number, match in map_curves(match_curve, curves, (sketch, max_euclidean_distance, params, False), pool, cancel):
+            collect(curve_number, match, fallback_totals)
+        totals["scored"] += fallback_totals["scored"]
+        if partial is not None:
+            send_partial()
+
+    if stats is not None:
+        window_count = totals["windows"]
+        stats.update({
+            "windows": window_count,
+            "prescreened": totals["prescreened"],
+            "prescreen_pass_rate": totals["prescreened"] / window_count if window_count else 0.0,
+            "scored": totals["scored"],
+            "scored_rate": totals["scored"] / window_count if window_count else 0.0,
+            "threshold_hits": totals["threshold_hits"],
+        })
+
+    if hits_by_curve:
+        # Reported curve by curve, in start order, as the segments appear
+        final_results = [hit for curve_number in sorted(hits_by_curve) for hit in hits_by_curve[curve_number]]
+    else:
+        # If no segments meet the threshold, keep the top 10 highest similarity segments
+        ranked = [entry[-1] for entry in sorted(fallback_heap, key=lambda entry: entry[:3], reverse=True)]
+        kept = window_nms([candidate["curve"] for candidate in ranked], [candidate["index"] for candidate in ranked],
+                          np.arange(len(ranked)), window_length, params["overlap_ratio"], larger_is_better=False)
+        final_results = [ranked[k] for k in kept]
+
+    # Result rows reference their curve window; its samples are included only with `expand`
+    return [_row(candidate, curves, window_length, smoothness_value, expand) for candidate in final_results]
+
+
+def _row(candidate, curves, window_length, smoothness_value, expand=False):
+    # Result row of a candidate record, see Result_Table.segment_row
+    name, time_values, values = curves[candidate["curve"]]
+    scores = {
+        "CombinedSimilarity": candidate["combined"],
+        "CosineSimilarity": candidate["cosine"],
+        "EuclideanDistance": candidate["euclidean"],
+        "SlopeSimilarity": candidate["slope_similarity"],
+        "Slope": candidate["slope"],
+    }
+    row = segment_row(name, candidate["index"], window_length, time_values, scores, smoothness_value)
+    return expand_row(row, time_values, values) if expand else row
+
+
+def _candidate(curve_number, k, combined, scores):
+    # Compact record of the k-th scored window; the curve itself is not referenced
+    return {
+        "curve": curve_number,
+        "index": int(scores["index"][k]),
+        "combined": combined,
+        "cosine": scores["cosine"][k],
+        "euclidean": scores["euclidean"][k],
+        "slope_similarity": scores["slope_similarity"][k],
+        "slope": scores["slope"][k],
+    }
+
+
+def run_similarity_analysis(drawing_file_path, smoothed_data_file_path, output_file, smoothness_value):
+    # Load JSON data
+    with open(drawing_file_path, 'r') as drawing_file:
+        drawing_data = json.load(drawing_file)
+
+    with open(smoothed_data_file_path, 'r') as smoothed_data_file:
+        smoothed_data = json.load(smoothed_data_file)
+
+    matched_segments_info = yield from analyze_similarity(drawing_data, curves_from_points(smoothed_data), smoothness_value)
 
     # Save matched segment information to a JSON file
     with open(output_file, 'w') as json_file:
-        json.dump(matched_segments_info, json_file, indent=4)
+        json.dump(matched_segments_info, json_file, separators=(',', ':'))
 
     print(f"Matched segments information saved to {output_file}")
@@ -1,9 +1,13 @@
+import os
+import sys
 import numpy as np
 import json
 import matplotlib.pyplot as plt
 from scipy.signal import savgol_filter
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import normalize
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.MASS_Profile import mass_search
+from modules.Interval_NMS import window_nms
 
 # 读取JSON文件
 with open('drawing.json', 'r') as drawing_file:
@@ -31,36 +35,20 @@ drawing_gradients = np.sqrt(drawing_gradients_x**2 + drawing_gradients_y**2)
 drawing_gradients = np.asarray(drawing_gradients).flatten()  # 转换为一维数组
 
 # 提取时间序列数据并计算梯度
-all_segments = []
+curves = []
 for curve in smoothed_data:
     measurement_values = [point['y'] for point in curve['data']]
     measurement_gradients = np.gradient(measurement_values)
     measurement_gradients = np.asarray(measurement_gradients).flatten()  # 转换为一维数组
-    for i in range(len(measurement_gradients) - len(drawing_gradients) + 1):
-        segment = measurement_gradients[i:i + len(drawing_gradients)]
-        all_segments.append((curve['name'], i, segment))
-
-# 将所有段和drawing_gradients标准化
-drawing_gradients = normalize(drawing_gradients.reshape(1, -1))[0]
-all_segments_normalized = [normalize(segment.reshape(1, -1))[0] for _, _, segment in all_segments]
-
-# 计算相似度
-similarities = cosine_similarity([drawing_gradients], all_segments_normalized)[0]
-
-# 获取最相似的段并按相似度排序
-results = sorted([(all_segments[i][0], all_segments[i][1], similarities[i]) for i in range(len(similarities))], key=lambda x: x[2], reverse=True)
-
-# 过滤高度重合的曲线段
-filtered_results = []
-used_indices = set()
-
-for res in results:
-    name, index, similarity = res
-    if all(abs(index - used_index) > len(drawing_gradients) for used_index in used_indices):
-        filtered_results.append(res)
-        used_indices.add(index)
-        if len(filtered_results) >= 25:
-            break
+    curves.append((curve['name'], measurement_gradients))
+
+# 一次批量计算所有曲线所有偏移的余弦相似度（FFT滑动点积 + 累积和求窗口范数，等价于逐段标准化），并按相似度排序
+results = mass_search(drawing_gradients, curves, metric='cosine', top_k=None)
+
+# 过滤高度重合的曲线段：按曲线分组做区间非极大值抑制，只有同一条曲线上重叠超过overlap_ratio的段才互相抑制
+overlap_ratio = 0.0
+kept = window_nms([res[0] for res in results], [res[1] for res in results], [res[2] for res in results], len(drawing_gradients), overlap_ratio, limit=25)
+filtered_results = [results[k] for k in kept]
 
 for res in filtered_results:
     print(f"曲线: {res[0]}, 起始索引: {res[1]}, 相似度: {res[2]}")
@@ -0,0 +1,149 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from modules.Gap_Mask import fill_gaps, valid_windows
+
+
+def dtw_distance(s1, s2, band=None, return_path=False):
+    """
+    Exact DTW between two 1-D sequences with |a - b| as the local cost and an
+    optional Sakoe-Chiba band (half-width in samples, widened to the length
+    difference so the end cell stays reachable). The cost matrix is filled one
+    anti-diagonal at a time. Returns the distance, or (distance, path) where path
+    is the list of (i, j) index pairs from (0, 0) to the last cell.
+    """
+    s1 = np.asarray(s1, dtype=np.float64).ravel()
+    s2 = np.asarray(s2, dtype=np.float64).ravel()
+    n1, n2 = len(s1), len(s2)
+    band = max(n1, n2) if band is None else max(band, abs(n1 - n2))
+
+    # cost[i, j] holds the cumulative cost of s1[:i] against s2[:j]
+    cost = np.full((n1 + 1, n2 + 1), np.inf)
+    cost[0, 0] = 0
+    for k in range(2, n1 + n2 + 1):
+        i = np.arange(max(1, k - n2), min(n1, k - 1) + 1)
+        j = k - i
+        in_band = np.abs(i - j) <= band
+        i, j = i[in_band], j[in_band]
+        if len(i) == 0:
+            continue
+        previous = np.minimum(np.minimum(cost[i - 1, j - 1], cost[i - 1, j]), cost[i, j - 1])
+        cost[i, j] = previous + np.abs(s1[i - 1] - s2[j - 1])
+
+    distance = cost[n1, n2]
+    if not return_path:
+        return distance
+
+    # Backtrack from the last cell, preferring the diagonal on ties
+    i, j = n1, n2
+    path = [(i - 1, j - 1)]
+    while (i, j) != (1, 1):
+        steps = [(i - 1, j - 1), (i - 1, j), (i, j - 1)]
+        i, j = min(steps, key=lambda step: cost[step])
+        path.append((i - 1, j - 1))
+    path.reverse()
+    return distance, path
+
+
+def query_envelope(query, band):
+    # Upper and lower envelope of the query over a Sakoe-Chiba band of half-width `band`
+    query = np.asarray(query, dtype=np.float64)
+    padded_upper = np.pad(query, band, constant_values=-np.inf)
+    padded_lower = np.pad(query, band, constant_values=np.inf)
+    upper = sliding_window_view(padded_upper, 2 * band + 1).max(axis=1)
+    lower = sliding_window_view(padded_lower, 2 * band + 1).min(axis=1)
+    return upper, lower
+
+
+def dtw_batch(query, windows, band=None, bound=np.inf):
+    """
+    Exact banded DTW (|q - x| local cost) of `query` against each row of `windows`,
+    swept by anti-diagonal over the whole batch. Any warping path passes through one
+    of every two consecutive anti-diagonals, so with a finite `bound` a window is
+    abandoned, and reported as inf, once every cell on both exceeds it. As in the
+    UCR suite, a cell's cumulative cost is first raised by the LB_Keogh cost of the
+    window samples after it, which any path from the cell still has to pay, so
+    windows are abandoned long before their cost alone reaches the bound. Abandoned
+    windows are dropped from the batch once a quarter of it has been abandoned, so the
+    arrays are not copied for every single one.
+    """
+    query = np.asarray(query, dtype=np.float64)
+    windows = np.atleast_2d(np.asarray(windows, dtype=np.float64))
+    n_windows, m = windows.shape
+    band = m if band is None else band
+    distances = np.full(n_windows, np.inf)
+    alive = np.arange(n_windows)
+    abandoned = np.zeros(n_windows, dtype=bool)
+    if bound < np.inf:
+        # remaining[:, j]: LB_Keogh cost of window samples j..m - 1
+        upper, lower = query_envelope(query, min(band, m))
+        keogh = np.maximum(windows - upper, 0) + np.maximum(lower - windows, 0)
+        remaining = np.zeros((n_windows, m + 1))
+        remaining[:, :m] = np.cumsum(keogh[:, ::-1], axis=1)[:, ::-1]
+
+    # Cell (i, j) of anti-diagonal k = i + j is stored at column i + 1; column 0 is an
+    # inf sentinel for i = -1
+    prev2 = np.full((n_windows, m + 1), np.inf)
+    prev1 = np.full((n_windows, m + 1), np.inf)
+    current = np.full((n_windows, m + 1), np.inf)
+    # (lo, hi) of the cells last written to each buffer; all other cells are inf
+    cells2, cells1, cells0 = (0, -1), (0, -1), (0, -1)
+
+    for k in range(2 * m - 1):
+        lo = max(0, k - (m - 1), -((band - k) // 2))
+        hi = min(m - 1, k, (k + band) // 2)
+        local = np.abs(query[lo:hi + 1] - windows[:, k - hi:k - lo + 1][:, ::-1])
+
+        # Clearing only what this buffer held keeps a diagonal O(band) rather than O(m)
+        current[:, cells0[0] + 1:cells0[1] + 2] = np.inf
+        cells0 = (lo, hi)
+        if k == 0:
+            current[:, 1] = local[:, 0]
+        else:
+            diagonal = prev2[:, lo:hi + 1]
+            vertical = prev1[:, lo:hi + 1]
+            horizontal = prev1[:, lo + 1:hi + 2]
+            current[:, lo + 1:hi + 2] = np.minimum(np.minimum(diagonal, vertical), horizontal) + local
+
+        if bound < np.inf and k % 8 == 7:
+            # Checking every other diagonal pair suffices; only the cells inside the band are finite
+            lower_bound = np.minimum(_path_bound(current, remaining, k, lo, hi),
+                                     _path_bound(prev1, remaining, k - 1, *cells1))
+            abandoned |= lower_bound > bound
+            if 4 * abandoned.sum() >= len(alive):
+                survivors = ~abandoned
+                alive, windows, abandoned = alive[survivors], windows[survivors], abandoned[survivors]
+                remaining = remaining[survivors]
+                prev1, current = prev1[survivors], current[survivors]
+                prev2, cells2 = np.full_like(current, np.inf), (0, -1)
+                if len(alive) == 0:
+                    return distances
+
+        prev2, prev1, current = prev1, current, prev2
+        cells2, cells1, cells0 = cells1, cells0, cells2
+
+    distances[alive] = np.where(abandoned, np.inf, prev1[:, m])
+    return distances
+
+
+def _path_bound(diagonal, remaining, k, lo, hi):
+    # Per window, the least cost of a path through cells lo..hi of anti-diagonal k (stored at
+    # columns lo + 1..hi + 1): the cell's cost plus the remaining cost after its window sample j = k - i
+    if hi < lo:
+        return np.full(len(diagonal), np.inf)
+    return (diagonal[:, lo + 1:hi + 2] + remaining[:, k - hi + 1:k - lo + 2][:, ::-1]).min(axis=1)
+
+
+def dtw_windows(query, series, band=None, batch_size=1024):
+    # DTW of `query` against every window of `series` of the same length, in batched calls;
+    # windows containing NaN (missing samples) are skipped and reported as inf
+    query = np.asarray(query, dtype=np.float64)
+    series, valid = fill_gaps(series)
+    if len(series) < len(query):
+        return np.empty(0)
+    complete = np.flatnonzero(valid_windows(valid, len(query)))
+    windows = sliding_window_view(series, len(query))
+    distances = np.full(len(windows), np.inf)
+    for start in range(0, len(complete), batch_size):
+        batch = complete[start:start + batch_size]
+        distances[batch] = dtw_batch(query, windows[batch], band)
+    return distances
@@ -0,0 +1,107 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from modules.DTW_Kernel import dtw_batch, query_envelope
+from modules.Gap_Mask import fill_gaps, valid_windows
+from modules.Interval_NMS import window_nms
+
+
+def lb_kim(query, windows):
+    # First and last cells lie on every warping path
+    return np.abs(windows[:, 0] - query[0]) + np.abs(windows[:, -1] - query[-1])
+
+
+def lb_keogh(upper, lower, windows):
+    # Every window sample is matched to a query sample inside its envelope
+    return (np.maximum(windows - upper, 0) + np.maximum(lower - windows, 0)).sum(axis=1)
+
+
+def dtw_search(query, curves, band=None, top_k=None, threshold=None, exclusion_zone=None, chunk_size=256):
+    """
+    Exact fixed-length DTW search of `query` over every window of every
+    (name, series) curve, UCR-suite style: vectorised LB_Kim and LB_Keogh prune
+    windows that cannot beat the best-so-far bound (the k-th best distance, or the
+    threshold), and early-abandoning DTW runs only on the survivors, best lower
+    bound first. With `exclusion_zone`, windows on the same curve within that many
+    samples of a better match are suppressed, as the match scripts do. NaN samples
+    keep their positions and windows containing them are never scored.
+    Returns (results, stats) where results are (name, index, distance) tuples
+    sorted by distance and stats counts how many windows each stage removed.
+    """
+    query = np.asarray(query, dtype=np.float64)
+    m = len(query)
+    band = m if band is None else band
+    upper, lower = query_envelope(query, band)
+    bound = np.inf if threshold is None else threshold
+
+    # Both lower bounds for every window of every curve; the larger one orders the search
+    names, window_views, window_curves, window_starts, kim_bounds, keogh_bounds, gaps = [], [], [], [], [], [], []
+    for curve_number, (name, series) in enumerate(curves):
+        names.append(name)
+        series, valid = fill_gaps(series)
+        windows = sliding_window_view(series, m) if len(series) >= m else np.empty((0, m))
+        window_views.append(windows)
+        window_curves.append(np.full(len(windows), curve_number))
+        window_starts.append(np.arange(len(windows)))
+        kim_bounds.append(lb_kim(query, windows) if len(windows) else np.empty(0))
+        keogh_bounds.append(lb_keogh(upper, lower, windows))
+        gaps.append(~valid_windows(valid, m) if len(series) >= m else np.empty(0, dtype=bool))
+    window_curves = np.concatenate(window_curves)
+    window_starts = np.concatenate(window_starts)
+    kim_bounds = np.concatenate(kim_bounds)
+    keogh_bounds = np.concatenate(keogh_bounds)
+    gaps = np.concatenate(gaps)
+    lower_bounds = np.maximum(kim_bounds, keogh_bounds)
+    # Windows crossing a gap sort last and never pass the bound
+    lower_bounds[gaps] = np.inf
+    order = np.argsort(lower_bounds, kind='stable')
+
+    stats = {"windows": len(order), "gaps": int(gaps.sum()), "pruned_kim": 0, "pruned_keogh": 0, "abandoned": 0, "computed": 0}
+    computed = []  # (distance, curve number, start)
+    results = []
+    visited = np.zeros(len(order), dtype=bool)
+    for chunk_start in range(0, len(order), chunk_size):
+        chunk = order[chunk_start:chunk_start + chunk_size]
+        # Gap windows are dropped explicitly: with no threshold the bound can be inf, which they would pass
+        chunk = chunk[~gaps[chunk] & (lower_bounds[chunk] <= bound)]
+        if len(chunk) == 0:
+            # Candidates are sorted by lower bound (gap windows last), so none of the rest can qualify
+            break
+        visited[chunk] = True
+
+        batch = np.stack([window_views[window_curves[c]][window_starts[c]] for c in chunk])
+        distances = dtw_batch(query, batch, band, bound)
+        finished = distances <= bound
+        stats["abandoned"] += int(np.sum(~np.isfinite(distances)))
+        stats["computed"] += len(chunk)
+        computed.extend(zip(distances[finished], window_curves[chunk][finished], window_starts[chunk][finished]))
+
+        if top_k is not None:
+            results = _select(computed, top_k, exclusion_zone)
+            if len(results) >= top_k:
+                bound = min(bound, results[top_k - 1][0])
+                # Windows above the bound can neither enter nor change the top k
+                computed = [match for match in computed if match[0] <= bound]
+
+    if top_k is None:
+        results = _select(computed, top_k, exclusion_zone)
+
+    # Windows never scored were skipped by the bound at the time, which is >= the final bound
+    skipped = ~visited & ~gaps
+    stats["pruned_kim"] = int(np.sum(skipped & (kim_bounds > bound)))
+    stats["pruned_keogh"] = int(np.sum(skipped)) - stats["pruned_kim"]
+
+    results = [(names[curve_number], int(start), float(distance)) for distance, curve_number, start in results]
+    return results, stats
+
+
+def _select(computed, top_k, exclusion_zone):
+    # Best matches in distance order, suppressing windows on the same curve whose starts
+    # are within exclusion_zone of a better one
+    computed.sort(key=lambda match: match[0])
+    if exclusion_zone is None:
+        return computed if top_k is None else computed[:top_k]
+    distances = [distance for distance, _, _ in computed]
+    curve_numbers = [curve_number for _, curve_number, _ in computed]
+    starts = [start for _, _, start in computed]
+    kept = window_nms(curve_numbers, starts, distances, exclusion_zone + 1, larger_is_better=False, limit=top_k)
+    return [computed[k] for k in kept]
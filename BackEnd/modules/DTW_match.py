@@ -1,3 +1,5 @@
+import os
+import sys
 import json
 import numpy as np
 from scipy.spatial.distance import euclidean
@@ -5,6 +7,9 @@ from fastdtw import fastdtw
 import heapq
 from tqdm import tqdm
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.Gap_Mask import valid_windows
+
 # 读取drawing.json文件
 with open('../static/Data/drawing.json', 'r') as file:
     drawing_data = json.load(file)
@@ -23,31 +28,25 @@ for obj in drawing_data['objects']:
 
 drawing_coords = np.array(drawing_coords)
 
-# 提取hcn数据，并确保数据为数值类型
-def flatten_and_filter(data):
-    flat_data = []
-    for item in data:
-        if isinstance(item, list):
-            flat_data.extend(flatten_and_filter(item))
-        elif isinstance(item, (int, float)):
-            flat_data.append(float(item))
-    return flat_data
-
-hcn_coords = flatten_and_filter(hcn_data['hcn'])
-hcn_coords = np.array(hcn_coords)
+# 提取hcn数据：每条曲线一行，null转为NaN并保留在原位，窗口起点与time数组对齐
+hcn_coords = np.array(hcn_data['hcn'], dtype=np.float64)
 
 # 归一化函数
 def normalize(data):
     data = np.array(data)
-    data_min = np.min(data, axis=0)
-    data_max = np.max(data, axis=0)
+    data_min = np.nanmin(data, axis=0)
+    data_max = np.nanmax(data, axis=0)
     return (data - data_min) / (data_max - data_min)
 
 # 归一化手绘数据和hcn数据
 drawing_coords = normalize(drawing_coords)
-hcn_coords = normalize(hcn_coords)
+hcn_coords = normalize(hcn_coords.ravel()).reshape(hcn_coords.shape)
 
 # 计算相似度的函数，使用DTW算法
+# 这里不能换成Subsequence_DTW.spring_search：窗口点的x坐标是窗口内的偏移(0..window_size-1)，
+# 手绘点i与曲线样本s+j的二维欧氏代价取决于窗口起点s，每个窗口的代价矩阵都不同，无法用SPRING
+# 在整条曲线上一次扫描共享；而且这里比较的是固定长度100的窗口，SPRING给出的是可变长度的子序列，
+# 手绘长度与窗口长度也不相等（DTW_Kernel.dtw_batch只支持等长的一维序列）
 def calculate_similarity(seq1, seq2):
     distance, _ = fastdtw(seq1, seq2, dist=euclidean)
     return distance
@@ -55,10 +54,11 @@ def calculate_similarity(seq1, seq2):
 # 找到前20个最匹配的段落
 def find_top_matches(drawing_coords, hcn_coords, window_size=100, top_n=20):
     top_matches = []
-    total_segments = len(hcn_coords) - window_size + 1
+    # 只取每条曲线内部不含缺失值的窗口，窗口不会跨越曲线边界或数据空缺
+    positions = np.argwhere(valid_windows(~np.isnan(hcn_coords), window_size))
 
-    for i in tqdm(range(total_segments), desc="Processing segments"):
-        segment = hcn_coords[i:i + window_size]
+    for curve_index, i in tqdm(positions, desc="Processing segments"):
+        segment = hcn_coords[curve_index, i:i + window_size]
         segment_coords = np.array([(x, y) for x, y in enumerate(segment)])
 
         distance = calculate_similarity(drawing_coords, segment_coords)
@@ -1,3 +1,5 @@
+import os
+import sys
 import json
 import numpy as np
 from scipy.spatial.distance import euclidean
@@ -6,6 +8,9 @@ import heapq
 from tqdm import tqdm
 from multiprocessing import Pool, cpu_count
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.Gap_Mask import valid_windows
+
 # 读取drawing.json文件
 with open('../static/Data/drawing.json', 'r') as file:
     drawing_data = json.load(file)
@@ -25,66 +30,61 @@ for obj in drawing_data['objects']:
 drawing_coords = np.array(drawing_coords)
 
 
-# 提取hcn数据，并确保数据为数值类型
-def flatten_and_filter(data):
-    flat_data = []
-    for item in data:
-        if isinstance(item, list):
-            flat_data.extend(flatten_and_filter(item))
-        elif isinstance(item, (int, float)):
-            flat_data.append(float(item))
-    return flat_data
-
-
-hcn_coords = flatten_and_filter(hcn_data['hcn'])
-hcn_coords = np.array(hcn_coords)
+# 提取hcn数据：每条曲线一行，null转为NaN并保留在原位，窗口起点与time数组对齐
+hcn_coords = np.array(hcn_data['hcn'], dtype=np.float64)
 
 
 # 归一化函数
 def normalize(data):
     data = np.array(data)
-    data_min = np.min(data, axis=0)
-    data_max = np.max(data, axis=0)
+    data_min = np.nanmin(data, axis=0)
+    data_max = np.nanmax(data, axis=0)
     return (data - data_min) / (data_max - data_min)
 
 
 # 归一化手绘数据和hcn数据
 drawing_coords = normalize(drawing_coords)
-hcn_coords = normalize(hcn_coords)
+hcn_coords = normalize(hcn_coords.ravel()).reshape(hcn_coords.shape)
 
 
-# 计算相似度的函数，使用DTW算法
-def calculate_similarity(args):
-    drawing_coords, segment_coords = args
-    distance, _ = fastdtw(drawing_coords, segment_coords, dist=euclidean)
-    return distance
+# 工作进程的数据：进程启动时接收一次全部曲线，之后每个任务只传曲线编号
+_worker_coords = None
 
 
-# 找到前20个最匹配的段落
-def find_top_matches(drawing_coords, hcn_coords, window_size=100, top_n=20):
-    top_matches = []
-    total_segments = len(hcn_coords) - window_size + 1
-
-    segments = [(drawing_coords, np.array([(x, y) for x, y in enumerate(hcn_coords[i:i + window_size])])) for i in
-                range(total_segments)]
+def init_worker(hcn_coords):
+    global _worker_coords
+    _worker_coords = hcn_coords
 
-    # 使用多进程池并行计算
-    with Pool(processes=cpu_count()) as pool:
-        distances = list(
-            tqdm(pool.imap(calculate_similarity, segments), total=total_segments, desc="Processing segments"))
 
-    for i, distance in enumerate(distances):
-        segment = hcn_coords[i:i + window_size]
+# 一个任务计算一整条曲线的全部窗口，只返回该曲线的前top_n个(距离, 曲线编号, 起点)
+def curve_top_matches(args):
+    drawing_coords, curve_index, window_size, top_n = args
+    curve = _worker_coords[curve_index]
+    top_matches = []
+    for i in np.flatnonzero(valid_windows(~np.isnan(curve), window_size)):
+        segment_coords = np.column_stack([np.arange(window_size), curve[i:i + window_size]])
+        distance, _ = fastdtw(drawing_coords, segment_coords, dist=euclidean)
+        entry = (-distance, -curve_index, -int(i))
         if len(top_matches) < top_n:
-            heapq.heappush(top_matches, (-distance, segment))
+            heapq.heappush(top_matches, entry)
         else:
-            heapq.heappushpop(top_matches, (-distance, segment))
+            heapq.heappushpop(top_matches, entry)
+    return [(-dist, -curve_index, -i) for dist, curve_index, i in top_matches]
+
+
+# 找到前20个最匹配的段落
+def find_top_matches(drawing_coords, hcn_coords, window_size=100, top_n=20):
+    # 只取每条曲线内部不含缺失值的窗口，窗口不会跨越曲线边界或数据空缺
+    tasks = [(drawing_coords, curve_index, window_size, top_n) for curve_index in range(len(hcn_coords))]
 
-    # 转换回正距离排序
-    top_matches = [(-dist, seg) for dist, seg in top_matches]
-    top_matches.sort()
+    # 使用多进程池并行计算，按曲线分任务，不再逐窗口传输数据
+    with Pool(processes=cpu_count(), initializer=init_worker, initargs=(hcn_coords,)) as pool:
+        curve_matches = list(
+            tqdm(pool.imap_unordered(curve_top_matches, tasks), total=len(tasks), desc="Processing curves"))
 
-    return top_matches
+    # 合并各曲线的前top_n，距离相同时按曲线和起点排序
+    top_matches = heapq.nsmallest(top_n, (match for matches in curve_matches for match in matches))
+    return [(distance, hcn_coords[curve_index, i:i + window_size]) for distance, curve_index, i in top_matches]
 
 
 if __name__ == "__main__":
@@ -1,11 +1,13 @@
 import os
+import sys
 import glob
 import json
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.signal import savgol_filter
-from scipy.spatial.distance import cdist
-from tqdm import tqdm
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.DTW_Pruning import dtw_search
 
 # 查找目录中最新的JSON文件并读取数据
 def load_latest_drawing_data(data_folder):
@@ -61,45 +63,19 @@ def normalize_curve(curve):
         range_val[range_val == 0] = 1  # 防止除以0
     return (curve - min_val) / range_val
 
-# 动态时间规整(DTW)函数
-def dtw_distance(s1, s2):
-    d = cdist(s1[:, None], s2[:, None], metric='euclidean')
-    cost = np.zeros_like(d)
-    cost[0, 0] = d[0, 0]
-    for i in range(1, s1.shape[0]):
-        cost[i, 0] = cost[i - 1, 0] + d[i, 0]
-    for j in range(1, s2.shape[0]):
-        cost[0, j] = cost[0, j - 1] + d[0, j]
-    for i in range(1, s1.shape[0]):
-        for j in range(1, s2.shape[0]):
-            cost[i, j] = min(cost[i - 1, j], cost[i, j - 1], cost[i - 1, j - 1]) + d[i, j]
-    path = []
-    i, j = s1.shape[0] - 1, s2.shape[0] - 1
-    path.append((i, j))
-    while i > 0 and j > 0:
-        i, j = min((i - 1, j), (i, j - 1), (i - 1, j - 1), key=lambda x: cost[x[0], x[1]])
-        path.append((i, j))
-    path.append((0, 0))
-    path.reverse()
-    return cost[-1, -1], path
-
 # 查找相似段的函数
-def find_top_matches(sketch, curve, window_length, polyorder, top_n=10):
+def find_top_matches(sketch, curve, window_length, polyorder, top_n=10, band=None):
     time_series = np.arange(len(curve))
     curve_2d = np.column_stack((time_series, curve))
     smooth_curve_data = smooth_curve(curve_2d, window_length, polyorder)
     normalized_curve = normalize_curve(smooth_curve_data)
     normalized_sketch = normalize_curve(sketch)
 
-    matches = []
+    # 动态时间规整(DTW)：LB_Kim/LB_Keogh下界剪枝 + 提前终止，只对可能进入前top_n的窗口计算完整DTW，
+    # 结果与逐窗口计算后排序相同；band为Sakoe-Chiba带宽（None表示不限制）
     segment_length = len(normalized_sketch)
-    for i in range(len(normalized_curve) - segment_length + 1):
-        segment = normalized_curve[i:i + segment_length]
-        distance, _ = dtw_distance(normalized_sketch[:, 1], segment[:, 1])
-        matches.append((distance, i, i + segment_length))
-
-    matches.sort(key=lambda x: x[0])
-    return matches[:top_n]
+    matches, _ = dtw_search(normalized_sketch[:, 1], [(None, normalized_curve[:, 1])], band=band, top_k=top_n)
+    return [(distance, index, index + segment_length) for _, index, distance in matches]
 
 # 主程序
 def main():
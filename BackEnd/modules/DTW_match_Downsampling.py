@@ -1,13 +1,12 @@
+import os
+import sys
 import numpy as np
 import json
 import matplotlib.pyplot as plt
-from scipy.spatial.distance import euclidean
-from fastdtw import fastdtw
-from tqdm import tqdm
 
-def downsample(data, factor):
-    """对数据进行降采样"""
-    return data[::factor]
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.Dataset_Registry import DatasetRegistry
+from modules.PAA_Pyramid import build_pyramid, pyramid_search
 
 # 读取JSON文件
 with open('drawing.json', 'r') as drawing_file:
@@ -16,6 +15,11 @@ with open('drawing.json', 'r') as drawing_file:
 with open('selectedSmoothedData.json', 'r') as smoothed_data_file:
     smoothed_data = json.load(smoothed_data_file)
 
+# 数据集及其梯度的PAA金字塔：列式存储(static/Data/hcnData)中已保存，否则加载hcnData.json时计算一次
+data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'Data')
+store_dir = os.path.join(data_dir, 'hcnData')
+registry = DatasetRegistry.load(store_dir if os.path.isdir(store_dir) else os.path.join(data_dir, 'hcnData.json'))
+
 # 提取路径信息并计算梯度
 path_data = drawing_data[0]["path"]
 drawing_y_coords = [command[2] for command in path_data if len(command) > 2]
@@ -24,10 +28,8 @@ drawing_x_coords = [command[1] for command in path_data if len(command) > 2]
 # 上下翻转drawing的y坐标
 drawing_y_coords = np.max(drawing_y_coords) - np.array(drawing_y_coords)
 
-# 降采样绘图数据
-downsample_factor = 5  # 设置降采样因子
-drawing_x_coords = downsample(drawing_x_coords, downsample_factor)
-drawing_y_coords = downsample(drawing_y_coords, downsample_factor)
+# 多分辨率金字塔：每层是分段聚合近似（PAA，按块取均值），不会像隔点取样那样丢失中间的样本
+pyramid_factors = (1, 2, 4, 8, 16)
 
 # 计算梯度
 drawing_gradients_y = np.gradient(drawing_y_coords)
@@ -35,45 +37,21 @@ drawing_gradients_x = np.gradient(drawing_x_coords)
 drawing_gradients = np.sqrt(drawing_gradients_x**2 + drawing_gradients_y**2)
 drawing_gradients = np.asarray(drawing_gradients).flatten()  # 转换为一维数组
 
-# 提取时间序列数据并计算梯度
-all_segments = []
+# 选中的曲线直接读取数据集中保存的梯度金字塔；不在数据集中的曲线才按上传的点计算
+curves = []
 for curve in smoothed_data:
+    if curve['name'] in registry:
+        curves.append((curve['name'], registry.pyramid(curve['name'])))
+        continue
     measurement_values = [point['y'] for point in curve['data']]
-    measurement_values = downsample(measurement_values, downsample_factor)
     measurement_gradients = np.gradient(measurement_values)
     measurement_gradients = np.asarray(measurement_gradients).flatten()  # 转换为一维数组
-    for i in range(len(measurement_gradients) - len(drawing_gradients) + 1):
-        segment = measurement_gradients[i:i + len(drawing_gradients)]
-        all_segments.append((curve['name'], i, segment))
-
-# 动态时间规整（DTW）
-def dtw_distance(s1, s2):
-    s1 = np.asarray(s1).flatten()  # 确保s1是一维数组
-    s2 = np.asarray(s2).flatten()  # 确保s2是一维数组
-    distance, path = fastdtw(s1, s2, dist=lambda x, y: np.abs(x - y))  # 使用绝对差作为距离度量
-    return distance
-
-# 计算相似度
-results = []
-for name, index, segment in tqdm(all_segments, desc="Processing segments"):
-    segment = np.asarray(segment).flatten()  # 确保segment是numpy一维数组
-    dtw_dist = dtw_distance(drawing_gradients, segment)
-    results.append((name, index, dtw_dist))
-
-# 排序并过滤相似度前10的结果
-results = sorted(results, key=lambda x: x[2])
-
-# 过滤高度重合的曲线段
-filtered_results = []
-used_indices = set()
-
-for res in results:
-    name, index, dtw_dist = res
-    if all(abs(index - used_index) > len(drawing_gradients) for used_index in used_indices):
-        filtered_results.append(res)
-        used_indices.add(index)
-        if len(filtered_results) >= 25:
-            break
+    curves.append((curve['name'], build_pyramid(measurement_gradients, pyramid_factors)))
+
+# 由粗到细的DTW搜索（Sakoe-Chiba带宽为10%）：在最粗层对所有段打分，保留候选后逐层细化，最后在原始分辨率上精确计算
+band = max(1, len(drawing_gradients) // 10)
+filtered_results, pyramid_stats = pyramid_search(drawing_gradients, curves, pyramid_factors, band=band, top_k=25, exclusion_zone=len(drawing_gradients))
+print(f"各层打分的段数: {pyramid_stats['scored']}")
 
 for res in filtered_results:
     print(f"曲线: {res[0]}, 起始索引: {res[1]}, DTW距离: {res[2]}")
@@ -81,20 +59,23 @@ for res in filtered_results:
 # 可视化所有曲线并高亮相似度前10的曲线段
 fig, ax = plt.subplots(figsize=(20, 8))
 
-# 绘制所有原始曲线
+# 绘制所有原始曲线（数据集中的曲线按存储的整行绘制，索引与金字塔一致）
+def curve_points(name):
+    if name in registry:
+        return registry.time, registry.row(name)
+    curve = next(curve for curve in smoothed_data if curve['name'] == name)
+    return np.array([point['x'][0] for point in curve['data']]), np.array([point['y'] for point in curve['data']])
+
 for curve in smoothed_data:
-    time_values = [point['x'][0] for point in curve['data']]
-    measurement_values = [point['y'] for point in curve['data']]
+    time_values, measurement_values = curve_points(curve['name'])
     ax.plot(time_values, measurement_values, color='lightgray')
 
 # 高亮相似度前10的曲线段
 colors = plt.get_cmap('tab10')
 for i, (name, index, dtw_dist) in enumerate(filtered_results):
-    curve = next(curve for curve in smoothed_data if curve['name'] == name)
-    segment = curve['data'][index:index + len(drawing_gradients)]
-    time_values = [point['x'][0] for point in segment]
-    measurement_values = [point['y'] for point in segment]
-    ax.plot(time_values, measurement_values, label=f"Segment {i+1} (DTW: {dtw_dist:.2f})", linewidth=2.5, color=colors(i / len(filtered_results)))
+    time_values, measurement_values = curve_points(name)
+    segment = slice(index, index + len(drawing_gradients))
+    ax.plot(time_values[segment], measurement_values[segment], label=f"Segment {i+1} (DTW: {dtw_dist:.2f})", linewidth=2.5, color=colors(i / len(filtered_results)))
 
 ax.set_title('Highlighted Matching Segments')
 ax.set_xlabel('Time')
@@ -1,9 +1,11 @@
+import os
+import sys
 import numpy as np
 import json
 import matplotlib.pyplot as plt
-from scipy.spatial.distance import euclidean
-from fastdtw import fastdtw
-from tqdm import tqdm
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.Subsequence_DTW import spring_search
 
 # 读取JSON文件
 with open('drawing.json', 'r') as drawing_file:
@@ -27,41 +29,18 @@ drawing_gradients = np.sqrt(drawing_gradients_x**2 + drawing_gradients_y**2)
 drawing_gradients = np.asarray(drawing_gradients).flatten()  # 转换为一维数组
 
 # 提取时间序列数据并计算梯度
-all_segments = []
+curves = []
 for curve in smoothed_data:
     measurement_values = [point['y'] for point in curve['data']]
     measurement_gradients = np.gradient(measurement_values)
     measurement_gradients = np.asarray(measurement_gradients).flatten()  # 转换为一维数组
-    for i in range(len(measurement_gradients) - len(drawing_gradients) + 1):
-        segment = measurement_gradients[i:i + len(drawing_gradients)]
-        all_segments.append((curve['name'], i, segment))
-
-# 动态时间规整（DTW）
-def dtw_distance(s1, s2):
-    s1 = np.asarray(s1).flatten()  # 确保s1是一维数组
-    s2 = np.asarray(s2).flatten()  # 确保s2是一维数组
-    distance, path = fastdtw(s1, s2, dist=lambda x, y: np.abs(x - y))  # 使用绝对差作为距离度量
-    return distance
-
-# 计算相似度
-results = []
-for name, index, segment in tqdm(all_segments, desc="Processing segments"):
-    segment = np.asarray(segment).flatten()  # 确保segment是numpy一维数组
-    dtw_dist = dtw_distance(drawing_gradients, segment)
-    results.append((name, index, dtw_dist))
+    curves.append((curve['name'], measurement_gradients))
 
 # 设置相似度阈值
 similarity_threshold = 170  # 根据实际情况调整此值
 
-# 过滤非高度重合并低于阈值的曲线段
-filtered_results = []
-used_indices = set()
-
-for res in results:
-    name, index, dtw_dist = res
-    if dtw_dist <= similarity_threshold and all(abs(index - used_index) > len(drawing_gradients) for used_index in used_indices):
-        filtered_results.append(res)
-        used_indices.add(index)
+# 子序列DTW（SPRING）：每条曲线只扫描一次，返回低于阈值且互不重合的曲线段
+filtered_results = spring_search(drawing_gradients, curves, threshold=similarity_threshold)
 
 for res in filtered_results:
     print(f"曲线: {res[0]}, 起始索引: {res[1]}, DTW距离: {res[2]}")
@@ -1,3 +1,5 @@
+import os
+import sys
 import json
 import numpy as np
 from scipy.spatial.distance import euclidean
@@ -6,6 +8,9 @@ import heapq
 from tqdm import tqdm
 from multiprocessing import Pool, cpu_count
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.Gap_Mask import valid_windows
+
 # 读取drawing.json文件
 with open('../static/Data/drawing.json', 'r') as file:
     drawing_data = json.load(file)
@@ -24,26 +29,15 @@ for obj in drawing_data['objects']:
 
 drawing_coords = np.array(drawing_coords)
 
-# 提取hcn数据，并确保数据为数值类型
-def flatten_and_filter(data):
-    flat_data = []
-    for item in data:
-        if isinstance(item, list):
-            flat_data.extend(flatten_and_filter(item))
-        elif isinstance(item, (int, float)):
-            flat_data.append(float(item))
-    return flat_data
-
 # 只提取hcn数据中的第十条数据
 hcn_first_data = hcn_data['hcn'][10] if isinstance(hcn_data['hcn'], list) and len(hcn_data['hcn']) > 0 else []
-hcn_coords = flatten_and_filter(hcn_first_data)
-hcn_coords = np.array(hcn_coords)
+hcn_coords = np.array(hcn_first_data, dtype=np.float64)  # null转为NaN并保留在原位，窗口起点与time数组对齐
 
 # 归一化函数
 def normalize(data):
     data = np.array(data)
-    data_min = np.min(data, axis=0)
-    data_max = np.max(data, axis=0)
+    data_min = np.nanmin(data, axis=0)
+    data_max = np.nanmax(data, axis=0)
     return (data - data_min) / (data_max - data_min), data_min, data_max
 
 # 归一化手绘数据和hcn数据
@@ -59,17 +53,18 @@ def calculate_similarity(args):
 # 找到前10个最匹配的段落
 def find_top_matches(drawing_coords, hcn_coords, hcn_coords_norm, window_size=100, top_n=10, threshold=None):
     top_matches = []
-    total_segments = len(hcn_coords) - window_size + 1
+    # 跳过含缺失值的窗口（掩码前缀和判断），起点仍是原始索引
+    starts = np.flatnonzero(valid_windows(~np.isnan(hcn_coords), window_size))
 
     segments = [(drawing_coords, np.array([(x, y) for x, y in enumerate(hcn_coords_norm[i:i + window_size])])) for i in
-                range(total_segments)]
+                starts]
 
     # 使用多进程池并行计算
     with Pool(processes=cpu_count()) as pool:
         distances = list(
-            tqdm(pool.imap(calculate_similarity, segments), total=total_segments, desc="Processing segments"))
+            tqdm(pool.imap(calculate_similarity, segments), total=len(segments), desc="Processing segments"))
 
-    for i, distance in enumerate(distances):
+    for i, distance in zip(starts, distances):
         if threshold is not None and distance > threshold:
             continue
         segment = hcn_coords[i:i + window_size]
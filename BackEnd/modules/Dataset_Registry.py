@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import numpy as np
+from modules.PAA_Pyramid import PYRAMID_FACTORS, build_pyramid
+
+
+STORE_ARRAYS = ('values', 'time', 'valid')
+
+
+def save_store(directory, values, time, names, dtype=np.float64):
+    """
+    Write a dataset as a columnar store: one .npy file per array (`values` with one
+    contiguous row per curve, the shared `time` axis and the `valid` mask) and the curve
+    names in meta.json. Plain .npy files can be memory-mapped, unlike .npz archives.
+    The PAA pyramid of the curves' gradients (see gradient_pyramid) is stored alongside
+    as paa_<factor>.npy.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    time = np.asarray(time, dtype=np.float64).ravel()
+    valid = ~np.isnan(values) & ~np.isnan(time)
+    os.makedirs(directory, exist_ok=True)
+    arrays = {"values": values.astype(dtype), "time": time, "valid": valid}
+    for name in STORE_ARRAYS:
+        np.save(os.path.join(directory, f'{name}.npy'), np.ascontiguousarray(arrays[name]))
+    for factor, level in gradient_pyramid(values).items():
+        np.save(os.path.join(directory, f'paa_{factor}.npy'), np.ascontiguousarray(level.astype(dtype)))
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({"names": list(names), "dtype": np.dtype(dtype).name, "pyramid": list(PYRAMID_FACTORS)}, f)
+
+
+def gradient_pyramid(values, factors=PYRAMID_FACTORS):
+    # {factor: PAA level} of the gradient of every row, the series DTW_match_Downsampling matches
+    values = np.asarray(values, dtype=np.float64)
+    gradients = np.gradient(values, axis=-1) if values.shape[-1] > 1 else np.zeros_like(values)
+    return build_pyramid(gradients, factors)
+
+
+class DatasetRegistry:
+    """
+    hcnData loaded once into contiguous NumPy arrays: `values` has one row per curve
+    (NaN where the measurement is missing), `time` is the shared time axis. Curves are
+    keyed by the names the frontend uses, e.g. '4043/hcn_ne001'. Arrays from a columnar
+    store stay memory-mapped, so rows are only read when a curve is used.
+    """
+
+    def __init__(self, values, time, names, valid=None, levels=None):
+        values = np.asarray(values)
+        if values.dtype not in (np.float32, np.float64):
+            values = values.astype(np.float64)
+        self.values = values if values.flags.c_contiguous else np.ascontiguousarray(values)
+        self.time = np.ascontiguousarray(time, dtype=np.float64).ravel()
+        self.names = list(names)
+        self.index = {name: row for row, name in enumerate(self.names)}
+        self.valid = ~np.isnan(self.values) & ~np.isnan(self.time) if valid is None else valid
+        self.levels = levels  # factor -> PAA level of the gradients, built on first use when not stored
+        self._version = None
+
+    @classmethod
+    def load(cls, path, first_shot=4043, channel='hcn_ne001'):
+        # Read a columnar store directory, hcnData.json or hcnData.mat
+        if os.path.isdir(path):
+            return cls.load_store(path)
+        if os.path.splitext(path)[1] == '.mat':
+            import scipy.io
+            mat_data = scipy.io.loadmat(path)
+            hcn, time = mat_data['hcn'], mat_data['time']
+        else:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            # JSON stores missing samples as null
+            hcn = np.array(data['hcn'], dtype=np.float64)
+            time = np.array(data['time'], dtype=np.float64)
+        names = [f'{first_shot + row}/{channel}' for row in range(len(hcn))]
+        return cls(hcn, time, names)
+
+    @classmethod
+    def load_store(cls, directory, mmap_mode='r'):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        values, time, valid = (
+            np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in STORE_ARRAYS
+        )
+        # Stores written before the pyramid existed build it on first use
+        levels = {
+            factor: np.load(os.path.join(directory, f'paa_{factor}.npy'), mmap_mode=mmap_mode)
+            for factor in meta.get('pyramid', [])
+        } or None
+        return cls(values, time, meta['names'], valid, levels)
+
+    @property
+    def version(self):
+        # Digest of the curve names, time axis and values, computed on first use; changes with any stored sample
+        if self._version is None:
+            digest = hashlib.sha256(json.dumps(self.names).encode('utf-8'))
+            digest.update(self.values.dtype.str.encode('ascii'))
+            digest.update(np.ascontiguousarray(self.time, dtype='<f8').tobytes())
+            for row in self.values:
+                digest.update(row.tobytes())
+            self._version = digest.hexdigest()
+        return self._version
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def curve(self, name):
+        """
+        (name, time, values) for one curve with missing samples dropped, matching the
+        points the frontend plots and uploads.
+        """
+        row = self.index[name]
+        valid = self.valid[row]
+        return name, self.time[valid], self.values[row][valid]
+
+    def row(self, name):
+        # The full stored row, NaN where missing; a view into the store without copying
+        return self.values[self.index[name]]
+
+    def pyramid(self, name):
+        # {factor: PAA row} of one curve's gradient, as stored rows are indexed; NaN marks gaps as in row()
+        if self.levels is None:
+            levels = gradient_pyramid(self.values)
+            self.levels = {factor: level.astype(self.values.dtype, copy=False) for factor, level in levels.items()}
+        row = self.index[name]
+        return {factor: level[row] for factor, level in self.levels.items()}
+
+    def curves(self, names):
+        unknown = [name for name in names if name not in self.index]
+        if unknown:
+            raise KeyError(f"Unknown curves: {', '.join(unknown)}")
+        return [self.curve(name) for name in names]
+
+    def describe(self):
+        return [
+            {"name": name, "length": int(self.valid[row].sum())}
+            for row, name in enumerate(self.names)
+        ]
@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def fill_gaps(values, fill=0.0):
+    """
+    Missing samples (None in the JSON, NaN in arrays) replaced by `fill` so FFT and
+    cumulative-sum engines stay finite, plus the validity mask. Samples keep their
+    positions, so window indices stay aligned with the time axis.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    return np.where(valid, values, fill), valid
+
+
+def missing_counts(valid, m):
+    # Missing samples in every length-m window along the last axis, from a prefix sum of the mask
+    valid = np.asarray(valid, dtype=bool)
+    prefix = np.zeros(valid.shape[:-1] + (valid.shape[-1] + 1,), dtype=np.int64)
+    np.cumsum(valid, axis=-1, out=prefix[..., 1:])
+    return m - (prefix[..., m:] - prefix[..., :-m])
+
+
+def valid_windows(valid, m):
+    # True for windows without missing samples
+    return missing_counts(valid, m) == 0
+
+
+def mask_profile(profile, valid, m, larger_is_better=False, gap_penalty=None, hop=1):
+    """
+    Apply the validity mask to a profile of window scores (same leading shape as
+    `valid`, one score per window start, starts `hop` apart). By default windows that
+    cross a gap are skipped (scored inf, or -inf for similarities); with `gap_penalty`
+    each missing sample instead worsens the score by that amount.
+    """
+    missing = missing_counts(valid, m)[..., ::hop][..., :profile.shape[-1]]
+    sign = -1 if larger_is_better else 1
+    if gap_penalty is None:
+        return np.where(missing > 0, sign * np.inf, profile)
+    return profile + sign * gap_penalty * missing
@@ -0,0 +1,62 @@
+from bisect import bisect_left
+import numpy as np
+
+
+def interval_nms(curves, starts, ends, scores, overlap_ratio=0.0, larger_is_better=True, limit=None):
+    """
+    Greedy non-max suppression of candidate intervals [start, end) grouped by curve.
+    Candidates are visited best score first (ties keep their input order, NaN scores
+    last) and kept unless they overlap an interval already kept on the same curve by
+    more than `overlap_ratio` times the shorter of the two. Kept intervals on a curve
+    are held sorted by start, so each check is a bisection plus the few neighbours
+    that actually overlap, O(n log n) overall. Returns the positions of the kept
+    candidates in the order they were kept, at most `limit` of them.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    keys = -scores if larger_is_better else scores
+    order = np.argsort(np.where(np.isnan(keys), np.inf, keys), kind='stable')
+
+    kept = []
+    kept_starts, kept_ends = {}, {}  # curve -> sorted starts and matching ends
+    for position in order:
+        curve = curves[position]
+        start, end = int(starts[position]), int(ends[position])
+        curve_starts = kept_starts.setdefault(curve, [])
+        curve_ends = kept_ends.setdefault(curve, [])
+        slot = bisect_left(curve_starts, start)
+        if not _overlaps(curve_starts, curve_ends, slot, start, end, overlap_ratio):
+            curve_starts.insert(slot, start)
+            curve_ends.insert(slot, end)
+            kept.append(int(position))
+            if limit is not None and len(kept) >= limit:
+                break
+    return np.array(kept, dtype=np.int64)
+
+
+def window_nms(curves, starts, scores, length, overlap_ratio=0.0, larger_is_better=True, limit=None):
+    # Non-max suppression of fixed-length windows starting at `starts`
+    starts = np.asarray(starts, dtype=np.int64)
+    return interval_nms(curves, starts, starts + length, scores, overlap_ratio, larger_is_better, limit)
+
+
+def _overlaps(kept_starts, kept_ends, slot, start, end, overlap_ratio):
+    # No kept interval contains another (that would be a full overlap), so ends follow
+    # the start order and only the runs of neighbours reaching [start, end) need checking
+    def too_close(other):
+        other_start, other_end = kept_starts[other], kept_ends[other]
+        overlap = min(end, other_end) - max(start, other_start)
+        return overlap > overlap_ratio * min(end - start, other_end - other_start)
+
+    other = slot - 1
+    while other >= 0 and kept_ends[other] > start:
+        if too_close(other):
+            return True
+        other -= 1
+    other = slot
+    while other < len(kept_starts) and kept_starts[other] < end:
+        if too_close(other):
+            return True
+        other += 1
+    return False
@@ -0,0 +1,137 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from modules.Cancellation import AnalysisCancelled, CancelToken
+from modules.Result_Table import TopkStream
+
+
+class AnalysisJob:
+    # One similarity query: its inputs, progress and results live only in memory
+    def __init__(self, drawing, curves, smoothness, client=None):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.token = CancelToken()
+        self.topk = TopkStream()  # best rows streamed while the job runs
+        self.drawing = drawing
+        self.curves = curves
+        self.smoothness = smoothness
+        self.status = 'queued'
+        self.progress = 0
+        self.results = None
+        self.stats = {}
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "smoothness": self.smoothness,
+            "stats": self.stats,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    def __init__(self, max_finished_jobs=100):
+        self.max_finished_jobs = max_finished_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, drawing, curves, smoothness, client=None):
+        # A new queued job, of the given client if known
+        job = AnalysisJob(drawing, curves, smoothness, client)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        return job
+
+    def supersede(self, job):
+        """
+        Cancel the unfinished jobs of `job`'s client other than `job`, so the cores go to
+        the query the analyst now waits for. Called once the new query has been accepted.
+        """
+        if job.client is None:
+            return
+        with self._lock:
+            for other in self._jobs.values():
+                if other is not job and other.client == job.client and other.status in ('queued', 'running'):
+                    other.token.cancel()
+
+    def cancel(self, job_id):
+        # Ask an unfinished job to stop; False if there is no such job
+        job = self.get(job_id)
+        if job is None or job.status not in ('queued', 'running'):
+            return False
+        job.token.cancel()
+        return True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def latest_complete(self, client):
+        # The given client's most recently completed job; other clients' jobs are never returned
+        with self._lock:
+            complete = [job for job in self._jobs.values() if job.status == 'complete' and job.client == client]
+        return max(complete, key=lambda job: job.finished) if complete else None
+
+    def finish(self, job, results):
+        # Complete a job without running it, e.g. when its results are already cached
+        job.results = results
+        job.progress = 100
+        job.status = 'complete'
+        job.finished = time.time()
+        job.drawing = None
+        job.curves = None
+
+    def run(self, job, analysis, on_progress=None, progress_interval=0.2):
+        """
+        Drive an analysis generator (see Combined_Match.analyze_similarity) for `job`,
+        recording progress and the generator's return value as the job results.
+        `on_progress` is called when the progress has changed, at most every
+        `progress_interval` seconds, so a query over thousands of curves sends a few
+        updates per second rather than one per curve.
+        """
+        job.status = 'running'
+        reported, last_report = None, -float('inf')
+        try:
+            # A job superseded while queued does not start
+            job.token.check()
+            while True:
+                try:
+                    progress = next(analysis)
+                except StopIteration as stop:
+                    job.results = stop.value
+                    break
+                job.progress = progress
+                if (on_progress is not None and progress != reported
+                        and time.monotonic() - last_report >= progress_interval):
+                    reported, last_report = progress, time.monotonic()
+                    on_progress(job)
+            job.progress = 100
+            job.status = 'complete'
+        except AnalysisCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            print("Exception occurred:")
+            print(traceback.format_exc())
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            # Inputs are no longer needed once the job has finished
+            job.drawing = None
+            job.curves = None
+            with self._lock:
+                self._evict()
+
+    def _evict(self):
+        # Drop the oldest finished jobs beyond the retention limit
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ('complete', 'failed', 'cancelled')]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
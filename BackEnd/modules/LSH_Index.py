@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import next_fast_len, irfft, rfft
+from modules.Gap_Mask import fill_gaps, valid_windows
+
+INDEX_ARRAYS = ('planes', 'series', 'offsets', 'window_curve', 'window_start', 'codes', 'order', 'sorted_codes')
+
+
+def curve_digest(series):
+    return hashlib.sha1(np.ascontiguousarray(series, dtype=np.float64).tobytes()).hexdigest()
+
+
+def unit_windows(series, starts, m):
+    # L2-normalised windows (zero windows stay zero, as sklearn's normalize does)
+    windows = sliding_window_view(series, m)[starts]
+    norms = np.linalg.norm(windows, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return windows / norms
+
+
+class LSHIndex:
+    """
+    Random-projection (sign / cosine) LSH over every length-m window of a set of
+    curves. Each of `n_tables` tables hashes a window to `n_bits` hyperplane signs;
+    a query's candidates are the windows sharing its bucket in any table, re-ranked
+    by the exact Euclidean distance between L2-normalised windows. More tables raise
+    recall, more bits shrink buckets. All state is plain arrays, saved as .npy files
+    and memory-mapped on load; buckets are per-table sorted code arrays.
+    """
+
+    def __init__(self, window_length, n_tables=8, n_bits=12, seed=0):
+        if not 0 < n_bits <= 32:
+            raise ValueError("n_bits must be between 1 and 32")
+        self.window_length = window_length
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.seed = seed
+        self.names = []
+        self.digests = {}
+        self.scope = None  # names queries are restricted to by default; None searches every curve
+        self.planes = np.random.default_rng(seed).standard_normal((n_tables * n_bits, window_length))
+        self.series = np.empty(0)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.window_curve = np.empty(0, dtype=np.int32)
+        self.window_start = np.empty(0, dtype=np.int32)
+        self.codes = np.empty((0, n_tables), dtype=np.uint32)
+        self.order = np.empty((n_tables, 0), dtype=np.int64)
+        self.sorted_codes = np.empty((n_tables, 0), dtype=np.uint32)
+
+    @property
+    def params(self):
+        return {"window_length": self.window_length, "n_tables": self.n_tables, "n_bits": self.n_bits, "seed": self.seed}
+
+    def __len__(self):
+        return len(self.window_curve)
+
+    def hash_series(self, series):
+        # Bucket codes of every window of one series, shape (windows, n_tables)
+        series = np.asarray(series, dtype=np.float64)
+        if len(series) < self.window_length:
+            return np.empty((0, self.n_tables), dtype=np.uint32)
+        # Sliding dot products with every hyperplane from one FFT of the series; the sign
+        # does not depend on the window norm, so windows need no normalising here
+        m, n = self.window_length, len(series)
+        size = next_fast_len(n + m - 1, real=True)
+        products = irfft(rfft(series, size) * rfft(self.planes[:, ::-1], size, axis=1), size, axis=1)
+        signs = products[:, m - 1:n] > 0
+        bits = signs.reshape(self.n_tables, self.n_bits, -1).astype(np.uint32)
+        weights = (np.uint32(1) << np.arange(self.n_bits, dtype=np.uint32))[:, np.newaxis]
+        return (bits * weights).sum(axis=1, dtype=np.uint32).T
+
+    def hash_query(self, query):
+        query = np.asarray(query, dtype=np.float64)
+        return self.hash_series(query)[0]
+
+    def add(self, curves):
+        # Index new (name, series) curves; buckets are re-sorted once per call. Windows
+        # crossing NaN samples are left out, the others keep their original start index
+        series_parts, curve_parts, start_parts, code_parts = [self.series], [self.window_curve], [self.window_start], [self.codes]
+        offsets = list(self.offsets)
+        for name, series in curves:
+            if name in self.digests:
+                raise ValueError(f"Curve already indexed: {name}")
+            series = np.asarray(series, dtype=np.float64)
+            curve_number = len(self.names)
+            self.names.append(name)
+            self.digests[name] = curve_digest(series)
+            series, valid = fill_gaps(series)
+            starts = np.empty(0, dtype=np.int64)
+            if len(series) >= self.window_length:
+                starts = np.flatnonzero(valid_windows(valid, self.window_length))
+            series_parts.append(series)
+            offsets.append(offsets[-1] + len(series))
+            curve_parts.append(np.full(len(starts), curve_number, dtype=np.int32))
+            start_parts.append(starts.astype(np.int32))
+            code_parts.append(self.hash_series(series)[starts])
+
+        self.series = np.concatenate(series_parts)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.window_curve = np.concatenate(curve_parts)
+        self.window_start = np.concatenate(start_parts)
+        self.codes = np.concatenate(code_parts)
+        self.order = np.argsort(self.codes.T, axis=1, kind='stable')
+        self.sorted_codes = np.take_along_axis(self.codes.T, self.order, axis=1)
+
+    def query(self, query, top_k=100, names=None):
+        """
+        Approximate nearest windows to `query` as (name, start index, distance) tuples
+        sorted by distance, plus stats with the number of windows, the candidates
+        found in each table and the size of their union. Only windows of `names` are
+        returned, by default the curves the index was opened for (see open).
+        """
+        query = np.asarray(query, dtype=np.float64)
+        if len(query) != self.window_length:
+            raise ValueError(f"Query length {len(query)} does not match window length {self.window_length}")
+        query_codes = self.hash_query(query)
+
+        per_table = []
+        candidates = []
+        for table, code in enumerate(query_codes):
+            lo = np.searchsorted(self.sorted_codes[table], code, side='left')
+            hi = np.searchsorted(self.sorted_codes[table], code, side='right')
+            per_table.append(int(hi - lo))
+            candidates.append(self.order[table][lo:hi])
+        candidates = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, dtype=np.int64)
+        names = self.scope if names is None else names
+        if names is not None:
+            # A persisted index can hold more curves than were asked for
+            names = set(names)
+            wanted = np.array([name in names for name in self.names], dtype=bool)
+            candidates = candidates[wanted[self.window_curve[candidates]]]
+        stats = {"windows": len(self), "candidates": len(candidates), "per_table": per_table}
+
+        norm = np.linalg.norm(query)
+        unit_query = query / norm if norm else query
+        distances = np.empty(len(candidates))
+        window_curves = self.window_curve[candidates]
+        for curve_number in np.unique(window_curves):
+            in_curve = window_curves == curve_number
+            series = self.series[self.offsets[curve_number]:self.offsets[curve_number + 1]]
+            windows = unit_windows(series, self.window_start[candidates[in_curve]], self.window_length)
+            distances[in_curve] = np.linalg.norm(windows - unit_query, axis=1)
+
+        best = np.argsort(distances, kind='stable')[:top_k]
+        results = [
+            (self.names[self.window_curve[candidates[i]]], int(self.window_start[candidates[i]]), float(distances[i]))
+            for i in best
+        ]
+        return results, stats
+
+    def save(self, directory):
+        # Every file is replaced by rename, so an index memory-mapped from `directory`
+        # keeps reading its old files while the new ones are written
+        os.makedirs(directory, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            tmp_path = os.path.join(directory, f'{name}.tmp.npy')
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(directory, f'{name}.npy'))
+        meta = {**self.params, "names": self.names, "digests": self.digests}
+        tmp_path = os.path.join(directory, 'meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, 'meta.json'))
+
+    @classmethod
+    def load(cls, directory, mmap_mode='r'):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        index = cls(meta['window_length'], meta['n_tables'], meta['n_bits'], meta['seed'])
+        index.names = meta['names']
+        index.digests = meta['digests']
+        for name in INDEX_ARRAYS:
+            setattr(index, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode))
+        return index
+
+    @classmethod
+    def open(cls, directory, curves, window_length, n_tables=8, n_bits=12, seed=0):
+        """
+        Load the index saved in `directory` if it was built with the same parameters and
+        the same data for every curve it holds, index any curves it is missing and save
+        it back; otherwise build it from scratch. Queries of the returned index only
+        return windows of `curves`, even if the saved index holds others.
+        """
+        curves = [(name, np.asarray(series, dtype=np.float64)) for name, series in curves]
+        params = {"window_length": window_length, "n_tables": n_tables, "n_bits": n_bits, "seed": seed}
+        index = None
+        if os.path.exists(os.path.join(directory, 'meta.json')):
+            index = cls.load(directory)
+            stale = index.params != params or any(
+                name in index.digests and index.digests[name] != curve_digest(series) for name, series in curves
+            )
+            if stale:
+                index = None
+
+        if index is None:
+            index = cls(window_length, n_tables, n_bits, seed)
+        missing = [(name, series) for name, series in curves if name not in index.digests]
+        if missing:
+            index.add(missing)
+            index.save(directory)
+        index.scope = [name for name, _ in curves]
+        return index
@@ -1,10 +1,16 @@
+import os
+import sys
 import numpy as np
 import json
 import matplotlib.pyplot as plt
-from tqdm import tqdm
-from sklearn.metrics.pairwise import euclidean_distances
-from sklearn.neighbors import NearestNeighbors
-from sklearn.preprocessing import normalize
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.LSH_Index import LSHIndex
+from modules.Interval_NMS import window_nms
+
+# LSH参数：表越多召回率越高，位数越多桶越小、候选越少
+n_tables = 8
+n_bits = 12
 
 # 读取JSON文件
 with open('drawing.json', 'r') as drawing_file:
@@ -28,38 +34,25 @@ drawing_gradients = np.sqrt(drawing_gradients_x**2 + drawing_gradients_y**2)
 drawing_gradients = np.asarray(drawing_gradients).flatten()  # 转换为一维数组
 
 # 提取时间序列数据并计算梯度
-all_segments = []
+curves = []
 for curve in smoothed_data:
     measurement_values = [point['y'] for point in curve['data']]
     measurement_gradients = np.gradient(measurement_values)
     measurement_gradients = np.asarray(measurement_gradients).flatten()  # 转换为一维数组
-    for i in range(len(measurement_gradients) - len(drawing_gradients) + 1):
-        segment = measurement_gradients[i:i + len(drawing_gradients)]
-        all_segments.append((curve['name'], i, segment))
+    curves.append((curve['name'], measurement_gradients))
 
-# 将所有段和drawing_gradients标准化
-drawing_gradients = normalize(drawing_gradients.reshape(1, -1))[0]
-all_segments_normalized = [normalize(segment.reshape(1, -1))[0] for _, _, segment in all_segments]
+# 按窗口长度持久化的LSH索引：首次构建后保存到磁盘，之后直接内存映射加载，新曲线增量加入
+index = LSHIndex.open(f'lsh_index_{len(drawing_gradients)}', curves, len(drawing_gradients), n_tables, n_bits)
 
-# 使用最近邻搜索（近似）
+# 近似最近邻查询（窗口与手绘梯度均按L2标准化后比较欧氏距离）
 n_neighbors = 100
-nbrs = NearestNeighbors(n_neighbors=n_neighbors, algorithm='ball_tree').fit(all_segments_normalized)
-distances, indices = nbrs.kneighbors([drawing_gradients])
-
-# 获取最相似的段
-results = [(all_segments[i][0], all_segments[i][1], distances[0][j]) for j, i in enumerate(indices[0])]
-
-# 过滤高度重合的曲线段
-filtered_results = []
-used_indices = set()
-
-for res in results:
-    name, index, distance = res
-    if all(abs(index - used_index) > len(drawing_gradients) for used_index in used_indices):
-        filtered_results.append(res)
-        used_indices.add(index)
-        if len(filtered_results) >= 25:
-            break
+results, stats = index.query(drawing_gradients, top_k=n_neighbors)
+print(f"候选窗口: {stats['candidates']} / {stats['windows']}, 各表候选数: {stats['per_table']}")
+
+# 过滤高度重合的曲线段：按曲线分组做区间非极大值抑制，只有同一条曲线上重叠超过overlap_ratio的段才互相抑制
+overlap_ratio = 0.0
+kept = window_nms([res[0] for res in results], [res[1] for res in results], [res[2] for res in results], len(drawing_gradients), overlap_ratio, larger_is_better=False, limit=25)
+filtered_results = [results[k] for k in kept]
 
 for res in filtered_results:
     print(f"曲线: {res[0]}, 起始索引: {res[1]}, 近似距离: {res[2]}")
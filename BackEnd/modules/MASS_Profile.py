@@ -0,0 +1,118 @@
+import numpy as np
+from scipy.fft import next_fast_len, irfft, rfft
+from modules.Gap_Mask import fill_gaps, mask_profile
+
+
+def pad_curves(curves):
+    # Stack (name, series) curves into one zero-padded batch plus their true lengths
+    names = [name for name, _ in curves]
+    series = [np.asarray(values, dtype=np.float64) for _, values in curves]
+    lengths = np.array([len(values) for values in series], dtype=np.int64)
+    batch = np.zeros((len(series), lengths.max(initial=0)))
+    for row, values in enumerate(series):
+        batch[row, :len(values)] = values
+    return names, batch, lengths
+
+
+def sliding_dot_products(query, series_batch):
+    """
+    Dot product of `query` with every window of every row of `series_batch`
+    (shape curves x n) via one batched FFT convolution, O(n log n) per row.
+    Returns shape (curves, n - m + 1).
+    """
+    query = np.asarray(query, dtype=np.float64)
+    series_batch = np.atleast_2d(series_batch)
+    m, n = len(query), series_batch.shape[1]
+    size = next_fast_len(n + m - 1, real=True)
+    products = irfft(rfft(series_batch, size, axis=1) * rfft(query[::-1], size), size, axis=1)
+    return products[:, m - 1:n]
+
+
+def rolling_sums(series_batch, m):
+    # Window sums of x and x^2 from cumulative sums, shape (curves, n - m + 1)
+    zeros = np.zeros((series_batch.shape[0], 1))
+    cumsum = np.concatenate([zeros, np.cumsum(series_batch, axis=1)], axis=1)
+    cumsum_sq = np.concatenate([zeros, np.cumsum(series_batch ** 2, axis=1)], axis=1)
+    return cumsum[:, m:] - cumsum[:, :-m], cumsum_sq[:, m:] - cumsum_sq[:, :-m]
+
+
+def distance_profiles(query, series_batch, metric='znorm_euclidean'):
+    """
+    Distance of `query` to every window of every row of `series_batch`:
+    'znorm_euclidean' is Mueen's MASS (Euclidean distance after z-normalising the
+    query and each window), 'euclidean' the plain Euclidean distance and 'cosine'
+    the cosine similarity (zero-norm windows score 0, as sklearn's normalize does).
+    Rows must be finite; mass_search fills and masks missing samples.
+    """
+    query = np.asarray(query, dtype=np.float64)
+    series_batch = np.atleast_2d(np.asarray(series_batch, dtype=np.float64))
+    m = len(query)
+    if series_batch.shape[1] < m:
+        return np.empty((series_batch.shape[0], 0))
+
+    if metric == 'znorm_euclidean':
+        # z-normalisation is shift invariant; centring each row keeps the cumulative sums precise
+        series_batch = series_batch - series_batch.mean(axis=1, keepdims=True)
+        query = query - query.mean()
+
+    dot = sliding_dot_products(query, series_batch)
+    window_sum, window_sum_sq = rolling_sums(series_batch, m)
+
+    if metric == 'euclidean':
+        return np.sqrt(np.maximum(np.dot(query, query) + window_sum_sq - 2 * dot, 0))
+
+    if metric == 'cosine':
+        query_norm = np.linalg.norm(query) or 1.0
+        window_norm = np.sqrt(np.maximum(window_sum_sq, 0))
+        window_norm[window_norm < 1e-12] = 1.0
+        return dot / query_norm / window_norm
+
+    if metric == 'znorm_euclidean':
+        query_std = query.std()
+        window_mean = window_sum / m
+        window_var = np.maximum(window_sum_sq / m - window_mean ** 2, 0)
+        window_std = np.sqrt(window_var)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = (dot - m * query.mean() * window_mean) / (m * query_std * window_std)
+        distances = np.sqrt(np.maximum(2 * m * (1 - correlation), 0))
+        # Flat windows or a flat query: 0 if both are flat, otherwise the maximal sqrt(m).
+        # Cumulative sums leave rounding noise in the variance, so flatness is relative.
+        flat_window = window_var <= 1e-10 * np.maximum(window_sum_sq / m, np.finfo(np.float64).tiny)
+        if query_std < 1e-12:
+            distances = np.where(flat_window, 0.0, np.sqrt(m))
+        else:
+            distances[flat_window] = np.sqrt(m)
+        return distances
+
+    raise ValueError(f"Unknown metric: {metric}")
+
+
+def mass_search(query, curves, metric='znorm_euclidean', top_k=10, threshold=None, gap_penalty=None):
+    """
+    Score every offset of every (name, series) curve in one batched call and return
+    the best (name, index, score) tuples: smallest distances, or largest cosine
+    similarities. `threshold` keeps only distances <= threshold (similarities >= it).
+    Series may contain NaN for missing samples; indices still count them, and windows
+    crossing a gap are skipped, or penalised per missing sample with `gap_penalty`.
+    """
+    names, batch, lengths = pad_curves(curves)
+    batch, valid_samples = fill_gaps(batch)
+    m = len(query)
+    larger_is_better = metric == 'cosine'
+    profiles = distance_profiles(query, batch, metric)
+    profiles = mask_profile(profiles, valid_samples, m, larger_is_better, gap_penalty)
+    valid = np.arange(profiles.shape[1]) < (lengths - m + 1)[:, np.newaxis]
+
+    scores = -profiles if larger_is_better else profiles.copy()
+    scores[~valid] = np.inf
+    if threshold is not None:
+        scores[scores > (-threshold if larger_is_better else threshold)] = np.inf
+
+    flat = scores.ravel()
+    count = int(np.isfinite(flat).sum()) if top_k is None else min(top_k, int(np.isfinite(flat).sum()))
+    if count == 0:
+        return []
+    best = np.argpartition(flat, count - 1)[:count]
+    best = best[np.argsort(flat[best], kind='stable')]
+    rows, starts = np.unravel_index(best, scores.shape)
+    return [(names[row], int(start), float(profiles[row, start])) for row, start in zip(rows, starts)]
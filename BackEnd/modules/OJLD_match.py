@@ -1,9 +1,11 @@
+import os
+import sys
 import json
 import numpy as np
-from scipy.spatial.distance import euclidean
-import heapq
-from tqdm import tqdm
-from multiprocessing import Pool, cpu_count
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.MASS_Profile import distance_profiles
+from modules.Gap_Mask import fill_gaps, mask_profile
 
 # 读取drawing.json文件
 with open('../static/Data/drawing.json', 'r') as file:
@@ -23,66 +25,33 @@ for obj in drawing_data['objects']:
 
 drawing_coords = np.array(drawing_coords)
 
-# 提取hcn数据，并确保数据为数值类型
-def flatten_and_filter(data):
-    flat_data = []
-    for item in data:
-        if isinstance(item, list):
-            flat_data.extend(flatten_and_filter(item))
-        elif isinstance(item, (int, float)):
-            flat_data.append(float(item))
-    return flat_data
-
 # 只提取hcn数据中的第十条数据
 hcn_first_data = hcn_data['hcn'][10] if isinstance(hcn_data['hcn'], list) and len(hcn_data['hcn']) > 0 else []
-hcn_coords = flatten_and_filter(hcn_first_data)
-hcn_coords = np.array(hcn_coords)
+hcn_coords = np.array(hcn_first_data, dtype=np.float64)  # null转为NaN并保留在原位，窗口起点与time数组对齐
 
 # 归一化函数
 def normalize(data):
     data = np.array(data)
-    data_min = np.min(data, axis=0)
-    data_max = np.max(data, axis=0)
+    data_min = np.nanmin(data, axis=0)
+    data_max = np.nanmax(data, axis=0)
     return (data - data_min) / (data_max - data_min), data_min, data_max
 
 # 归一化手绘数据和hcn数据
 drawing_coords_norm, drawing_min, drawing_max = normalize(drawing_coords)
 hcn_coords_norm, hcn_min, hcn_max = normalize(hcn_coords)
 
-# 计算相似度的函数，使用欧几里得距离
-def calculate_similarity(args):
-    drawing_coords, segment_coords = args
-    return euclidean(drawing_coords.flatten(), segment_coords.flatten())
-
-# 找到前10个最匹配的段落
+# 找到前10个最匹配的段落：FFT滑动点积 + 累积和一次算出所有偏移的欧几里得距离，无需逐段分发到进程池
 def find_top_matches(drawing_coords, hcn_coords, hcn_coords_norm, window_size, top_n=10, threshold=None):
-    top_matches = []
-    total_segments = len(hcn_coords) - window_size + 1
-
-    segments = [
-        (drawing_coords, hcn_coords_norm[i:i + window_size])
-        for i in range(total_segments)
-        if len(hcn_coords_norm[i:i + window_size]) == window_size
-    ]
-
-    # 使用多进程池并行计算
-    with Pool(processes=cpu_count()) as pool:
-        distances = list(
-            tqdm(pool.imap(calculate_similarity, segments), total=len(segments), desc="Processing segments"))
-
-    for i, distance in enumerate(distances):
-        if threshold is not None and distance > threshold:
-            continue
-        segment = hcn_coords[i:i + window_size]
-        if len(top_matches) < top_n:
-            heapq.heappush(top_matches, (distance, segment))
-        else:
-            heapq.heappushpop(top_matches, (distance, segment))
-
-    # 转换回正距离排序
-    top_matches.sort()
+    # 缺失值先填0参与FFT，再用掩码前缀和把跨越空缺的窗口剔除，索引保持与time对齐
+    hcn_filled, valid = fill_gaps(hcn_coords_norm)
+    distances = distance_profiles(drawing_coords, hcn_filled, metric='euclidean')[0]
+    distances = mask_profile(distances, valid, window_size)
+    candidates = np.flatnonzero(np.isfinite(distances))
+    if threshold is not None:
+        candidates = candidates[distances[candidates] <= threshold]
 
-    return top_matches
+    order = candidates[np.argsort(distances[candidates], kind='stable')[:top_n]]
+    return [(distances[i], hcn_coords[i:i + window_size]) for i in order]
 
 if __name__ == "__main__":
     similarity_threshold = None  # 设置相似度阈值，例如500，可以设置为None表示不使用阈值
@@ -90,8 +59,8 @@ if __name__ == "__main__":
     # 确保窗口大小与手绘数据长度一致
     window_size = len(drawing_coords_norm)
 
-    # 找到前10个最匹配的段落
-    top_matches = find_top_matches(drawing_coords_norm, hcn_coords, hcn_coords_norm, window_size, threshold=similarity_threshold)
+    # 找到前10个最匹配的段落（手绘数据取归一化后的y坐标，与一维hcn窗口逐点比较）
+    top_matches = find_top_matches(drawing_coords_norm[:, 1], hcn_coords, hcn_coords_norm, window_size, threshold=similarity_threshold)
 
     # 打印前10名匹配的段落及其距离
     for i, (distance, match) in enumerate(top_matches):
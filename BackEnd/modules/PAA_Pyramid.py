@@ -0,0 +1,135 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from modules.DTW_Kernel import dtw_batch
+from modules.Interval_NMS import window_nms
+
+# Reduction factors of the pyramid levels; 1 is full resolution
+PYRAMID_FACTORS = (1, 2, 4, 8, 16)
+
+
+def paa(series, factor):
+    """
+    Piecewise aggregate approximation along the last axis: the mean of every block of
+    `factor` consecutive samples. Unlike taking every factor-th sample, every sample
+    contributes, so nothing between the kept samples is aliased away. A trailing
+    partial block is dropped and a block containing NaN is NaN, so gaps survive.
+    """
+    series = np.asarray(series, dtype=np.float64)
+    n_blocks = series.shape[-1] // factor
+    blocks = series[..., :n_blocks * factor].reshape(series.shape[:-1] + (n_blocks, factor))
+    return blocks.mean(axis=-1)
+
+
+def build_pyramid(series, factors=PYRAMID_FACTORS):
+    # {factor: PAA level}; each level is aggregated from the finest level it is a multiple of
+    levels = {}
+    for factor in sorted(factors):
+        base = max((f for f in levels if factor % f == 0), default=None)
+        levels[factor] = paa(series, factor) if base is None else paa(levels[base], factor // base)
+    return levels
+
+
+def pyramid_search(query, curves, factors=PYRAMID_FACTORS, band=None, top_k=10, candidates=None,
+                   exclusion_zone=None, min_blocks=8, per_seed=3):
+    """
+    Coarse-to-fine DTW search of `query` over (name, pyramid) curves, where a pyramid
+    maps each factor in `factors` to the curve's PAA level (see build_pyramid). Every
+    window is scored at the coarsest level only; the best `candidates` starts seed the
+    refinement, where each level re-scores the starts within the one-block uncertainty
+    of the previous level's and keeps the `per_seed` best of every seed. Windows
+    reaching factor 1 are scored exactly at full resolution. The band is scaled with
+    the level, and levels where the query would be shorter than `min_blocks` are
+    skipped. Returns ((name, index, distance) tuples sorted by
+    distance, stats) with full-resolution indices; with `exclusion_zone`, matches on
+    the same curve closer than that to a better one are suppressed, and candidates at
+    the coarsest level are thinned the same way (scaled to the level, allowing half
+    overlap) so that they are not all neighbours of one strong match.
+    """
+    query = np.asarray(query, dtype=np.float64)
+    m = len(query)
+    factors = sorted(set(factors) | {1}, reverse=True)
+    factors = [factor for factor in factors if factor == 1 or m // factor >= min_blocks]
+    band = m if band is None else band
+    candidates = max(10 * (top_k or 1), 100) if candidates is None else candidates
+    query_levels = build_pyramid(query, factors)
+    names = [name for name, _ in curves]
+    stats = {"levels": factors, "scored": {}}
+
+    # Coarsest level: every window of every curve
+    coarsest = factors[0]
+    window_curves, window_starts = [], []
+    for curve_number, (_, pyramid) in enumerate(curves):
+        n_windows = max(len(pyramid[coarsest]) - len(query_levels[coarsest]) + 1, 0)
+        window_curves.append(np.full(n_windows, curve_number))
+        window_starts.append(np.arange(n_windows))
+    window_curves = np.concatenate(window_curves) if curves else np.empty(0, dtype=np.int64)
+    window_starts = np.concatenate(window_starts) if curves else np.empty(0, dtype=np.int64)
+    seeds = np.zeros(len(window_starts), dtype=np.int64)
+
+    for level, factor in enumerate(factors):
+        if level > 0:
+            # A start known to within one block of the previous level spans these finer starts
+            ratio = factors[level - 1] // factor
+            offsets = np.arange(-ratio, ratio + 1)
+            window_curves = np.repeat(window_curves, len(offsets))
+            seeds = np.repeat(seeds, len(offsets))
+            window_starts = (window_starts[:, np.newaxis] * ratio + offsets).ravel()
+            window_curves, window_starts, seeds = _unique_windows(
+                window_curves, window_starts, seeds, curves, len(query_levels[factor]), factor
+            )
+        distances = _score(query_levels[factor], curves, factor, window_curves, window_starts, max(1, band // factor))
+        stats["scored"][factor] = len(distances)
+        finite = np.flatnonzero(np.isfinite(distances))
+        order = finite[np.argsort(distances[finite], kind='stable')]
+
+        if factor != 1 and level == 0:
+            # Seeds: the best coarse windows, thinned so they are not all one match's neighbours.
+            # Only starts within one block of a better seed are dropped, as its refinement covers
+            # them; a wider zone would drop distinct matches the refinement never reaches
+            if exclusion_zone is not None:
+                order = order[window_nms(window_curves[order], window_starts[order], distances[order],
+                                         2, larger_is_better=False, limit=candidates)]
+            order = order[:candidates]
+            seeds[order] = np.arange(len(order))
+        elif factor != 1:
+            # Every seed keeps its few best refinements
+            rank = np.empty(len(order), dtype=np.int64)
+            by_seed = np.argsort(seeds[order], kind='stable')
+            group_starts = np.searchsorted(seeds[order][by_seed], seeds[order][by_seed])
+            rank[by_seed] = np.arange(len(order)) - group_starts
+            order = order[rank < per_seed]
+        window_curves, window_starts, seeds, distances = (
+            window_curves[order], window_starts[order], seeds[order], distances[order]
+        )
+
+    if exclusion_zone is None:
+        kept = np.arange(min(len(distances), top_k)) if top_k is not None else np.arange(len(distances))
+    else:
+        kept = window_nms(window_curves, window_starts, distances, exclusion_zone + 1, larger_is_better=False,
+                          limit=top_k)
+    results = [(names[window_curves[k]], int(window_starts[k]), float(distances[k])) for k in kept]
+    return results, stats
+
+
+def _unique_windows(window_curves, window_starts, seeds, curves, query_length, factor):
+    # Distinct (curve, start) pairs that fit inside their curve at this level, each with
+    # the seed of its first occurrence
+    n_windows = np.array([len(pyramid[factor]) - query_length + 1 for _, pyramid in curves])
+    inside = (window_starts >= 0) & (window_starts < n_windows[window_curves])
+    window_curves, window_starts, seeds = window_curves[inside], window_starts[inside], seeds[inside]
+    _, first = np.unique(np.stack([window_curves, window_starts], axis=1), axis=0, return_index=True)
+    return window_curves[first], window_starts[first], seeds[first]
+
+
+def _score(level_query, curves, factor, window_curves, window_starts, band, batch_size=1024):
+    # DTW of the level query against the given windows; windows crossing a gap are inf
+    distances = np.full(len(window_starts), np.inf)
+    for curve_number in np.unique(window_curves):
+        positions = np.flatnonzero(window_curves == curve_number)
+        windows = sliding_window_view(curves[curve_number][1][factor], len(level_query))[window_starts[positions]]
+        complete = ~np.isnan(windows).any(axis=1)
+        positions, windows = positions[complete], windows[complete]
+        for start in range(0, len(positions), batch_size):
+            batch = slice(start, start + batch_size)
+            distances[positions[batch]] = dtw_batch(level_query, windows[batch], band)
+    return distances
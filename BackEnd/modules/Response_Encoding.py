@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import struct
+import numpy as np
+from flask import Response
+
+# Binary columnar payloads: b'V4NC', the uint32 length of a UTF-8 JSON header, the header,
+# then the columns as raw little-endian arrays, each starting on an 8-byte boundary. The
+# header holds the payload with every numeric array replaced by {"$column": i} and the
+# [dtype, length] of every column. See VIS4NFAD/src/wire.js for the client side.
+COLUMNS_MIMETYPE = 'application/x-vis4nfad-columns'
+JSON_MIMETYPE = 'application/json'
+COLUMNS_MAGIC = b'V4NC'
+COLUMN_DTYPES = {'<f4': np.float32, '<f8': np.float64}
+
+
+def encode_columns(payload, min_length=16, float32_keys=()):
+    """
+    The binary columnar form of a JSON-like payload. Numeric lists and arrays of at
+    least `min_length` items become float64 columns, exact for every JSON number the
+    matcher produces; those under a dict key in `float32_keys` become float32 columns,
+    half the size, for values that single precision holds exactly (e.g. the -1/0/1 of
+    a trend) or where it is precise enough. Everything else stays in the header.
+    """
+    columns = []
+
+    def hoist(value, dtype=np.dtype('<f8')):
+        if isinstance(value, dict):
+            return {
+                key: hoist(item, np.dtype('<f4') if key in float32_keys else dtype)
+                for key, item in value.items()
+            }
+        if isinstance(value, np.ndarray) and value.ndim == 1 and value.dtype.kind in 'fiu':
+            numeric = len(value) >= min_length
+        elif isinstance(value, (list, tuple)):
+            numeric = len(value) >= min_length and all(type(item) in (int, float) for item in value)
+        else:
+            return _plain(value)
+        if not numeric:
+            return [hoist(item, dtype) for item in value]
+        columns.append(np.asarray(value, dtype=dtype))
+        return {"$column": len(columns) - 1}
+
+    header = json.dumps({
+        "payload": hoist(payload),
+        "columns": [[column.dtype.str, len(column)] for column in columns],
+    }, separators=(',', ':')).encode('utf-8')
+    parts = [COLUMNS_MAGIC, struct.pack('<I', len(header)), header]
+    size = 8 + len(header)
+    for column in [None] + columns:
+        parts.append(b'\0' * (-size % 8))
+        size += -size % 8
+        if column is not None:
+            parts.append(column.tobytes())
+            size += column.nbytes
+    return b''.join(parts)
+
+
+class PayloadError(ValueError):
+    # A body that is not a well-formed columnar payload
+    pass
+
+
+def decode_columns(data):
+    """
+    The payload of a binary columnar body, with its columns as float64 arrays. Raises
+    PayloadError if the body is not a well-formed columnar payload.
+    """
+    if data[:4] != COLUMNS_MAGIC or len(data) < 8:
+        raise PayloadError('Not a columnar payload')
+    (header_length,) = struct.unpack_from('<I', data, 4)
+    try:
+        header = json.loads(data[8:8 + header_length].decode('utf-8'))
+        payload, column_specs = header["payload"], header["columns"]
+        offset = 8 + header_length
+        columns = []
+        for dtype, length in column_specs:
+            dtype = np.dtype(COLUMN_DTYPES[dtype]).newbyteorder('<')
+            offset += -offset % 8
+            columns.append(np.frombuffer(data, dtype, length, offset).astype(np.float64))
+            offset += length * dtype.itemsize
+    except (UnicodeDecodeError, KeyError, TypeError, ValueError) as e:
+        # json.JSONDecodeError and the short-buffer error of np.frombuffer are ValueErrors
+        raise PayloadError(f'Malformed columnar payload: {e}') from e
+
+    def restore(value):
+        if isinstance(value, dict):
+            if set(value) == {"$column"}:
+                try:
+                    return columns[value["$column"]]
+                except (IndexError, TypeError):
+                    raise PayloadError(f'Unknown column {value["$column"]!r}') from None
+            return {key: restore(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [restore(item) for item in value]
+        return value
+
+    return restore(payload)
+
+
+def payload_response(payload, request, status=200, min_gzip_size=1024, compresslevel=6, float32_keys=()):
+    """
+    A response in the format the client prefers by its Accept header: binary columns
+    if it asks for them, compact JSON otherwise. The response carries a weak ETag of
+    its body. Clients that send the ETag back in If-None-Match get an empty 304, so
+    polling an unchanged result costs no transfer; bodies of at least `min_gzip_size`
+    bytes are gzipped for clients that accept it. Clients should revalidate on every
+    request rather than cache blindly. `float32_keys` is passed to encode_columns.
+    """
+    if request.accept_mimetypes.best_match([JSON_MIMETYPE, COLUMNS_MIMETYPE]) == COLUMNS_MIMETYPE:
+        body, mimetype = encode_columns(payload, float32_keys=float32_keys), COLUMNS_MIMETYPE
+    else:
+        body, mimetype = json.dumps(payload, separators=(',', ':'), default=_json_default).encode('utf-8'), JSON_MIMETYPE
+    response = Response(body, status=status, mimetype=mimetype)
+    # Weak, as the same ETag is sent for the gzipped and the plain body
+    response.set_etag(hashlib.sha1(body).hexdigest(), weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.update(['Accept', 'Accept-Encoding'])
+    response.make_conditional(request)
+    if (response.status_code == 200 and len(body) >= min_gzip_size
+            and 'gzip' in request.accept_encodings):
+        response.set_data(gzip.compress(body, compresslevel))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+def _plain(value):
+    # NumPy values as the JSON types they stand for
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _json_default(value):
+    plain = _plain(value)
+    if plain is value:
+        raise TypeError(f'{type(value).__name__} is not JSON serializable')
+    return plain
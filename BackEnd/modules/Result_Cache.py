@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def normalize_sketch(drawing, decimals=6):
+    """
+    Reduce a sketch to the point list the matcher actually uses, relative to its first
+    point and rounded, so that a redrawn or reloaded identical sketch hashes the same.
+    Matching is translation invariant (the y axis is flipped against its maximum and
+    only x differences enter the slope).
+    """
+    path_data = drawing[0]["path"]
+    points = [(command[1], command[2]) for command in path_data if len(command) > 2]
+    if not points:
+        return []
+    x0, y0 = points[0]
+    return [[round(x - x0, decimals), round(y - y0, decimals)] for x, y in points]
+
+
+def curves_digest(curves):
+    """
+    Digest of (name, time, values) curves as the matcher sees them, float64, so that the
+    same curves uploaded again hash the same and any change in their samples does not.
+    """
+    digest = hashlib.sha256()
+    for name, time_values, values in curves:
+        digest.update(name.encode('utf-8') + b'\0')
+        for array in (time_values, values):
+            array = np.ascontiguousarray(array, dtype='<f8')
+            digest.update(len(array).to_bytes(8, 'little'))
+            digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def query_key(drawing, curve_names, smoothness, params, data_version):
+    """
+    Content address of a similarity query. `data_version` identifies the curve data the
+    names refer to: the dataset version for curves of the dataset, the curves_digest of
+    uploaded curves, so results never outlive the data they were computed from.
+    """
+    payload = {
+        "sketch": normalize_sketch(drawing),
+        "curves": list(curve_names),
+        "data": data_version,
+        "smoothness": round(float(smoothness or 0.0), 6),
+        "params": params,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache of query results bounded by entry count and encoded size, with an
+    optional on-disk tier (one JSON file per key) that survives restarts. The disk
+    tier is bounded by `max_disk_bytes` and evicts its least recently used files.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, disk_dir=None, max_disk_bytes=1024 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()  # key -> (results, size in bytes)
+        self._bytes = 0
+        self._disk_entries = OrderedDict()  # key -> file size, least recently used first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        if disk_dir is not None:
+            if not os.path.exists(disk_dir):
+                os.makedirs(disk_dir)
+            self._scan_disk()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        encoded = self._read_disk(key)
+        if encoded is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        results = json.loads(encoded)
+        with self._lock:
+            self.disk_hits += 1
+            self._insert(key, results, len(encoded))
+        return results
+
+    def put(self, key, results):
+        encoded = json.dumps(results, separators=(',', ':'))
+        with self._lock:
+            self._insert(key, results, len(encoded))
+        self._write_disk(key, encoded)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_entries": len(self._disk_entries),
+                "disk_bytes": self._disk_bytes,
+                "disk_evictions": self.disk_evictions,
+            }
+
+    def _insert(self, key, results, size):
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (results, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.json')
+
+    def _scan_disk(self):
+        # Files left by an earlier run, oldest access first; modification times record the accesses
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-len('.json')], stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk_entries[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        try:
+            with open(self._disk_path(key), 'r') as f:
+                encoded = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if key in self._disk_entries:
+                self._disk_entries.move_to_end(key)
+        try:
+            os.utime(self._disk_path(key))
+        except FileNotFoundError:
+            pass
+        return encoded
+
+    def _write_disk(self, key, encoded):
+        if self.disk_dir is None:
+            return
+        # Write then rename so a concurrent reader never sees a partial file
+        tmp_path = f'{self._disk_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(encoded)
+        os.replace(tmp_path, self._disk_path(key))
+        with self._lock:
+            self._disk_bytes -= self._disk_entries.pop(key, 0)
+            self._disk_entries[key] = len(encoded)
+            self._disk_bytes += len(encoded)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        # Called with the lock held (or before the cache is shared)
+        while self._disk_entries and self._disk_bytes > self.max_disk_bytes:
+            key, size = self._disk_entries.popitem(last=False)
+            self._disk_bytes -= size
+            self.disk_evictions += 1
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+
+# Lists of a fully expanded row; compact rows leave them out and reference the curve instead
+SEGMENT_VALUES = ('TimeValues', 'MeasurementValues', 'Trend')
+
+# Of those, the lists single precision holds exactly (-1/0/1), sent as float32 in binary responses
+SINGLE_PRECISION_VALUES = ('Trend',)
+
+# Columns a result table can be sorted by
+SORT_KEYS = (
+    'CombinedSimilarity', 'CosineSimilarity', 'EuclideanDistance', 'SlopeSimilarity', 'Slope',
+    'StartIndex', 'StartTime', 'Length', 'Hcn',
+)
+
+
+def segment_row(name, index, length, time_values, scores, smoothness):
+    """
+    Compact result row of a matched segment: the curve name and the window's start and
+    length are a reference into the curve, with the window's time span and its scores.
+    """
+    return {
+        "Hcn": name,
+        "StartIndex": index,
+        "Length": length,
+        "StartTime": float(time_values[index]),
+        "EndTime": float(time_values[index + length - 1]),
+        **scores,
+        "Smooth": smoothness,
+    }
+
+
+def expand_row(row, time_values, values):
+    # The row with the segment's samples sliced from its curve; rows already holding them are returned as is
+    if all(key in row for key in SEGMENT_VALUES):
+        return row
+    window = slice(row["StartIndex"], row["StartIndex"] + row["Length"])
+    return {
+        **row,
+        "TimeValues": time_values[window].tolist(),
+        "MeasurementValues": values[window].tolist(),
+        "Trend": np.sign(np.diff(values[window])).tolist(),
+    }
+
+
+def compact_row(row):
+    # The row without its sample lists
+    return {key: value for key, value in row.items() if key not in SEGMENT_VALUES}
+
+
+def query_rows(rows, sort=None, descending=True, top_k=None, offset=0, limit=None):
+    """
+    One page of a result table as (rows, total). Rows are sorted by the `sort` column
+    (their stored order otherwise), cut to the first `top_k`, and `limit` rows from
+    `offset` are returned, each with its position in the stored table as "Row" so that
+    it can be expanded later. `total` counts the rows before paging.
+    """
+    positions = list(range(len(rows)))
+    if sort is not None:
+        # Ties keep their stored order and missing (NaN) values sort last in either direction
+        values = [row.get(sort) for row in rows]
+        missing = [position for position in positions if values[position] is None or values[position] != values[position]]
+        skipped = set(missing)
+        present = [position for position in positions if position not in skipped]
+        present.sort(key=values.__getitem__, reverse=descending)
+        positions = present + missing
+    if top_k is not None:
+        positions = positions[:top_k]
+    total = len(positions)
+    page = positions[offset:] if limit is None else positions[offset:offset + limit]
+    return [{**rows[position], "Row": position} for position in page], total
+
+
+def row_key(row):
+    # Identity of a result row across partial updates of one query
+    return f'{row["Hcn"]}@{row["StartIndex"]}'
+
+
+def row_delta(shown, rows):
+    """
+    Changes that turn the rows a client was last sent into `rows`: (added rows, each
+    with its "Key", and removed keys). `shown` maps key -> row and is updated in place.
+    """
+    current = {row_key(row): row for row in rows}
+    removed = [key for key in shown if key not in current]
+    added = [{**row, "Key": key} for key, row in current.items() if key not in shown]
+    for key in removed:
+        del shown[key]
+    shown.update((row["Key"], row) for row in added)
+    return added, removed
+
+
+class TopkStream:
+    """
+    The rows streamed to the clients of a running job, as numbered updates. Every
+    update carries the changes since the previous one and its sequence number, so a
+    client that missed one (it joined late or reconnected) sees the gap and asks for
+    a snapshot of the current rows instead of applying deltas to the wrong base.
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.shown = {}  # key -> row, as of update `seq`
+        self._lock = threading.Lock()
+
+    def update(self, rows):
+        # The update that turns the shown rows into `rows`, None if they are unchanged
+        with self._lock:
+            added, removed = row_delta(self.shown, rows)
+            if not added and not removed:
+                return None
+            self.seq += 1
+            return {"seq": self.seq, "added": added, "removed": removed}
+
+    def snapshot(self):
+        # All shown rows, replacing whatever the client holds
+        with self._lock:
+            return {"seq": self.seq, "snapshot": True, "rows": list(self.shown.values())}
@@ -0,0 +1,101 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def trend_runs(values, min_length=1):
+    """
+    Monotone runs of a series as (direction, start, length, amplitude) arrays, in
+    trend coordinates: run r covers trend[start:start + length], i.e. values from
+    start to start + length. Runs shorter than `min_length` are treated as noise and
+    absorbed into the run before them, so a brief wiggle neither splits a rise nor
+    moves a turning point by more than `min_length` samples. A gap (NaN) always ends
+    a run and forms its own run with direction NaN, which matches nothing.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    trend = np.sign(np.diff(values))
+    if len(trend) == 0:
+        return _runs([], [], [], values)
+
+    # Codes with NaN distinct from every direction, so gaps split runs
+    codes = np.where(np.isnan(trend), 2, trend)
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(codes)) + 1])
+    lengths = np.diff(np.append(starts, len(trend)))
+    codes = codes[starts]
+
+    # A short run is absorbed into the run before it unless either is a gap; it then takes the
+    # direction of the last run kept before it, and runs of equal direction are merged
+    gaps = codes == 2
+    absorbed = np.zeros(len(starts), dtype=bool)
+    absorbed[1:] = (lengths[1:] < min_length) & ~gaps[1:] & ~gaps[:-1]
+    kept = np.maximum.accumulate(np.where(absorbed, 0, np.arange(len(starts))))
+    directions = codes[kept]
+    first = np.flatnonzero(np.concatenate([[True], directions[1:] != directions[:-1]]))
+    directions = np.where(directions[first] == 2, np.nan, directions[first])
+    return _runs(directions, starts[first], np.add.reduceat(lengths, first), values)
+
+
+def _runs(directions, starts, lengths, values):
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    amplitude = np.abs(values[starts + lengths] - values[starts]) if len(starts) else np.empty(0)
+    return {
+        "direction": np.asarray(directions, dtype=np.float64),
+        "start": starts,
+        "length": lengths,
+        "amplitude": amplitude,
+    }
+
+
+def match_runs(runs, sketch, length_tolerance=0.5, amplitude_tolerance=None, slack=0):
+    """
+    Ranges [lo, hi] of window starts whose run structure matches the sketch runs. A
+    match is a sequence of consecutive curve runs with the sketch's directions whose
+    interior runs have the sketch's lengths within `length_tolerance` (relative) plus
+    `slack` samples; the first and last runs only need to be long enough, as a window
+    may begin or end inside them. With `amplitude_tolerance`, interior run amplitudes
+    as shares of their total must also agree within that absolute difference. A match
+    allows starts within the first run's tolerance and `slack` of the curve's first
+    turning point minus the sketch's.
+    """
+    k = len(sketch["direction"])
+    if k == 0 or len(runs["direction"]) < k:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    sketch_lengths = sketch["length"]
+    minimum = np.floor(sketch_lengths * (1 - length_tolerance)) - slack
+    maximum = np.ceil(sketch_lengths * (1 + length_tolerance)) + slack
+    shift = int(np.ceil(length_tolerance * sketch_lengths[0])) + slack
+
+    if k == 1:
+        # A monotone sketch fits anywhere inside a run of the same direction
+        fits = np.flatnonzero((runs["direction"] == sketch["direction"][0]) & (runs["length"] >= minimum[0]))
+        starts = runs["start"][fits]
+        return starts - slack, starts + runs["length"][fits] - sketch_lengths[0] + slack
+
+    directions = sliding_window_view(runs["direction"], k)
+    lengths = sliding_window_view(runs["length"], k)
+    fits = (directions == sketch["direction"]).all(axis=1)
+    fits &= (lengths[:, 0] >= minimum[0]) & (lengths[:, -1] >= minimum[-1])
+    if k > 2:
+        fits &= ((lengths[:, 1:-1] >= minimum[1:-1]) & (lengths[:, 1:-1] <= maximum[1:-1])).all(axis=1)
+        if amplitude_tolerance is not None:
+            amplitudes = sliding_window_view(runs["amplitude"], k)[:, 1:-1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                shares = amplitudes / amplitudes.sum(axis=1, keepdims=True)
+            sketch_shares = sketch["amplitude"][1:-1] / (sketch["amplitude"][1:-1].sum() or 1.0)
+            fits &= (np.abs(shares - sketch_shares) <= amplitude_tolerance).all(axis=1)
+    # The first turning point of a match is the start of its second run
+    anchors = runs["start"][np.flatnonzero(fits) + 1] - sketch_lengths[0]
+    return anchors - shift, anchors + shift
+
+
+def candidate_windows(runs, sketch, n_windows, length_tolerance=0.5, amplitude_tolerance=None, slack=0):
+    # Sorted window starts in [0, n_windows) covered by any run-sequence match
+    lo, hi = match_runs(runs, sketch, length_tolerance, amplitude_tolerance, slack)
+    if n_windows <= 0:
+        return np.empty(0, dtype=np.int64)
+    # Mark every [lo, hi] with a difference array
+    covered = np.zeros(n_windows + 1, dtype=np.int64)
+    inside = hi >= lo
+    np.add.at(covered, np.clip(lo[inside], 0, n_windows), 1)
+    np.add.at(covered, np.clip(hi[inside] + 1, 0, n_windows), -1)
+    return np.flatnonzero(np.cumsum(covered)[:n_windows] > 0)
@@ -1,10 +1,10 @@
+import os
+import sys
 import json
 import numpy as np
-from scipy.fft import fft
-from scipy.spatial.distance import euclidean
-import heapq
-from concurrent.futures import ThreadPoolExecutor
-from tqdm import tqdm
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.Spectral_Match import spectral_profile
 
 # 读取drawing.json文件
 with open('../static/Data/drawing.json', 'r') as file:
@@ -24,63 +24,37 @@ for obj in drawing_data['objects']:
 
 drawing_coords = np.array(drawing_coords)
 
-# 提取hcn数据，并确保数据为数值类型
-def flatten_and_filter(data):
-    flat_data = []
-    for item in data:
-        if isinstance(item, list):
-            flat_data.extend(flatten_and_filter(item))
-        elif isinstance(item, (int, float)):
-            flat_data.append(float(item))
-    return flat_data
-
 # 只提取hcn数据中的第十条数据
 hcn_first_data = hcn_data['hcn'][10] if isinstance(hcn_data['hcn'], list) and len(hcn_data['hcn']) > 0 else []
-hcn_coords = flatten_and_filter(hcn_first_data)
-hcn_coords = np.array(hcn_coords)
+hcn_coords = np.array(hcn_first_data, dtype=np.float64)  # null转为NaN并保留在原位，窗口起点与time数组对齐
 
 # 归一化函数
 def normalize(data):
     data = np.array(data)
-    data_min = np.min(data, axis=0)
-    data_max = np.max(data, axis=0)
+    data_min = np.nanmin(data, axis=0)
+    data_max = np.nanmax(data, axis=0)
     return (data - data_min) / (data_max - data_min), data_min, data_max
 
 # 归一化手绘数据和hcn数据
 drawing_coords_norm, drawing_min, drawing_max = normalize(drawing_coords)
 hcn_coords_norm, hcn_min, hcn_max = normalize(hcn_coords)
 
-# 计算STFT相似度的函数
-def calculate_fft_distance(args):
-    drawing_coords, segment_coords = args
-    fft_drawing = np.abs(fft(drawing_coords)).flatten()
-    fft_segment = np.abs(fft(segment_coords)).flatten()
-    return euclidean(fft_drawing, fft_segment)
-
-# 找到前10个最匹配的段落
-def find_top_matches_fft(drawing_coords, hcn_coords, window_size, top_n=10):
-    top_matches = []
-    segments = [
-        (drawing_coords, hcn_coords[i:i + window_size])
-        for i in range(len(hcn_coords) - window_size + 1)
-    ]
-
-    with ThreadPoolExecutor() as executor:
-        distances = list(tqdm(executor.map(calculate_fft_distance, segments), total=len(segments), desc="Processing segments"))
-
-    for i, distance in enumerate(distances):
-        segment = hcn_coords[i:i + window_size]
-        if len(top_matches) < top_n:
-            heapq.heappush(top_matches, (distance, segment))
-        else:
-            heapq.heappushpop(top_matches, (distance, segment))
-
-    top_matches.sort()
-    return top_matches
+# 找到前10个最匹配的段落：手绘频谱只算一次，各窗口的前k个DFT系数由滑动DFT（前缀和）一次得到
+def find_top_matches_fft(drawing_coords, hcn_coords, hcn_coords_norm, window_size, top_n=10,
+                         n_coefficients=None, window='boxcar', hop=1):
+    # 含缺失值的窗口距离为inf，不参与排序
+    distances = spectral_profile(drawing_coords, hcn_coords_norm, n_coefficients, window, hop)
+    top_n = min(top_n, int(np.isfinite(distances).sum()))
+    if top_n == 0:
+        return []
+    best = np.argpartition(distances, top_n - 1)[:top_n]
+    best = best[np.argsort(distances[best], kind='stable')]
+    return [(distances[i], hcn_coords[i * hop:i * hop + window_size]) for i in best]
 
 if __name__ == "__main__":
     window_size = len(drawing_coords_norm)
-    top_matches = find_top_matches_fft(drawing_coords_norm, hcn_coords, window_size)
+    # 手绘数据取归一化后的y坐标；n_coefficients=None表示比较全部频率分量，window可选'boxcar'或'hann'
+    top_matches = find_top_matches_fft(drawing_coords_norm[:, 1], hcn_coords, hcn_coords_norm, window_size)
     for i, (distance, match) in enumerate(top_matches):
         print(f"匹配段落 {i + 1}:")
         print("距离:", distance)
@@ -0,0 +1,212 @@
+import itertools
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+from modules.Trend_Index import TrendIndex, packed_trend
+
+# Smoothness levels precomputed for every curve
+SMOOTHNESS_LADDER = [round(0.05 * level, 2) for level in range(21)]
+
+
+def smoothing_steps(smoothness):
+    # Number of passes Hcn-Data.vue's interpolateData applies for a smoothness in [0, 1]
+    smoothness = float(smoothness or 0.0)
+    return 0 if smoothness == 0 else math.ceil(smoothness * 200)
+
+
+def smoothing_pass(values):
+    """
+    One pass of the frontend's 5-point kernel over the last axis, evaluated for all
+    points at once. Endpoints are kept. As in the JS `(a[i - 2]?.y || d.y)`, a missing,
+    zero or NaN outer neighbour is replaced by the centre value, and the terms are
+    summed in the same order so results are bit-identical.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    smoothed = values.copy()
+    if n < 3:
+        return smoothed
+
+    centre = values[..., 1:-1]
+    left2 = np.concatenate([values[..., 1:2], values[..., :n - 3]], axis=-1)
+    right2 = np.concatenate([values[..., 3:], values[..., n - 2:n - 1]], axis=-1)
+    falsy_left = (left2 == 0) | np.isnan(left2)
+    falsy_right = (right2 == 0) | np.isnan(right2)
+    left2 = np.where(falsy_left, centre, left2)
+    right2 = np.where(falsy_right, centre, right2)
+    # i == 1 and i == n - 2 have no outer neighbour
+    left2[..., 0] = centre[..., 0]
+    right2[..., -1] = centre[..., -1]
+
+    smoothed[..., 1:-1] = left2 * 0.1 + values[..., :-2] * 0.2 + centre * 0.4 + values[..., 2:] * 0.2 + right2 * 0.1
+    return smoothed
+
+
+def smooth(values, smoothness):
+    values = np.asarray(values, dtype=np.float64)
+    for _ in range(smoothing_steps(smoothness)):
+        values = smoothing_pass(values)
+    return values
+
+
+class SmoothingEngine:
+    """
+    Smoothed curves from a DatasetRegistry. The ladder levels of a curve are produced
+    in a single sweep of passes and kept in an LRU bounded by bytes. Other smoothness
+    values continue from the nearest cached level below them instead of from scratch.
+    `levels`, as returned by export_ladder, serves ladder levels computed elsewhere,
+    e.g. by the serving process into shared memory, without smoothing them again.
+    The packed trends of ladder levels are kept too, in one TrendIndex per level.
+    """
+
+    def __init__(self, registry, ladder=SMOOTHNESS_LADDER, max_bytes=128 * 1024 * 1024, levels=None):
+        self.registry = registry
+        self.ladder_steps = sorted({smoothing_steps(level) for level in ladder})
+        self.max_bytes = max_bytes
+        self._arrays = OrderedDict()  # (name, steps) -> smoothed values
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._levels = {}  # steps -> row of the shared level array
+        self._trends = {}  # ladder steps -> TrendIndex of the curves at that level
+        if levels is not None:
+            steps, self._level_values = levels
+            self._levels = {level_steps: level for level, level_steps in enumerate(steps)}
+            self._offsets = self._curve_offsets()
+
+    def precompute(self, names=None):
+        # Sweep the ladder for many curves at once; curves of equal length share one batch
+        names = self.registry.names if names is None else names
+        by_length = {}
+        for name in names:
+            _, _, values = self.registry.curve(name)
+            by_length.setdefault(len(values), []).append((name, values))
+        for group in by_length.values():
+            batch_names = [name for name, _ in group]
+            self._sweep(batch_names, np.stack([values for _, values in group]), 0, self.ladder_steps)
+        for steps in self.ladder_steps:
+            for name in names:
+                self.trend_steps(name, steps)
+
+    def curve(self, name, smoothness):
+        return self.curve_steps(name, smoothing_steps(smoothness))
+
+    def curve_steps(self, name, steps):
+        # The curve after `steps` passes of the kernel
+        name, time, values = self.registry.curve(name)
+        if steps == 0:
+            return name, time, values
+        if steps in self._levels:
+            return name, time, self._level(name, steps)
+
+        with self._lock:
+            cached = self._arrays.get((name, steps))
+            if cached is not None:
+                self._arrays.move_to_end((name, steps))
+                return name, time, cached
+            # Start from the highest cached or shared level not above the requested one
+            start_steps, start = max(
+                itertools.chain(
+                    ((s, v) for (n, s), v in self._arrays.items() if n == name and s <= steps),
+                    ((s, None) for s in self._levels if s <= steps),
+                ),
+                key=lambda item: item[0],
+                default=(0, values),
+            )
+        if start is None:
+            start = self._level(name, start_steps)
+
+        targets = [s for s in self.ladder_steps if start_steps < s < steps] + [steps]
+        smoothed = self._sweep([name], start[np.newaxis], start_steps, targets)
+        return name, time, smoothed[0]
+
+    def trend(self, name, smoothness):
+        return self.trend_steps(name, smoothing_steps(smoothness))
+
+    def trend_steps(self, name, steps):
+        # Packed trend (words, length) of the smoothed curve; ladder levels are packed only once
+        if steps not in self.ladder_steps:
+            return packed_trend(self.curve_steps(name, steps)[2])
+        index = self._trends.setdefault(steps, TrendIndex())
+        if name not in index:
+            index.add(name, self.curve_steps(name, steps)[2])
+        return index.trends[name]
+
+    def curves(self, names, smoothness):
+        # Lazy sequence of the named curves; unknown names fail here rather than mid-analysis
+        unknown = [name for name in names if name not in self.registry]
+        if unknown:
+            raise KeyError(f"Unknown curves: {', '.join(unknown)}")
+        return SmoothedCurves(self, names, smoothness)
+
+    def ladder_shape(self):
+        # (levels, samples) of export_ladder: every ladder level of every curve's valid samples
+        return len([steps for steps in self.ladder_steps if steps > 0]), int(self.registry.valid.sum())
+
+    def export_ladder(self, out=None):
+        """
+        The ladder levels of all curves as (steps, array): one row per level with the
+        curves concatenated in registry order, written into `out` (e.g. a shared-memory
+        buffer of ladder_shape()) when given. Levels missing from the cache are smoothed.
+        """
+        steps = [level_steps for level_steps in self.ladder_steps if level_steps > 0]
+        out = np.empty(self.ladder_shape()) if out is None else out
+        offsets = self._curve_offsets()
+        for row, name in enumerate(self.registry.names):
+            for level, level_steps in enumerate(steps):
+                # Ascending levels, so each one continues from the previous
+                out[level, offsets[row]:offsets[row + 1]] = self.curve_steps(name, level_steps)[2]
+        return steps, out
+
+    def _curve_offsets(self):
+        return np.concatenate([[0], np.cumsum(self.registry.valid.sum(axis=1))])
+
+    def _level(self, name, steps):
+        row = self.registry.index[name]
+        return self._level_values[self._levels[steps], self._offsets[row]:self._offsets[row + 1]]
+
+    def _sweep(self, names, values, start_steps, targets):
+        # Apply passes from start_steps, caching a snapshot at every target step count
+        steps = start_steps
+        for target in targets:
+            while steps < target:
+                values = smoothing_pass(values)
+                steps += 1
+            for name, row in zip(names, values):
+                self._store(name, steps, row.copy())
+        return values
+
+    def _store(self, name, steps, values):
+        if steps == 0:
+            return
+        with self._lock:
+            key = (name, steps)
+            if key in self._arrays:
+                self._bytes -= self._arrays.pop(key).nbytes
+            self._arrays[key] = values
+            self._bytes += values.nbytes
+            while self._bytes > self.max_bytes and len(self._arrays) > 1:
+                _, evicted = self._arrays.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+
+class SmoothedCurves:
+    """
+    Sequence of (name, time, values) curves at one smoothness, smoothed (or read from
+    the engine's cache) only when an item is accessed, so a query holds names rather
+    than arrays and streams through the dataset one curve at a time.
+    """
+
+    def __init__(self, engine, names, smoothness):
+        self.engine = engine
+        self.names = list(names)
+        self.smoothness = smoothness
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, position):
+        return self.engine.curve(self.names[position], self.smoothness)
+
+    def trend(self, position):
+        return self.engine.trend(self.names[position], self.smoothness)
@@ -0,0 +1,91 @@
+import numpy as np
+from scipy.fft import rfft
+from scipy.signal import get_window
+from modules.Gap_Mask import fill_gaps, mask_profile
+
+SPECTRAL_WINDOWS = ('boxcar', 'hann')
+
+
+def sliding_dft(series, m, n_coefficients, hop=1):
+    """
+    First `n_coefficients` DFT coefficients of every length-m window of `series`
+    starting at 0, hop, 2*hop, ..., shape (windows, n_coefficients). Uses the sliding
+    DFT identity X_t[f] = w^(f*t) * (C_f[t + m] - C_f[t]) with C_f the prefix sum of
+    x[u] * w^(-f*u), so the cost is O(n * n_coefficients) whatever m is.
+    """
+    series = np.asarray(series, dtype=np.float64)
+    n = len(series)
+    if n < m:
+        return np.empty((0, n_coefficients), dtype=np.complex128)
+
+    # Only the DC term depends on the offset; centring keeps the prefix sums precise
+    mean = series.mean()
+    centred = series - mean
+
+    frequencies = np.arange(n_coefficients)
+    positions = np.arange(n)
+    # Angles reduced modulo m in integers so phases stay exact for long series
+    twiddles = np.exp(-2j * np.pi * ((positions[:, np.newaxis] * frequencies) % m) / m)
+    prefix = np.zeros((n + 1, n_coefficients), dtype=np.complex128)
+    np.cumsum(centred[:, np.newaxis] * twiddles, axis=0, out=prefix[1:])
+
+    starts = np.arange(0, n - m + 1, hop)
+    coefficients = (prefix[starts + m] - prefix[starts]) * np.conj(twiddles[starts])
+    coefficients[:, 0] += m * mean
+    return coefficients
+
+
+def window_spectra(series, m, n_coefficients, window='boxcar', hop=1):
+    """
+    Spectra of the length-m frames of `series` taken every `hop` samples under
+    `window`. A periodic Hann window is a three-tap convolution in frequency
+    (0.5 X[f] - 0.25 X[f - 1] - 0.25 X[f + 1]), so it reuses the sliding DFT.
+    """
+    if window == 'boxcar':
+        return sliding_dft(series, m, n_coefficients, hop)
+    if window == 'hann':
+        raw = sliding_dft(series, m, n_coefficients + 1, hop)
+        # X[-1] is conj(X[1]) for a real signal
+        below = np.concatenate([np.conj(raw[:, 1:2]), raw[:, :n_coefficients - 1]], axis=1)
+        return 0.5 * raw[:, :n_coefficients] - 0.25 * below - 0.25 * raw[:, 1:n_coefficients + 1]
+    raise ValueError(f"Unknown window: {window}")
+
+
+def spectral_profile(query, series, n_coefficients=None, window='boxcar', hop=1, gap_penalty=None):
+    """
+    Euclidean distance between the magnitude spectrum of `query` and that of every
+    frame of `series` (frames start at multiples of `hop`). The query spectrum is
+    computed once; `n_coefficients` defaults to every rfft bin of the query length.
+    NaN samples keep their positions; frames crossing them score inf, or are
+    penalised per missing sample with `gap_penalty`.
+    """
+    query = np.asarray(query, dtype=np.float64)
+    m = len(query)
+    n_coefficients = m // 2 + 1 if n_coefficients is None else min(n_coefficients, m // 2 + 1)
+    query_spectrum = np.abs(rfft(query * get_window(window, m))[:n_coefficients])
+    series, valid = fill_gaps(series)
+    frames = np.abs(window_spectra(series, m, n_coefficients, window, hop))
+    distances = np.linalg.norm(frames - query_spectrum, axis=1)
+    return mask_profile(distances, valid, m, gap_penalty=gap_penalty, hop=hop)
+
+
+def spectral_search(query, curves, n_coefficients=None, window='boxcar', hop=1, top_k=10, gap_penalty=None):
+    # Best (name, start index, distance) frames over (name, series) curves
+    names, starts, distances = [], [], []
+    for name, series in curves:
+        profile = spectral_profile(query, series, n_coefficients, window, hop, gap_penalty)
+        names.extend([name] * len(profile))
+        starts.append(np.arange(len(profile)) * hop)
+        distances.append(profile)
+    if not names:
+        return []
+    starts = np.concatenate(starts)
+    distances = np.concatenate(distances)
+
+    finite = int(np.isfinite(distances).sum())
+    count = finite if top_k is None else min(top_k, finite)
+    if count == 0:
+        return []
+    best = np.argpartition(distances, count - 1)[:count]
+    best = best[np.argsort(distances[best], kind='stable')]
+    return [(names[i], int(starts[i]), float(distances[i])) for i in best]
@@ -0,0 +1,97 @@
+import numpy as np
+from modules.Interval_NMS import interval_nms
+
+
+def spring_profiles(query, series_batch):
+    """
+    Subsequence DTW (SPRING) of `query` against every series in `series_batch`
+    (shape curves x n), using |q - x| as the local distance. The query may start and
+    end anywhere in a series. For every end position t it returns the best DTW
+    distance of a match ending at t and that match's start index, both of shape
+    (curves, n). One sweep over anti-diagonals covers all query rows and all curves
+    at once, so each series is scanned a single time. NaN samples keep their
+    positions but no match can pass through them.
+    """
+    query = np.asarray(query, dtype=np.float64)
+    series_batch = np.atleast_2d(np.asarray(series_batch, dtype=np.float64))
+    # An infinite sample makes every cell of its column unreachable
+    series_batch = np.where(np.isnan(series_batch), np.inf, series_batch)
+    n_curves, n = series_batch.shape
+    m = len(query)
+
+    end_distance = np.full((n_curves, n), np.inf)
+    end_start = np.zeros((n_curves, n), dtype=np.int64)
+    if m == 0 or n == 0:
+        return end_distance, end_start
+
+    # Diagonals of the cumulative cost matrix indexed by query row 0..m. Row 0 is the
+    # free start: cost 0, and a match leaving it starts at the current column.
+    prev2, prev1, current = (np.full((n_curves, m + 1), np.inf) for _ in range(3))
+    start2, start1, current_start = (np.zeros((n_curves, m + 1), dtype=np.int64) for _ in range(3))
+    prev2[:, 0] = prev1[:, 0] = current[:, 0] = 0
+
+    for k in range(2, n + m + 1):
+        # Cells (i, t) with i + t = k for 1 <= i <= m, 1 <= t <= n (1-based), i in [lo, hi]
+        lo, hi = max(1, k - n), min(m, k - 1)
+        rows = slice(lo, hi + 1)
+        above = slice(lo - 1, hi)
+        local = np.abs(query[lo - 1:hi] - series_batch[:, k - hi - 1:k - lo][:, ::-1])
+
+        diagonal, vertical, horizontal = prev2[:, above], prev1[:, above], prev1[:, rows]
+        diagonal_start, vertical_start, horizontal_start = start2[:, above], start1[:, above], start1[:, rows]
+        if lo == 1:
+            # Leaving the free row 0 starts the match at this column
+            diagonal_start, vertical_start = diagonal_start.copy(), vertical_start.copy()
+            diagonal_start[:, 0] = vertical_start[:, 0] = k - 2
+
+        # Ties resolve diagonal, then vertical, then horizontal
+        take_diagonal = (diagonal <= vertical) & (diagonal <= horizontal)
+        take_vertical = ~take_diagonal & (vertical <= horizontal)
+        current[:, 1:] = np.inf
+        current[:, rows] = np.minimum(np.minimum(diagonal, vertical), horizontal) + local
+        current_start[:, rows] = np.where(
+            take_diagonal, diagonal_start, np.where(take_vertical, vertical_start, horizontal_start)
+        )
+
+        if hi == m:
+            end_distance[:, k - m - 1] = current[:, m]
+            end_start[:, k - m - 1] = current_start[:, m]
+
+        prev2, prev1, current = prev1, current, prev2
+        start2, start1, current_start = start1, current_start, start2
+
+    return end_distance, end_start
+
+
+def spring_search(query, curves, threshold=None, top_k=None):
+    """
+    Best subsequence DTW matches of `query` in (name, series) curves, as
+    (name, start index, distance) tuples sorted by distance. Threshold mode keeps
+    every match with distance <= threshold, top-k mode keeps the k best; in both
+    modes matches on the same curve that overlap a better one are dropped, which is
+    SPRING's disjoint-query reporting.
+    """
+    by_length = {}
+    for name, series in curves:
+        series = np.asarray(series, dtype=np.float64)
+        by_length.setdefault(len(series), []).append((name, series))
+
+    candidates = []
+    for group in by_length.values():
+        end_distance, end_start = spring_profiles(query, np.stack([series for _, series in group]))
+        for (name, _), distances, starts in zip(group, end_distance, end_start):
+            ends = np.flatnonzero(np.isfinite(distances))
+            if threshold is not None:
+                ends = ends[distances[ends] <= threshold]
+            candidates.extend(zip([name] * len(ends), starts[ends], ends, distances[ends]))
+
+    # Matches cover [start, end] inclusive; any shared sample counts as an overlap
+    kept = interval_nms(
+        [name for name, _, _, _ in candidates],
+        [start for _, start, _, _ in candidates],
+        [end + 1 for _, _, end, _ in candidates],
+        [distance for _, _, _, distance in candidates],
+        larger_is_better=False,
+        limit=top_k,
+    )
+    return [(candidates[k][0], int(candidates[k][1]), float(candidates[k][3])) for k in kept]
@@ -0,0 +1,146 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Trend symbols are packed as 2-bit codes, 32 to a uint64 word: 1 -> 01, -1 -> 10,
+# 0 -> 00 and a gap (NaN) -> 11. Symbol j of a word occupies bits 2j and 2j + 1.
+SYMBOLS_PER_WORD = 32
+LOW_BITS = np.uint64(0x5555555555555555)
+HIGH_BITS = np.uint64(0xAAAAAAAAAAAAAAAA)
+_SHIFTS = np.arange(0, 64, 2, dtype=np.uint64)
+_BYTE_COUNTS = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def popcount(words):
+    # Set bits per uint64 word; np.bitwise_count needs NumPy 2, older versions count bytes
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    return _BYTE_COUNTS[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1)
+
+
+def trend_codes(trend):
+    # 2-bit code of every trend symbol
+    trend = np.asarray(trend, dtype=np.float64)
+    codes = np.where(trend > 0, 1, np.where(trend < 0, 2, 0))
+    return np.where(np.isnan(trend), 3, codes).astype(np.uint64)
+
+
+def pack_codes(codes, offset=0, n_words=None):
+    # Pack codes into words, preceded by `offset` empty symbols and zero-padded to `n_words`
+    codes = np.concatenate([np.zeros(offset, dtype=np.uint64), np.asarray(codes, dtype=np.uint64)])
+    n_words = -(-len(codes) // SYMBOLS_PER_WORD) if n_words is None else n_words
+    padded = np.zeros(n_words * SYMBOLS_PER_WORD, dtype=np.uint64)
+    padded[:len(codes)] = codes
+    return np.bitwise_or.reduce(padded.reshape(n_words, SYMBOLS_PER_WORD) << _SHIFTS, axis=1)
+
+
+def pack_trend(trend):
+    # Packed words of a trend sequence: 2 bits per sample instead of 64
+    return pack_codes(trend_codes(trend))
+
+
+def packed_trend(values):
+    # (packed words, trend length) of a curve's trend, sign(diff(values))
+    trend = np.sign(np.diff(np.asarray(values, dtype=np.float64)))
+    return pack_trend(trend), len(trend)
+
+
+class TrendQuery:
+    """
+    A drawing trend packed at all 32 symbol phases, shape (32, words): row r is preceded
+    by r empty symbols, so a window starting at 32 * b + r lines up word for word with
+    curve words b, b + 1, ... Masks select the symbols that belong to the window.
+    """
+
+    def __init__(self, drawing_trend):
+        drawing_trend = np.asarray(drawing_trend, dtype=np.float64)
+        self.length = len(drawing_trend)
+        codes = trend_codes(drawing_trend)
+        ones = np.full(self.length, 3, dtype=np.uint64)
+        n_words = -(-(self.length + SYMBOLS_PER_WORD - 1) // SYMBOLS_PER_WORD)
+        self.words = np.stack([pack_codes(codes, phase, n_words) for phase in range(SYMBOLS_PER_WORD)])
+        self.masks = np.stack([pack_codes(ones, phase, n_words) for phase in range(SYMBOLS_PER_WORD)])
+        # Codes with the sign bits exchanged, i.e. the drawing trend negated
+        self.negated = ((self.words & LOW_BITS) << np.uint64(1)) | ((self.words & HIGH_BITS) >> np.uint64(1))
+        self.sq = int(np.count_nonzero(codes))
+
+
+def window_counts(words, length, query, max_words=1 << 20):
+    """
+    Agreement between a packed trend of `length` symbols and the drawing trend at every
+    window offset, from XOR/AND and popcount over whole words. All 32 phases of a block
+    of words are handled in one broadcast, with at most `max_words` words in flight.
+    With d the drawing trend and w a window:
+      mismatch   = sum |w - d|  = popcount(w ^ d)
+      window_sq  = w . w        = popcount(w)
+      dot        = w . d        = popcount(w & d) - popcount(w & -d)
+    where popcount(w & d) = (w . w + d . d - mismatch) / 2. All are exact integers;
+    windows containing a gap are NaN.
+    """
+    if not isinstance(query, TrendQuery):
+        query = TrendQuery(query)
+    n_windows = max(length - query.length + 1, 0)
+    if n_windows == 0 or query.length == 0:
+        return {key: np.full(n_windows, np.nan) for key in ("mismatch", "dot", "window_sq")}
+
+    n_query_words = query.words.shape[1]
+    n_blocks = -(-n_windows // SYMBOLS_PER_WORD)
+    padded = np.zeros(n_blocks + n_query_words, dtype=np.uint64)
+    padded[:len(words)] = words[:len(padded)]
+    view = sliding_window_view(padded, n_query_words)
+    has_gaps = bool(popcount(words & (words >> np.uint64(1)) & LOW_BITS).any())
+
+    mismatch, negative, window_sq = (np.empty((n_blocks, SYMBOLS_PER_WORD)) for _ in range(3))
+    gaps = np.zeros((n_blocks, SYMBOLS_PER_WORD), dtype=bool)
+    step = max(1, max_words // (SYMBOLS_PER_WORD * n_query_words))
+    for block in range(0, n_blocks, step):
+        rows = slice(block, min(block + step, n_blocks))
+        windows = view[rows, np.newaxis, :] & query.masks
+        mismatch[rows] = popcount(windows ^ query.words).sum(axis=2)
+        negative[rows] = popcount(windows & query.negated).sum(axis=2)
+        window_sq[rows] = popcount(windows).sum(axis=2)
+        if has_gaps:
+            gaps[rows] = (windows & (windows >> np.uint64(1)) & LOW_BITS).any(axis=2)
+
+    # Block b, phase r is the window starting at 32 * b + r
+    mismatch, negative, window_sq, gaps = (array.reshape(-1)[:n_windows] for array in (mismatch, negative, window_sq, gaps))
+    dot = (window_sq + query.sq - mismatch) / 2 - negative
+    return {
+        "mismatch": np.where(gaps, np.nan, mismatch),
+        "dot": np.where(gaps, np.nan, dot),
+        "window_sq": np.where(gaps, np.nan, window_sq),
+    }
+
+
+class TrendIndex:
+    """
+    Packed trends of many curves, keyed by name. Each curve costs 2 bits per sample,
+    32x less than its float64 trend, and a scan scores every window of every curve
+    against a drawing trend with word-wide popcounts.
+    """
+
+    def __init__(self):
+        self.trends = {}  # name -> (packed words, trend length)
+
+    def add(self, name, values):
+        self.trends[name] = packed_trend(values)
+
+    def __contains__(self, name):
+        return name in self.trends
+
+    def __len__(self):
+        return len(self.trends)
+
+    @property
+    def nbytes(self):
+        return sum(words.nbytes for words, _ in self.trends.values())
+
+    def counts(self, name, query):
+        words, length = self.trends[name]
+        return window_counts(words, length, query)
+
+    def scan(self, drawing_trend, names=None):
+        # (name, counts) for every indexed curve, packing the drawing trend only once
+        query = TrendQuery(drawing_trend)
+        for name in self.trends if names is None else names:
+            yield name, self.counts(name, query)
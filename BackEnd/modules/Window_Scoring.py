@@ -0,0 +1,87 @@
+import numpy as np
+from modules.Trend_Index import pack_trend, packed_trend, window_counts
+
+
+def trend_counts(values, drawing_trend, packed=None):
+    # Packed-trend window counts (mismatch, dot, window_sq) of a curve; drawing_trend may be a TrendQuery.
+    # `packed` is the curve's (words, length), e.g. from SmoothingEngine.trend; packed here if not given
+    words, length = packed_trend(values) if packed is None else packed
+    return window_counts(words, length, drawing_trend)
+
+
+def trend_scores(dot, window_sq, drawing_trend):
+    """
+    Cosine similarity and Euclidean distance of trend windows to the drawing trend,
+    derived exactly from their dot products and squared norms. Cosine follows
+    sklearn's convention of treating zero vectors as norm 1.
+    """
+    drawing_trend = np.asarray(drawing_trend, dtype=np.float64)
+    drawing_sq = float(np.dot(drawing_trend, drawing_trend))
+    drawing_norm = np.sqrt(drawing_sq) or 1.0
+    window_norm = np.sqrt(window_sq)
+    window_norm[window_norm == 0] = 1.0
+    cosine = dot / drawing_norm / window_norm
+    euclidean = np.sqrt(np.maximum(drawing_sq + window_sq - 2 * dot, 0))
+    return cosine, euclidean
+
+
+def window_euclidean(values, drawing_trend, counts=None):
+    # Euclidean distance of every trend window to the drawing trend, without the other scores
+    counts = trend_counts(values, drawing_trend) if counts is None else counts
+    return trend_scores(counts["dot"], counts["window_sq"], drawing_trend)[1]
+
+
+def trend_mismatch(trend, drawing_trend):
+    """
+    Mean L1 mismatch between the drawing trend and every trend window in one pass.
+    Trends take values in {-1, 0, 1}, so with both packed as 2-bit codes the L1
+    distance of a window is the popcount of its XOR with the drawing trend. Windows
+    containing a gap are NaN and never pass a prescreen.
+    """
+    trend = np.asarray(trend, dtype=np.float64)
+    counts = window_counts(pack_trend(trend), len(trend), drawing_trend)
+    return counts["mismatch"] / len(drawing_trend)
+
+
+def prescreen_windows(values, drawing_trend, threshold=1.5, counts=None):
+    # Starts of the windows whose mean trend mismatch is below `threshold`, and the window count
+    counts = trend_counts(values, drawing_trend) if counts is None else counts
+    mismatch = counts["mismatch"] / len(drawing_trend)
+    return np.flatnonzero(mismatch < threshold), len(mismatch)
+
+
+def score_windows(values, drawing_trend, drawing_slope, indices=None, counts=None):
+    """
+    Score windows of one curve against the hand-drawn trend in a few batched NumPy
+    operations: every window, or only those starting at `indices` (e.g. the prescreen
+    survivors). Window i covers values[i:i + m + 1] and trend[i:i + m], where
+    m = len(drawing_trend), exactly like the per-segment loop it replaces. Trend
+    agreement comes from the packed `counts` (computed here if not given).
+    Returns a dict of arrays aligned with "index", the scored window starts.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    drawing_trend = np.asarray(drawing_trend, dtype=np.float64)
+    m = len(drawing_trend)
+    counts = trend_counts(values, drawing_trend) if counts is None else counts
+    indices = np.arange(len(counts["dot"])) if indices is None else np.asarray(indices, dtype=np.int64)
+
+    cosine, euclidean = trend_scores(counts["dot"][indices], counts["window_sq"][indices], drawing_trend)
+
+    slope = (values[indices + m] - values[indices]) / m
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope_similarity = 1 - np.abs(drawing_slope - slope) / np.maximum(np.abs(drawing_slope), np.abs(slope))
+
+    return {
+        "index": indices,
+        "cosine": cosine,
+        "euclidean": euclidean,
+        "slope": slope,
+        "slope_similarity": slope_similarity,
+    }
+
+
+def combine_scores(scores, max_euclidean_distance):
+    # Average of cosine, normalised Euclidean and slope similarity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized_euclidean = 1 - scores["euclidean"] / max_euclidean_distance
+    return (scores["cosine"] + normalized_euclidean + scores["slope_similarity"]) / 3
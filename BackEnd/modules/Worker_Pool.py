@@ -0,0 +1,153 @@
+import math
+import multiprocessing
+import os
+import itertools
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+from modules.Dataset_Registry import DatasetRegistry
+from modules.Smoothing import SmoothingEngine
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+# Queries whose tasks workers should skip are marked in a shared array, query id at slot id % size
+CANCELLED_SLOTS = 64
+
+
+class CurvePool:
+    """
+    Long-lived worker processes that run a function over whole curves of a
+    DatasetRegistry. Workers attach to the curve values once, through the memory-mapped
+    store or a shared-memory copy of the in-memory values. With a SmoothingEngine
+    `smoothing`, its ladder levels are exported to shared memory as well, so workers
+    only smooth smoothness values off the ladder. A task names a chunk of curves and
+    only the function's (compact) results are sent back, so no curve data is pickled
+    per query. Processes start with start(), or on first use, and serve every later query.
+    """
+
+    def __init__(self, registry, processes=None, chunks_per_process=4, smoothing_bytes=64 * 1024 * 1024,
+                 smoothing=None):
+        self.registry = registry
+        self.processes = processes or os.cpu_count() or 1
+        self.chunks_per_process = chunks_per_process
+        self.smoothing_bytes = smoothing_bytes
+        self.smoothing = smoothing
+        self._pool = None
+        self._shared = None
+        self._shared_ladder = None
+        self._cancelled = None
+        self._query_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def map(self, function, names, smoothness, args=(), cancel=None, poll_interval=0.05, with_trend=False):
+        """
+        (position, function(values, position, *args)) for every named curve at the given
+        smoothness, in completion order; with `with_trend`, the worker's cached packed
+        trend of the curve is passed as `trend=` too. Curves are split into a few chunks per process
+        so that uneven curves still balance across workers. With a CancelToken `cancel`,
+        the token is polled while results are awaited; once it is set, or the caller
+        stops iterating, workers skip the query's remaining curves and AnalysisCancelled
+        is raised.
+        """
+        pool = self.start()
+        query = next(self._query_ids)
+        chunk_size = max(1, math.ceil(len(names) / (self.processes * self.chunks_per_process)))
+        tasks = [
+            (query, function, range(start, min(start + chunk_size, len(names))), names[start:start + chunk_size],
+             smoothness, args, with_trend)
+            for start in range(0, len(names), chunk_size)
+        ]
+        results = pool.imap_unordered(_run_chunk, tasks)
+        finished = False
+        try:
+            for _ in tasks:
+                while True:
+                    if cancel is not None:
+                        cancel.check()
+                    try:
+                        chunk = results.next(poll_interval)
+                        break
+                    except multiprocessing.TimeoutError:
+                        pass
+                for result in chunk:
+                    if cancel is not None:
+                        cancel.check()
+                    yield result
+            finished = True
+        finally:
+            if not finished:
+                self._cancelled[query % CANCELLED_SLOTS] = query
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+            for shared in (self._shared, self._shared_ladder):
+                if shared is not None:
+                    shared.close()
+                    shared.unlink()
+            self._shared = self._shared_ladder = None
+
+    def start(self):
+        with self._lock:
+            if self._pool is None:
+                values = self.registry.values
+                filename = getattr(values, 'filename', None)
+                if filename is not None:
+                    # A memory-mapped store: workers map the same files and share the page cache
+                    source = ('store', os.path.dirname(filename))
+                else:
+                    self._shared = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                    np.ndarray(values.shape, values.dtype, buffer=self._shared.buf)[...] = values
+                    source = ('shared', self._shared.name, values.shape, values.dtype.str)
+                ladder = None
+                if self.smoothing is not None:
+                    shape = self.smoothing.ladder_shape()
+                    self._shared_ladder = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * 8, 1))
+                    steps = self.smoothing.export_ladder(np.ndarray(shape, np.float64, buffer=self._shared_ladder.buf))[0]
+                    ladder = (self._shared_ladder.name, shape, steps)
+                # Spawned rather than forked: the app has threads running by the time of the first query
+                context = multiprocessing.get_context('spawn')
+                self._cancelled = context.Array('q', CANCELLED_SLOTS, lock=False)
+                self._pool = context.Pool(
+                    self.processes, _init_worker,
+                    (source, self.registry.time, self.registry.names, self.smoothing_bytes, ladder, self._cancelled),
+                )
+            return self._pool
+
+
+def _init_worker(source, time, names, smoothing_bytes, ladder, cancelled):
+    _worker["cancelled"] = cancelled
+    if source[0] == 'store':
+        registry = DatasetRegistry.load_store(source[1])
+    else:
+        _, name, shape, dtype = source
+        # Kept in the worker state so the mapping lives as long as the process
+        _worker["shared"] = shared_memory.SharedMemory(name=name)
+        values = np.ndarray(shape, np.dtype(dtype), buffer=_worker["shared"].buf)
+        registry = DatasetRegistry(values, time, names)
+    levels = None
+    if ladder is not None:
+        name, shape, steps = ladder
+        _worker["shared_ladder"] = shared_memory.SharedMemory(name=name)
+        levels = (steps, np.ndarray(shape, np.float64, buffer=_worker["shared_ladder"].buf))
+    _worker["smoothing"] = SmoothingEngine(registry, max_bytes=smoothing_bytes, levels=levels)
+
+
+def _run_chunk(task):
+    query, function, positions, names, smoothness, args, with_trend = task
+    smoothing, cancelled = _worker["smoothing"], _worker["cancelled"]
+    results = []
+    for position, name in zip(positions, names):
+        if cancelled[query % CANCELLED_SLOTS] == query:
+            # The query was cancelled; nobody waits for the rest of this chunk
+            break
+        values = smoothing.curve(name, smoothness)[2]
+        if with_trend:
+            results.append((position, function(values, position, *args, trend=smoothing.trend(name, smoothness))))
+        else:
+            results.append((position, function(values, position, *args)))
+    return results
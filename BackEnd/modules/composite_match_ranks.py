@@ -1,11 +1,17 @@
+import os
+import sys
 import numpy as np
 import json
 import matplotlib.pyplot as plt
 from scipy.signal import savgol_filter
-from sklearn.metrics.pairwise import cosine_similarity, euclidean_distances
 from sklearn.preprocessing import normalize
 from tqdm import tqdm
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.Interval_NMS import window_nms
+from modules.Trend_Index import TrendIndex
+from modules.Window_Scoring import trend_scores
+
 # 读取JSON文件
 with open('drawing.json', 'r') as drawing_file:
     drawing_data = json.load(drawing_file)
@@ -29,41 +35,35 @@ drawing_x_coords_smooth = savgol_filter(drawing_x_coords, 11, 3)
 drawing_trend = np.diff(drawing_y_coords_smooth)
 drawing_trend = np.sign(drawing_trend)
 
-# 提取时间序列数据并计算增减趋势
+# 提取时间序列数据，增减趋势按每点2位编码打包进趋势索引
+trend_index = TrendIndex()
 all_segments = []
 for curve in smoothed_data:
     measurement_values = [point['y'] for point in curve['data']]
-    measurement_trend = np.diff(measurement_values)
-    measurement_trend = np.sign(measurement_trend)
-    for i in range(len(measurement_trend) - len(drawing_trend) + 1):
-        segment = measurement_trend[i:i + len(drawing_trend)]
-        all_segments.append((curve['name'], i, segment, measurement_values[i:i + len(drawing_trend) + 1]))
+    trend_index.add(curve['name'], measurement_values)
+    for i in range(len(measurement_values) - len(drawing_trend)):
+        all_segments.append((curve['name'], i, measurement_values[i:i + len(drawing_trend) + 1]))
 
-# 计算相似度
+# 计算相似度：XOR/AND加popcount一次得到所有窗口的点积和模长，再精确换算成余弦相似度和欧氏距离
 cosine_similarities = []
 euclidean_distances_list = []
 
-for _, _, segment, _ in tqdm(all_segments, desc="Calculating similarities"):
-    cosine_similarities.append(cosine_similarity([drawing_trend], [segment])[0][0])
-    euclidean_distances_list.append(euclidean_distances([drawing_trend], [segment])[0][0])
+for _, counts in tqdm(trend_index.scan(drawing_trend), total=len(trend_index), desc="Calculating similarities"):
+    cosine, euclidean = trend_scores(counts["dot"], counts["window_sq"], drawing_trend)
+    cosine_similarities.extend(cosine)
+    euclidean_distances_list.extend(euclidean)
 
-# 综合评价
-similarities = [(cosine_similarities[i] + (1 - euclidean_distances_list[i] / np.max(euclidean_distances_list))) / 2 for i in range(len(cosine_similarities))]
+# 综合评价（含缺失值的窗口得分为NaN）
+max_euclidean_distance = np.nanmax(euclidean_distances_list)
+similarities = [(cosine_similarities[i] + (1 - euclidean_distances_list[i] / max_euclidean_distance)) / 2 for i in range(len(cosine_similarities))]
 
 # 获取最相似的段并按相似度排序
-results = sorted([(all_segments[i][0], all_segments[i][1], similarities[i], all_segments[i][3]) for i in range(len(similarities))], key=lambda x: x[2], reverse=True)
-
-# 过滤高度重合的曲线段
-filtered_results = []
-used_indices = set()
-
-for res in tqdm(results, desc="Filtering results"):
-    name, index, similarity, segment_values = res
-    if all(abs(index - used_index) > len(drawing_trend) for used_index in used_indices):
-        filtered_results.append(res)
-        used_indices.add(index)
-        if len(filtered_results) >= 40:  # 只保留前10名
-            break
+results = sorted([(all_segments[i][0], all_segments[i][1], similarities[i], all_segments[i][2]) for i in range(len(similarities))], key=lambda x: x[2], reverse=True)
+
+# 过滤高度重合的曲线段：按曲线分组做区间非极大值抑制，只有同一条曲线上重叠超过overlap_ratio的段才互相抑制
+overlap_ratio = 0.0
+kept = window_nms([res[0] for res in results], [res[1] for res in results], [res[2] for res in results], len(drawing_trend) + 1, overlap_ratio, limit=40)
+filtered_results = [results[k] for k in kept]
 
 for res in filtered_results:
     print(f"曲线: {res[0]}, 起始索引: {res[1]}, 综合相似度: {res[2]}")
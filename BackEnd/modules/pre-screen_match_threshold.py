@@ -1,11 +1,13 @@
+import os
+import sys
 import numpy as np
 import json
 import matplotlib.pyplot as plt
 from scipy.signal import savgol_filter
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import normalize
-from tqdm import tqdm
-from joblib import Parallel, delayed
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.Interval_NMS import window_nms
+from modules.Window_Scoring import trend_counts, trend_scores, prescreen_windows, window_euclidean
 
 # 读取JSON文件
 with open('drawing.json', 'r') as drawing_file:
@@ -30,32 +32,34 @@ drawing_x_coords_smooth = savgol_filter(drawing_x_coords, 11, 3)
 drawing_trend = np.diff(drawing_y_coords_smooth)
 drawing_trend = np.sign(drawing_trend)
 
-# 提取时间序列数据并计算增减趋势
-all_segments = []
-for curve in smoothed_data:
-    measurement_values = [point['y'] for point in curve['data']]
-    measurement_trend = np.diff(measurement_values)
-    measurement_trend = np.sign(measurement_trend)
-    for i in range(len(measurement_trend) - len(drawing_trend) + 1):
-        segment = measurement_trend[i:i + len(drawing_trend)]
-        all_segments.append((curve['name'], i, segment, measurement_values[i:i + len(drawing_trend) + 1]))
-
-# 计算欧氏距离的最大值
-euclidean_distances_list = [np.linalg.norm(drawing_trend - segment[2]) for segment in all_segments]
-max_euclidean_distance = np.max(euclidean_distances_list)
+# 初步筛选的阈值：窗口与手绘趋势的平均L1差异小于该值才进入相似度计算
+prescreen_threshold = 1.5
 
-# 使用并行计算来提高相似度计算速度
-def calculate_similarities(segment, max_euclidean_distance):
-    cosine_sim = cosine_similarity([drawing_trend], [segment[2]])[0][0]
-    euclidean_dist = np.linalg.norm(drawing_trend - segment[2])
-    combined_similarity = (cosine_sim + (1 - euclidean_dist / max_euclidean_distance)) / 2
-    return segment[0], segment[1], combined_similarity, segment[3]
-
-# 初步筛选阶段
-initial_filtered_segments = [segment for segment in all_segments if np.sum(np.abs(segment[2] - drawing_trend)) / len(drawing_trend) < 1.5]
-
-# 并行计算相似度
-results = Parallel(n_jobs=-1)(delayed(calculate_similarities)(segment, max_euclidean_distance) for segment in tqdm(initial_filtered_segments, desc="Calculating similarities"))
+# 提取时间序列数据：每条曲线一次得到所有窗口的趋势统计，只保留通过初步筛选的窗口
+curve_scores = []
+max_euclidean_distance = 0.0
+total_windows = 0
+for curve in smoothed_data:
+    measurement_values = np.array([point['y'] for point in curve['data']], dtype=np.float64)
+    counts = trend_counts(measurement_values, drawing_trend)
+    # 初步筛选阶段：平均趋势差异小于阈值的窗口起点
+    indices, n_windows = prescreen_windows(measurement_values, drawing_trend, prescreen_threshold, counts)
+    total_windows += n_windows
+    if n_windows:
+        # 欧氏距离的最大值取自全部窗口（不只是通过筛选的窗口）
+        max_euclidean_distance = max(max_euclidean_distance, np.nanmax(window_euclidean(measurement_values, drawing_trend, counts)))
+    cosine, euclidean = trend_scores(counts["dot"][indices], counts["window_sq"][indices], drawing_trend)
+    curve_scores.append((curve['name'], measurement_values, indices, cosine, euclidean))
+
+n_passed = sum(len(indices) for _, _, indices, _, _ in curve_scores)
+print(f"初步筛选通过率: {n_passed} / {total_windows} ({n_passed / max(total_windows, 1):.1%})")
+
+# 计算综合相似度，只为通过筛选的窗口生成结果
+results = []
+for name, measurement_values, indices, cosine, euclidean in curve_scores:
+    combined_similarity = (cosine + (1 - euclidean / max_euclidean_distance)) / 2
+    for i, similarity in zip(indices.tolist(), combined_similarity.tolist()):
+        results.append((name, i, similarity, measurement_values[i:i + len(drawing_trend) + 1].tolist()))
 
 # 设置相似度阈值
 similarity_threshold = 0.85
@@ -63,15 +67,10 @@ similarity_threshold = 0.85
 # 筛选超过阈值的结果
 results = [res for res in results if res[2] >= similarity_threshold]
 
-# 过滤高度重合的曲线段
-filtered_results = []
-used_indices = set()
-
-for res in tqdm(results, desc="Filtering results"):
-    name, index, similarity, segment_values = res
-    if all(abs(index - used_index) > len(drawing_trend) for used_index in used_indices):
-        filtered_results.append(res)
-        used_indices.add(index)
+# 过滤高度重合的曲线段：按曲线分组做区间非极大值抑制，只有同一条曲线上重叠超过overlap_ratio的段才互相抑制
+overlap_ratio = 0.0
+kept = window_nms([res[0] for res in results], [res[1] for res in results], [res[2] for res in results], len(drawing_trend) + 1, overlap_ratio)
+filtered_results = [results[k] for k in kept]
 
 for res in filtered_results:
     print(f"曲线: {res[0]}, 起始索引: {res[1]}, 综合相似度: {res[2]}")
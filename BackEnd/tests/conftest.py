@@ -0,0 +1,47 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# Modules are imported as modules.X with BackEnd/ on the path, as app.py does
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+@pytest.fixture(scope='session')
+def registry():
+    # The bundled hcnData, for comparisons on real curves
+    from modules.Dataset_Registry import DatasetRegistry
+    return DatasetRegistry.load(os.path.join(BACKEND, 'static', 'Data', 'hcnData.json'))
+
+
+@pytest.fixture(scope='session')
+def smoothing(registry):
+    from modules.Smoothing import SmoothingEngine
+    return SmoothingEngine(registry)
+
+
+@pytest.fixture(scope='session')
+def sketches(registry):
+    """
+    Sketches cut from random segments of the dataset curves, as the frontend sends
+    them: one fabric path whose y axis points down.
+    """
+    rng = np.random.default_rng(0)
+    drawings = []
+    for _ in range(15):
+        _, _, values = registry.curve(registry.names[rng.integers(len(registry.names))])
+        length = int(rng.integers(40, 200))
+        start = int(rng.integers(0, len(values) - length))
+        path = [['M' if i == 0 else 'L', i, -values[start + i]] for i in range(length)]
+        drawings.append([{"path": path}])
+    return drawings
+
+
+def run_analysis(analysis):
+    # Return value of an analysis generator, see Combined_Match.analyze_similarity
+    while True:
+        try:
+            next(analysis)
+        except StopIteration as stop:
+            return stop.value
@@ -0,0 +1,139 @@
+import json
+import os
+import time
+import pytest
+from modules.Response_Encoding import COLUMNS_MIMETYPE, encode_columns
+
+
+@pytest.fixture(scope='module')
+def server():
+    # The app module with its dataset loaded, matching in-process
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('VIS4NFAD_WORKERS', '1')
+        import app
+        app.create_app()
+    return app
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
+
+
+@pytest.fixture(scope='module')
+def drawing(server):
+    with open(os.path.join(server.app.static_folder, 'Data', 'drawing.json'), 'r') as f:
+        return json.load(f)
+
+
+def wait(client, job_id, timeout=60):
+    # Status of a job once it has stopped running
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(f'/jobs/{job_id}').get_json()['status']
+        if status not in ('queued', 'running'):
+            return status
+        time.sleep(0.02)
+    raise TimeoutError(job_id)
+
+
+def submit(test_client, drawing, curves, smoothness, **fields):
+    return test_client.post('/jobs', json={"drawing": drawing, "curves": curves, "smoothness": smoothness, **fields})
+
+
+def test_submitted_job_completes_and_identical_query_is_cached(server, client, drawing):
+    names = server.dataset.names[:5]
+    response = submit(client, drawing, names, 0.25)
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert wait(client, job_id) == 'complete'
+    page = client.get(f'/jobs/{job_id}/results').get_json()
+    assert page['total'] > 0 and {row['Hcn'] for row in page['rows']} <= set(names)
+
+    hits = client.get('/cache/stats').get_json()['hits']
+    cached = submit(client, drawing, names, 0.25)
+    assert cached.status_code == 200 and cached.get_json()['status'] == 'complete'
+    assert client.get('/cache/stats').get_json()['hits'] == hits + 1
+    assert client.get(f"/jobs/{cached.get_json()['job_id']}/results").get_json()['rows'] == page['rows']
+
+
+def test_invalid_submission_creates_no_job_and_cancels_nothing(server, client, drawing):
+    running = submit(client, drawing, server.dataset.names * 100, 0.1, client='tab-a').get_json()['job_id']
+    n_jobs = len(server.jobs._jobs)
+    for body in (
+        {"drawing": drawing, "curves": server.dataset.names, "smoothness": 'smooth', "client": 'tab-a'},
+        {"drawing": drawing, "curves": ['no such curve'], "smoothness": 0.1, "client": 'tab-a'},
+        {"drawing": [{"path": [['M', 'x', 0]]}], "curves": server.dataset.names, "client": 'tab-a'},
+    ):
+        assert client.post('/jobs', json=body).status_code == 400
+    # Queries are JSON only; binary columns are a response format
+    binary = encode_columns({"drawing": drawing, "curves": server.dataset.names, "client": 'tab-a'})
+    assert client.post('/jobs', data=binary, content_type=COLUMNS_MIMETYPE).status_code == 400
+    assert len(server.jobs._jobs) == n_jobs
+    assert not server.jobs.get(running).token.cancelled
+
+    assert client.post(f'/jobs/{running}/cancel').status_code == 202
+    assert wait(client, running) == 'cancelled'
+    assert client.get(f'/jobs/{running}/results').status_code == 410
+    assert client.post(f'/jobs/{running}/cancel').status_code == 404
+
+
+def test_cache_failure_still_reports_completion(server, client, drawing, monkeypatch):
+    def fail(key, results):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(server.result_cache, 'put', fail)
+    socket = server.socketio.test_client(server.app, flask_test_client=client, query_string='client=tab-e')
+    job_id = submit(client, drawing, server.dataset.names[:2], 0.45, client='tab-e').get_json()['job_id']
+    assert wait(client, job_id) == 'complete'
+    # The status is set before the event is sent
+    received, deadline = [], time.monotonic() + 10
+    while not any(event['name'] == 'processing_complete' for event in received) and time.monotonic() < deadline:
+        received += socket.get_received()
+        time.sleep(0.02)
+    [event] = [event for event in received if event['name'] == 'processing_complete']
+    assert event['args'][0] == {'job_id': job_id, 'message': 'Processing complete', 'status': 'complete'}
+    socket.disconnect()
+
+
+def test_table_data_is_scoped_to_the_requesting_client(server, client, drawing):
+    mine = submit(client, drawing, server.dataset.names[:2], 0.55, client='tab-f').get_json()['job_id']
+    assert wait(client, mine) == 'complete'
+    theirs = submit(client, drawing, server.dataset.names[2:4], 0.55, client='tab-g').get_json()['job_id']
+    assert wait(client, theirs) == 'complete'
+    # Another client finishing later does not change what this one is shown
+    assert client.get('/get_table_data?client=tab-f').get_json() == client.get(f'/jobs/{mine}/results').get_json()
+    assert client.get('/get_table_data').status_code == 400
+    assert client.get('/get_table_data?client=tab-none').status_code == 404
+
+
+def test_new_query_supersedes_the_clients_running_job(server, client, drawing):
+    older = submit(client, drawing, server.dataset.names * 100, 0.15, client='tab-b').get_json()['job_id']
+    other = submit(client, drawing, server.dataset.names[:3], 0.15, client='tab-c').get_json()['job_id']
+    newer = submit(client, drawing, server.dataset.names[:3], 0.35, client='tab-b').get_json()['job_id']
+    assert wait(client, older) == 'cancelled'
+    assert wait(client, newer) == 'complete'
+    assert wait(client, other) == 'complete'
+
+
+def test_joining_a_job_replays_what_the_client_missed(server, client, drawing):
+    # Events sent before the submitting tab knew the job id are replayed when it joins the job
+    socket = server.socketio.test_client(server.app, flask_test_client=client)
+    running = submit(client, drawing, server.dataset.names * 100, 0.2, client='tab-d').get_json()['job_id']
+    socket.emit('join_job', {'job_id': running})
+    received = socket.get_received()
+    replayed = [event for event in received if event['name'] == 'progress_update']
+    assert replayed and replayed[-1]['args'][0]['job_id'] == running
+    # with the rows streamed so far, which later numbered updates build on
+    [snapshot] = [event['args'][0] for event in received if event['name'] == 'topk_update' and event['args'][0].get('snapshot')]
+    assert snapshot['job_id'] == running and snapshot['seq'] <= server.jobs.get(running).topk.seq
+    assert all('Key' in row for row in snapshot['rows'])
+    client.post(f'/jobs/{running}/cancel')
+    assert wait(client, running) == 'cancelled'
+
+    finished = submit(client, drawing, server.dataset.names[:2], 0.2).get_json()['job_id']
+    assert wait(client, finished) == 'complete'
+    socket.get_received()
+    socket.emit('join_job', {'job_id': finished})
+    [event] = [event for event in socket.get_received() if event['name'] == 'processing_complete']
+    assert event['args'][0] == {'job_id': finished, 'message': 'Processing complete', 'status': 'complete'}
+    socket.disconnect()
@@ -0,0 +1,20 @@
+from conftest import run_analysis
+from modules.Combined_Match import MATCHER_PARAMS, analyze_similarity
+
+RUNS = {**MATCHER_PARAMS, "run_length_tolerance": 0.5}
+NO_RUNS = {**MATCHER_PARAMS, "run_length_tolerance": None}
+
+
+def test_default_matching_is_not_run_filtered(smoothing, registry, sketches):
+    curves = smoothing.curves(registry.names, 0.3)
+    for drawing in sketches:
+        assert (run_analysis(analyze_similarity(drawing, curves, 0.3))
+                == run_analysis(analyze_similarity(drawing, curves, 0.3, NO_RUNS)))
+
+
+def test_run_filtered_fallback_ranks_every_prescreened_window(smoothing, registry, sketches):
+    # With no window above the threshold, the run filter must not change the fallback
+    curves = smoothing.curves(registry.names, 0.3)
+    for drawing in sketches:
+        rows = run_analysis(analyze_similarity(drawing, curves, 0.3, {**RUNS, "similarity_threshold": 1.01}))
+        assert rows == run_analysis(analyze_similarity(drawing, curves, 0.3, {**NO_RUNS, "similarity_threshold": 1.01}))
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from modules.DTW_Kernel import dtw_batch, dtw_distance, dtw_windows
+
+
+def brute_dtw(a, b, band=None):
+    # Textbook O(n * m) DTW with |a - b| cost and a Sakoe-Chiba band widened to the length difference
+    n, m = len(a), len(b)
+    band = max(n, m) if band is None else max(band, abs(n - m))
+    cost = np.full((n + 1, m + 1), np.inf)
+    cost[0, 0] = 0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if abs(i - j) <= band:
+                cost[i, j] = abs(a[i - 1] - b[j - 1]) + min(cost[i - 1, j - 1], cost[i - 1, j], cost[i, j - 1])
+    return cost[n, m]
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('band', [None, 0, 2, 5])
+def test_dtw_distance_matches_brute_force(seed, band):
+    rng = np.random.default_rng(seed)
+    a, b = rng.normal(size=rng.integers(5, 25)), rng.normal(size=rng.integers(5, 25))
+    distance, path = dtw_distance(a, b, band, return_path=True)
+    assert np.isclose(distance, brute_dtw(a, b, band))
+    # The path is a warping path whose cost is the distance
+    assert path[0] == (0, 0) and path[-1] == (len(a) - 1, len(b) - 1)
+    assert all(0 <= i2 - i1 <= 1 and 0 <= j2 - j1 <= 1 for (i1, j1), (i2, j2) in zip(path, path[1:]))
+    assert np.isclose(sum(abs(a[i] - b[j]) for i, j in path), distance)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('band', [None, 0, 1, 4])
+@pytest.mark.parametrize('length', [16, 40])
+def test_dtw_batch_matches_brute_force(seed, band, length):
+    rng = np.random.default_rng(seed)
+    query, windows = rng.normal(size=length), rng.normal(size=(30, length))
+    # Shifted windows are abandoned early by the remaining LB_Keogh cost
+    windows[::3] += 3
+    expected = np.array([brute_dtw(query, window, band) for window in windows])
+    assert np.allclose(dtw_batch(query, windows, band), expected)
+    # With a bound, windows within it are exact and the others exact or abandoned as inf
+    bound = np.median(expected)
+    bounded = dtw_batch(query, windows, band, bound=bound)
+    within = expected <= bound
+    assert np.allclose(bounded[within], expected[within])
+    assert np.all(np.isinf(bounded[~within]) | np.isclose(bounded[~within], expected[~within]))
+
+
+def test_dtw_windows_skip_missing_samples():
+    rng = np.random.default_rng(0)
+    series = np.cumsum(rng.normal(size=50))
+    series[[10, 31]] = np.nan
+    query = rng.normal(size=8)
+    distances = dtw_windows(query, series, band=2, batch_size=7)
+    for start, distance in enumerate(distances):
+        window = series[start:start + 8]
+        if np.isnan(window).any():
+            assert distance == np.inf
+        else:
+            assert np.isclose(distance, brute_dtw(query, window, 2))
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from modules.DTW_Pruning import dtw_search
+
+
+def brute_dtw(a, b, band):
+    # Textbook O(n * m) DTW with |a - b| cost and a Sakoe-Chiba band
+    n, m = len(a), len(b)
+    cost = np.full((n + 1, m + 1), np.inf)
+    cost[0, 0] = 0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            if abs(i - j) <= band:
+                cost[i, j] = abs(a[i - 1] - b[j - 1]) + min(cost[i - 1, j - 1], cost[i - 1, j], cost[i, j - 1])
+    return cost[n, m]
+
+
+def brute_search(query, curves, band):
+    # Distance of every window without missing samples, best first
+    m = len(query)
+    matches = []
+    for name, series in curves:
+        series = np.asarray(series, dtype=np.float64)
+        for start in range(len(series) - m + 1):
+            window = series[start:start + m]
+            if not np.isnan(window).any():
+                matches.append((brute_dtw(query, window, band), name, start))
+    return sorted(matches, key=lambda match: match[0])
+
+
+def random_curves(rng, n_curves=3, length=60, gap_rate=0.05):
+    curves = []
+    for k in range(n_curves):
+        series = np.cumsum(rng.normal(size=length))
+        series[rng.random(length) < gap_rate] = np.nan
+        curves.append((f'c{k}', series))
+    return curves
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_top_k_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    query = np.cumsum(rng.normal(size=12))
+    curves = random_curves(rng)
+    band = 3
+    results, _ = dtw_search(query, curves, band=band, top_k=10)
+    expected = brute_search(query, curves, band)[:10]
+    np.testing.assert_allclose([distance for _, _, distance in results], [distance for distance, _, _ in expected])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_threshold_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    query = np.cumsum(rng.normal(size=12))
+    curves = random_curves(rng)
+    expected = brute_search(query, curves, 4)
+    threshold = expected[len(expected) // 4][0]
+    results, _ = dtw_search(query, curves, band=4, threshold=threshold)
+    assert sorted((name, start) for name, start, _ in results) == sorted(
+        (name, start) for distance, name, start in expected if distance <= threshold
+    )
+
+
+def test_top_k_without_threshold_skips_gap_windows():
+    # Regression: with no threshold the bound is inf, which gap windows used to pass
+    results, stats = dtw_search([0, 0, 0], [('a', [5, 5, 5, np.nan, 5, 5, 5, 5])], top_k=3)
+    assert sorted(start for _, start, _ in results) == [0, 4, 5]
+    assert stats["gaps"] == 3
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from modules.Gap_Mask import fill_gaps, mask_profile, missing_counts, valid_windows
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('m', [1, 4, 17])
+def test_missing_counts_match_per_window_counts(seed, m):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(3, 120))
+    values[rng.random(values.shape) < 0.08] = np.nan
+    filled, valid = fill_gaps(values)
+    assert not np.isnan(filled).any() and np.array_equal(valid, ~np.isnan(values))
+    expected = np.array([[np.isnan(row[start:start + m]).sum() for start in range(120 - m + 1)] for row in values])
+    assert np.array_equal(missing_counts(valid, m), expected)
+    assert np.array_equal(valid_windows(valid, m), expected == 0)
+
+
+def test_mask_profile_skips_or_penalises_gap_windows():
+    valid = np.array([True, True, False, True, True, True])
+    profile = np.arange(4, dtype=np.float64)  # windows of 3 starting at 0..3
+    assert mask_profile(profile, valid, 3).tolist() == [np.inf, np.inf, np.inf, 3.0]
+    assert mask_profile(profile, valid, 3, larger_is_better=True).tolist() == [-np.inf, -np.inf, -np.inf, 3.0]
+    assert mask_profile(profile, valid, 3, gap_penalty=10).tolist() == [10.0, 11.0, 12.0, 3.0]
+    # Every second window start
+    assert mask_profile(profile[:2], valid, 3, hop=2).tolist() == [np.inf, np.inf]
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from modules.Interval_NMS import interval_nms, window_nms
+
+
+def brute_nms(curves, starts, ends, scores, overlap_ratio, larger_is_better, limit):
+    # Best first (NaN last, ties in input order), checking every interval kept so far
+    def key(position):
+        score = scores[position]
+        return (np.isnan(score), -score if larger_is_better else score)
+    kept = []
+    for position in sorted(range(len(scores)), key=key):
+        overlaps = (
+            min(ends[position], ends[other]) - max(starts[position], starts[other])
+            > overlap_ratio * min(ends[position] - starts[position], ends[other] - starts[other])
+            for other in kept if curves[other] == curves[position]
+        )
+        if not any(overlaps):
+            kept.append(position)
+            if limit is not None and len(kept) >= limit:
+                break
+    return kept
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('overlap_ratio', [0.0, 0.3, 0.5])
+@pytest.mark.parametrize('larger_is_better', [True, False])
+def test_interval_nms_matches_brute_force(seed, overlap_ratio, larger_is_better):
+    rng = np.random.default_rng(seed)
+    n = 200
+    curves = [f'c{k}' for k in rng.integers(0, 3, size=n)]
+    starts = rng.integers(0, 500, size=n)
+    ends = starts + rng.integers(5, 40, size=n)
+    # Rounded so that ties occur, with a few NaN scores
+    scores = np.round(rng.normal(size=n), 1)
+    scores[rng.random(n) < 0.05] = np.nan
+    for limit in (None, 7):
+        kept = interval_nms(curves, starts, ends, scores, overlap_ratio, larger_is_better, limit)
+        assert kept.tolist() == brute_nms(curves, starts, ends, scores, overlap_ratio, larger_is_better, limit)
+
+
+def test_window_nms_uses_fixed_length_windows():
+    curves = ['a', 'a', 'a', 'b']
+    starts = np.array([0, 5, 10, 5])
+    kept = window_nms(curves, starts, [0.9, 0.8, 0.7, 0.1], length=10)
+    # 5 overlaps the better 0; 10 only touches it; the other curve is independent
+    assert kept.tolist() == [0, 2, 3]
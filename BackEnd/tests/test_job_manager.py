@@ -0,0 +1,13 @@
+from modules.Job_Manager import JobManager
+
+
+def test_supersede_cancels_only_the_clients_other_unfinished_jobs():
+    jobs = JobManager()
+    older = jobs.create(None, [], 0.0, client='tab')
+    other_client = jobs.create(None, [], 0.0, client='other')
+    # Creating a job does not cancel anything by itself
+    newer = jobs.create(None, [], 0.0, client='tab')
+    assert not older.token.cancelled
+    jobs.supersede(newer)
+    assert older.token.cancelled
+    assert not newer.token.cancelled and not other_client.token.cancelled
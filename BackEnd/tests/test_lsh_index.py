@@ -0,0 +1,43 @@
+import numpy as np
+from modules.LSH_Index import LSHIndex
+
+
+def unit(window):
+    norm = np.linalg.norm(window)
+    return window / norm if norm else window
+
+
+def test_candidates_are_ranked_by_exact_distance():
+    rng = np.random.default_rng(0)
+    curves = [(f'c{k}', np.cumsum(rng.normal(size=200))) for k in range(3)]
+    index = LSHIndex(16, n_tables=16, n_bits=4)
+    index.add(curves)
+    query = curves[1][1][50:66] + rng.normal(scale=0.01, size=16)
+    results, stats = index.query(query, top_k=5)
+    # The window the query was taken from is found, and distances are the exact ones
+    assert ('c1', 50) in [(name, start) for name, start, _ in results]
+    series = dict(curves)
+    for name, start, distance in results:
+        assert np.isclose(distance, np.linalg.norm(unit(series[name][start:start + 16]) - unit(query)))
+    assert [distance for _, _, distance in results] == sorted(distance for _, _, distance in results)
+
+
+def test_gap_windows_are_not_indexed():
+    series = np.arange(40, dtype=np.float64)
+    series[10] = np.nan
+    index = LSHIndex(8)
+    index.add([('a', series)])
+    starts = set(index.window_start.tolist())
+    assert not starts & set(range(3, 11))
+    assert len(index) == 33 - 8
+
+
+def test_reopened_index_only_returns_requested_curves(tmp_path):
+    # Regression: a persisted index reopened for a subset returned windows of every curve it held
+    rng = np.random.default_rng(1)
+    a, b = np.cumsum(rng.normal(size=100)), np.cumsum(rng.normal(size=100))
+    LSHIndex.open(tmp_path, [('a', a), ('b', b)], 10, n_tables=4, n_bits=2)
+    index = LSHIndex.open(tmp_path, [('a', a)], 10, n_tables=4, n_bits=2)
+    results, _ = index.query(b[20:30], top_k=50)
+    assert results and {name for name, _, _ in results} == {'a'}
+    assert {name for name, _, _ in index.query(b[20:30], top_k=50, names=['b'])[0]} == {'b'}
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from modules.MASS_Profile import distance_profiles, mass_search
+
+
+def znorm(values):
+    return (values - values.mean()) / values.std()
+
+
+def brute_score(query, window, metric):
+    # One window scored directly from its definition
+    if metric == 'znorm_euclidean':
+        return np.linalg.norm(znorm(query) - znorm(window))
+    if metric == 'euclidean':
+        return np.linalg.norm(query - window)
+    return np.dot(query, window) / np.linalg.norm(query) / np.linalg.norm(window)
+
+
+def brute_search(query, curves, metric):
+    # Every window without missing samples, best first
+    m = len(query)
+    matches = []
+    for name, series in curves:
+        for start in range(len(series) - m + 1):
+            window = series[start:start + m]
+            if not np.isnan(window).any():
+                matches.append((brute_score(query, window, metric), name, start))
+    return sorted(matches, key=lambda match: -match[0] if metric == 'cosine' else match[0])
+
+
+METRICS = ['znorm_euclidean', 'euclidean', 'cosine']
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('metric', METRICS)
+def test_distance_profiles_match_brute_force(seed, metric):
+    rng = np.random.default_rng(seed)
+    query = rng.normal(size=12)
+    batch = np.cumsum(rng.normal(size=(3, 80)), axis=1) + 100
+    profiles = distance_profiles(query, batch, metric)
+    expected = [[brute_score(query, row[start:start + 12], metric) for start in range(69)] for row in batch]
+    assert np.allclose(profiles, expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('metric', METRICS)
+def test_mass_search_matches_brute_force(seed, metric):
+    rng = np.random.default_rng(seed)
+    query = rng.normal(size=10)
+    curves = []
+    for k, length in enumerate([60, 45, 9]):
+        series = np.cumsum(rng.normal(size=length))
+        series[rng.random(length) < 0.05] = np.nan
+        curves.append((f'c{k}', series))
+    expected = brute_search(query, curves, metric)
+    results = mass_search(query, curves, metric, top_k=None)
+    assert len(results) == len(expected)
+    assert np.allclose([score for _, _, score in results], [score for score, _, _ in expected], atol=1e-6)
+    top = mass_search(query, curves, metric, top_k=5)
+    assert [(name, start) for name, start, _ in top] == [(name, start) for _, name, start in expected[:5]]
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from modules.Dataset_Registry import DatasetRegistry, gradient_pyramid, save_store
+from modules.DTW_Pruning import dtw_search
+from modules.PAA_Pyramid import PYRAMID_FACTORS, build_pyramid, paa, pyramid_search
+
+
+def test_paa_is_the_block_mean():
+    series = np.arange(10, dtype=np.float64)
+    series[7] = np.nan
+    assert np.array_equal(paa(series, 3), [1.0, 4.0, np.nan], equal_nan=True)
+    levels = build_pyramid(series[:8], (1, 2, 4))
+    assert np.array_equal(levels[4], [1.5, np.nan], equal_nan=True)
+
+
+def test_registry_pyramid_is_stored_with_the_dataset(registry, tmp_path):
+    values = registry.values[:3, :500].copy()
+    values[1, 100:120] = np.nan
+    save_store(str(tmp_path), values, registry.time[:500], registry.names[:3])
+    stored = DatasetRegistry.load_store(str(tmp_path))
+    # Loaded memory-mapped from paa_<factor>.npy rather than rebuilt
+    assert sorted(stored.levels) == list(PYRAMID_FACTORS)
+    assert all(isinstance(level, np.memmap) for level in stored.levels.values())
+    built = DatasetRegistry(values, registry.time[:500], registry.names[:3])
+    for name in registry.names[:3]:
+        for factor, level in stored.pyramid(name).items():
+            assert np.array_equal(level, built.pyramid(name)[factor], equal_nan=True)
+    expected = gradient_pyramid(values[1])
+    assert np.array_equal(stored.pyramid(registry.names[1])[4], expected[4], equal_nan=True)
+    assert np.isnan(stored.pyramid(registry.names[1])[1][100:120]).all()
+
+
+def test_pyramid_search_recall(registry):
+    """
+    Coarse-to-fine search over the dataset's stored gradient pyramid against the exact
+    full-resolution search: the planted match ranks first and most of the exact top
+    matches are found (within a quarter query of their start).
+    """
+    names = registry.names[:4]
+    curves = [(name, registry.pyramid(name)) for name in names]
+    full = [(name, pyramid[1]) for name, pyramid in curves]
+    rng = np.random.default_rng(0)
+    found = total = 0
+    for _ in range(5):
+        curve = int(rng.integers(len(names)))
+        series = full[curve][1]
+        m = int(rng.integers(64, 128))
+        start = int(rng.integers(0, len(series) - m))
+        query = series[start:start + m] + rng.normal(0, 0.1 * np.nanstd(series), m)
+        exact, _ = dtw_search(query, full, band=m // 10, top_k=10, exclusion_zone=m)
+        matches, _ = pyramid_search(query, curves, band=m // 10, top_k=10, exclusion_zone=m, candidates=1000)
+        assert matches[0][:2] == (names[curve], start)
+        found += sum(any(name == other and abs(index - other_index) <= m // 4 for other, other_index, _ in matches)
+                     for name, index, _ in exact)
+        total += len(exact)
+    assert found / total >= 0.8
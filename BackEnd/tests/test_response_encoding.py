@@ -0,0 +1,31 @@
+import json
+import numpy as np
+import pytest
+from modules.Response_Encoding import PayloadError, decode_columns, encode_columns
+
+
+def test_columns_round_trip_in_double_precision():
+    time = np.linspace(4043.0, 4043.0 + 1e-6 * 99, 100)
+    payload = {"name": 'a', "time": time, "values": (time * 1.1).tolist(), "short": [1, 2], "Trend": [1.0, -1.0] * 10}
+    decoded = decode_columns(encode_columns(payload, float32_keys=('Trend',)))
+    # float64 by default, so times a microsecond apart stay distinct
+    assert np.array_equal(decoded["time"], time)
+    assert np.array_equal(decoded["values"], time * 1.1)
+    assert decoded["short"] == [1, 2] and decoded["name"] == 'a'
+    assert np.array_equal(decoded["Trend"], [1.0, -1.0] * 10)
+    header_length = int.from_bytes(encode_columns(payload, float32_keys=('Trend',))[4:8], 'little')
+    header = json.loads(encode_columns(payload, float32_keys=('Trend',))[8:8 + header_length])
+    assert [dtype for dtype, _ in header["columns"]] == ['<f8', '<f8', '<f4']
+
+
+@pytest.mark.parametrize('body', [
+    b'',
+    b'V4NC',
+    b'V4NC\x05\x00\x00\x00{"pay',
+    b'V4NC\x02\x00\x00\x00[]',
+    encode_columns({"values": list(range(32))})[:-8],
+    b'V4NC\x26\x00\x00\x00{"payload":{"$column":3},"columns":[]}',
+])
+def test_malformed_bodies_raise_payload_error(body):
+    with pytest.raises(PayloadError):
+        decode_columns(body)
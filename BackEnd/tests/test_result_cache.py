@@ -0,0 +1,50 @@
+import json
+import os
+import numpy as np
+from modules.Dataset_Registry import DatasetRegistry
+from modules.Result_Cache import ResultCache, curves_digest, query_key
+
+DRAWING = [{"path": [['M', 0, 0], ['Q', 1, 2, 3, 1]]}]
+
+
+def test_key_follows_uploaded_samples():
+    time = np.arange(4, dtype=np.float64)
+    values = np.array([0.1, 0.2, 0.3, 0.4])
+    single = values.astype(np.float32).astype(np.float64)
+    keys = {
+        query_key(DRAWING, ['a'], 0.1, {}, curves_digest([('a', time, curve)]))
+        for curve in (values, single, values.copy())
+    }
+    # Same samples hash the same, float32-rounded ones do not
+    assert len(keys) == 2
+
+
+def test_key_follows_dataset_version(tmp_path):
+    values = np.arange(12, dtype=np.float64).reshape(2, 6)
+    old = DatasetRegistry(values, np.arange(6), ['a', 'b'])
+    new = DatasetRegistry(values + np.eye(2, 6), np.arange(6), ['a', 'b'])
+    assert old.version == DatasetRegistry(values.copy(), np.arange(6), ['a', 'b']).version
+    cache = ResultCache(disk_dir=str(tmp_path))
+    cache.put(query_key(DRAWING, ['a'], 0.1, {}, old.version), [{"Hcn": 'a'}])
+    # A restarted server over changed data does not get the old results from disk
+    restarted = ResultCache(disk_dir=str(tmp_path))
+    assert restarted.get(query_key(DRAWING, ['a'], 0.1, {}, new.version)) is None
+    assert restarted.get(query_key(DRAWING, ['a'], 0.1, {}, old.version)) == [{"Hcn": 'a'}]
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    rows = [{"Hcn": 'a', "Combined Similarity": 0.5}] * 20
+    size = len(json.dumps(rows, separators=(',', ':')))
+    cache = ResultCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=3 * size)
+    for key in ('k1', 'k2', 'k3'):
+        cache.put(key, rows)
+    # Reading k1 back from disk makes k2 the least recently used file
+    assert cache.get('k1') == rows
+    cache.put('k4', rows)
+    assert sorted(os.listdir(tmp_path)) == ['k1.json', 'k3.json', 'k4.json']
+    assert cache.stats()["disk_bytes"] == 3 * size and cache.stats()["disk_evictions"] == 1
+    # A restart over a smaller cap keeps the most recently used files
+    os.utime(tmp_path / 'k1.json', (0, 0))
+    restarted = ResultCache(disk_dir=str(tmp_path), max_disk_bytes=2 * size)
+    assert sorted(os.listdir(tmp_path)) == ['k3.json', 'k4.json']
+    assert restarted.get('k1') is None and restarted.get('k4') == rows
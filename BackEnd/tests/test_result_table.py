@@ -0,0 +1,48 @@
+import numpy as np
+from modules.Result_Table import TopkStream, query_rows, row_delta, row_key
+
+
+def rows_of(*keys):
+    return [{"Hcn": name, "StartIndex": start, "CombinedSimilarity": 1.0 - start / 100} for name, start in keys]
+
+
+def test_row_delta_turns_the_shown_rows_into_the_new_ones():
+    rng = np.random.default_rng(0)
+    shown = {}
+    for _ in range(50):
+        keys = {(f'c{curve}', int(start)) for curve, start in rng.integers(0, [3, 20], size=(8, 2))}
+        rows = rows_of(*sorted(keys))
+        before = dict(shown)
+        added, removed = row_delta(shown, rows)
+        assert set(shown) == {row_key(row) for row in rows}
+        assert {row["Key"] for row in added} == set(shown) - set(before)
+        assert set(removed) == set(before) - set(shown)
+
+
+def test_topk_stream_numbers_updates_and_snapshots_the_shown_rows():
+    stream = TopkStream()
+    first = stream.update(rows_of(('a', 1), ('b', 2)))
+    assert first["seq"] == 1 and len(first["added"]) == 2 and first["removed"] == []
+    # Unchanged rows send nothing and do not advance the sequence
+    assert stream.update(rows_of(('a', 1), ('b', 2))) is None
+    second = stream.update(rows_of(('a', 1), ('c', 3)))
+    assert second["seq"] == 2 and [row["Key"] for row in second["added"]] == ['c@3'] and second["removed"] == ['b@2']
+    snapshot = stream.snapshot()
+    assert snapshot["seq"] == 2 and snapshot["snapshot"]
+    assert sorted(row["Key"] for row in snapshot["rows"]) == ['a@1', 'c@3']
+
+
+def test_query_rows_sorts_cuts_and_pages():
+    rows = [{"Hcn": f'c{n}', "Score": score} for n, score in enumerate([0.3, None, 0.9, 0.3, float('nan'), 0.7])]
+    page, total = query_rows(rows, sort="Score")
+    # Ties keep their stored order; missing values sort last in either direction
+    assert [row["Row"] for row in page] == [2, 5, 0, 3, 1, 4] and total == 6
+    page, _ = query_rows(rows, sort="Score", descending=False)
+    assert [row["Row"] for row in page] == [0, 3, 5, 2, 1, 4]
+    # top_k cuts before paging, and total counts the cut table
+    page, total = query_rows(rows, sort="Score", top_k=4, offset=1, limit=2)
+    assert [row["Row"] for row in page] == [5, 0] and total == 4
+    page, total = query_rows(rows, top_k=4, offset=3, limit=5)
+    assert [row["Row"] for row in page] == [3] and total == 4
+    assert query_rows(rows, offset=10) == ([], 6)
+    assert page[0]["Hcn"] == rows[3]["Hcn"] and "Row" not in rows[3]
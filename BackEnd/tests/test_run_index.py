@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from modules.Run_Index import candidate_windows, match_runs, trend_runs
+
+
+def brute_runs(values, min_length):
+    # Sample by sample: split at every change of trend symbol, then absorb short runs
+    trend = [None if np.isnan(d) else np.sign(d) for d in np.diff(values)]
+    raw = []
+    for position, symbol in enumerate(trend):
+        if raw and (raw[-1][0] == symbol or (raw[-1][0] is None and symbol is None)):
+            raw[-1][2] += 1
+        else:
+            raw.append([symbol, position, 1])
+    kept = []
+    for symbol, start, length in raw:
+        if kept and kept[-1][0] == symbol and symbol is not None:
+            kept[-1][2] += length
+        elif kept and length < min_length and symbol is not None and kept[-1][0] is not None:
+            kept[-1][2] += length
+        else:
+            kept.append([symbol, start, length])
+    return [(np.nan if symbol is None else symbol, start, length) for symbol, start, length in kept]
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('min_length', [1, 3, 6])
+def test_trend_runs_match_brute_force(seed, min_length):
+    rng = np.random.default_rng(seed)
+    values = np.round(np.cumsum(rng.normal(size=300)), 0)
+    values[rng.choice(300, size=8, replace=False)] = np.nan
+    runs = trend_runs(values, min_length)
+    expected = brute_runs(values, min_length)
+    assert np.array_equal(runs["direction"], [direction for direction, _, _ in expected], equal_nan=True)
+    assert runs["start"].tolist() == [start for _, start, _ in expected]
+    assert runs["length"].tolist() == [length for _, _, length in expected]
+    ends = runs["start"] + runs["length"]
+    assert np.array_equal(runs["amplitude"], np.abs(values[ends] - values[runs["start"]]), equal_nan=True)
+
+
+def test_candidate_windows_cover_the_matching_run_sequence():
+    # Rise 20, fall 10, rise 20: a sketch of the same shape is found where it was placed
+    shape = np.concatenate([np.arange(20), 20 - np.arange(10), 10 + np.arange(21)])
+    values = np.concatenate([np.zeros(30), shape, np.zeros(30)])
+    sketch = trend_runs(shape, 3)
+    n_windows = len(values) - 1 - int(sketch["length"].sum()) + 1
+    candidates = candidate_windows(trend_runs(values, 3), sketch, n_windows, slack=3)
+    assert 29 in candidates or 30 in candidates
+    lo, hi = match_runs(trend_runs(values, 3), sketch, slack=3)
+    assert len(lo) == 1 and lo[0] <= 30 <= hi[0]
@@ -0,0 +1,55 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import numpy as np
+import pytest
+from modules.Smoothing import SmoothingEngine, smooth
+
+HCN_DATA_VUE = os.path.join(os.path.dirname(__file__), '..', '..', 'VIS4NFAD', 'src', 'components', 'Hcn-Data.vue')
+
+
+def js_interpolate(rows, smoothness):
+    # Run the frontend's own interpolateData, cut out of Hcn-Data.vue, under node
+    source = open(HCN_DATA_VUE, encoding='utf-8').read()
+    function = re.search(r'function interpolateData\(data, t\) \{.*?\n    \}\n', source, re.S).group(0)
+    script = function + """
+const input = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const output = input.rows.map(row => interpolateData(row.map((y, x) => ({x, y})), input.t).map(d => d.y));
+process.stdout.write(JSON.stringify(output));
+"""
+    result = subprocess.run(['node', '-e', script], input=json.dumps({"rows": rows, "t": smoothness}),
+                            capture_output=True, text=True, check=True)
+    return np.array(json.loads(result.stdout), dtype=np.float64)
+
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+
+
+@pytest.mark.parametrize('smoothness', [0.005, 0.05, 0.37, 1.0])
+def test_smooth_is_bit_identical_to_the_frontend(smoothness):
+    rng = np.random.default_rng(0)
+    rows = np.round(np.cumsum(rng.normal(size=(4, 120)), axis=1), 1)
+    # Zeros take the `|| d.y` fallback of the outer neighbours
+    rows[:, rng.choice(120, size=15, replace=False)] = 0.0
+    expected = js_interpolate(rows.tolist(), smoothness)
+    assert np.array_equal(smooth(rows, smoothness), expected)
+    assert all(np.array_equal(smooth(row, smoothness), row_expected) for row, row_expected in zip(rows, expected))
+
+
+@pytest.mark.parametrize('length', [1, 2, 3, 4, 5])
+def test_short_curves_match_the_frontend(length):
+    row = [3.0, 0.0, -1.25, 7.5, 2.0][:length]
+    assert np.array_equal(smooth(row, 0.1), js_interpolate([row], 0.1)[0])
+
+
+def test_engine_matches_the_frontend_on_dataset_curves(registry):
+    engine = SmoothingEngine(registry)
+    names = registry.names[:3]
+    engine.precompute(names)
+    for smoothness in (0.05, 0.5, 0.62):
+        # 0.62 is off the ladder and continues from the cached 0.6 level
+        expected = js_interpolate([registry.curve(name)[2].tolist() for name in names], smoothness)
+        for name, row_expected in zip(names, expected):
+            assert np.array_equal(engine.curve(name, smoothness)[2], row_expected)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from scipy.fft import rfft
+from scipy.signal import get_window
+from modules.Spectral_Match import spectral_profile, spectral_search
+
+
+def brute_profile(query, series, window, hop):
+    # Magnitude spectrum of every frame computed with its own FFT
+    m = len(query)
+    taper = get_window(window, m)
+    query_spectrum = np.abs(rfft(query * taper))
+    return np.array([
+        np.linalg.norm(np.abs(rfft(series[start:start + m] * taper)) - query_spectrum)
+        for start in range(0, len(series) - m + 1, hop)
+    ])
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('window', ['boxcar', 'hann'])
+@pytest.mark.parametrize('hop', [1, 3])
+def test_spectral_profile_matches_brute_force(seed, window, hop):
+    rng = np.random.default_rng(seed)
+    query = rng.normal(size=16)
+    series = np.cumsum(rng.normal(size=300)) + 50
+    assert np.allclose(spectral_profile(query, series, window=window, hop=hop),
+                       brute_profile(query, series, window, hop), atol=1e-6)
+
+
+def test_frames_crossing_gaps_are_skipped():
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=16)
+    series = np.cumsum(rng.normal(size=100))
+    series[40] = np.nan
+    profile = spectral_profile(query, series)
+    starts = np.arange(len(profile))
+    crossing = (starts <= 40) & (starts + 16 > 40)
+    assert np.all(np.isinf(profile[crossing]))
+    assert np.allclose(profile[~crossing], brute_profile(query, np.nan_to_num(series), 'boxcar', 1)[~crossing])
+
+
+def test_spectral_search_ranks_every_frame():
+    rng = np.random.default_rng(1)
+    query = rng.normal(size=12)
+    curves = [(f'c{k}', np.cumsum(rng.normal(size=60))) for k in range(3)]
+    expected = sorted(
+        (distance, name, start)
+        for name, series in curves
+        for start, distance in enumerate(brute_profile(query, series, 'hann', 1))
+    )
+    results = spectral_search(query, curves, window='hann', top_k=10)
+    assert [(name, start) for name, start, _ in results] == [(name, start) for _, name, start in expected[:10]]
+    assert np.allclose([distance for _, _, distance in results], [distance for distance, _, _ in expected[:10]])
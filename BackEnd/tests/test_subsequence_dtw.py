@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from modules.Subsequence_DTW import spring_profiles, spring_search
+
+
+def brute_dtw(a, b):
+    # Textbook O(n * m) DTW with |a - b| cost
+    cost = np.full((len(a) + 1, len(b) + 1), np.inf)
+    cost[0, 0] = 0
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            cost[i, j] = abs(a[i - 1] - b[j - 1]) + min(cost[i - 1, j - 1], cost[i - 1, j], cost[i, j - 1])
+    return cost[len(a), len(b)]
+
+
+def brute_profile(query, series):
+    # Best DTW distance over every subsequence ending at each position
+    profile = np.full(len(series), np.inf)
+    for end in range(len(series)):
+        for start in range(end + 1):
+            segment = series[start:end + 1]
+            if not np.isnan(segment).any():
+                profile[end] = min(profile[end], brute_dtw(query, segment))
+    return profile
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_spring_profiles_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    query = rng.normal(size=int(rng.integers(2, 7)))
+    batch = rng.normal(size=(3, int(rng.integers(10, 25))))
+    if seed % 2:
+        batch[1, rng.integers(batch.shape[1])] = np.nan
+    end_distance, end_start = spring_profiles(query, batch)
+    for series, distances, starts in zip(batch, end_distance, end_start):
+        assert np.allclose(distances, brute_profile(query, series))
+        # The reported start realises the reported distance
+        for end in np.flatnonzero(np.isfinite(distances)):
+            assert np.isclose(brute_dtw(query, series[starts[end]:end + 1]), distances[end])
+
+
+def test_spring_search_finds_planted_matches():
+    rng = np.random.default_rng(0)
+    query = np.sin(np.linspace(0, 2 * np.pi, 12))
+    first, second = rng.normal(scale=3, size=80), rng.normal(scale=3, size=80)
+    first[20:32] = query
+    # A time-stretched copy is found by DTW at distance 0
+    second[50:74] = np.repeat(query, 2)
+    matches = spring_search(query, [('a', first), ('b', second)], top_k=2)
+    assert [(name, distance) for name, _, distance in matches] == [('a', 0.0), ('b', 0.0)]
+    # Either copy of the stretched query's first sample starts a zero-cost match
+    assert matches[0][1] == 20 and matches[1][1] in (50, 51)
+
+
+def test_spring_search_threshold_keeps_disjoint_matches():
+    rng = np.random.default_rng(1)
+    query = rng.normal(size=5)
+    curves = [(name, rng.normal(size=60)) for name in 'abc']
+    threshold = 4.0
+    matches = spring_search(query, curves, threshold=threshold)
+    profiles = {name: brute_profile(query, series) for name, series in curves}
+    assert matches and all(distance <= threshold for _, _, distance in matches)
+    assert [distance for _, _, distance in matches] == sorted(distance for _, _, distance in matches)
+    # The best match of every curve that has one under the threshold is reported
+    for name, profile in profiles.items():
+        if profile.min() <= threshold:
+            assert np.isclose(min(distance for match_name, _, distance in matches if match_name == name), profile.min())
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from conftest import run_analysis
+from modules import Trend_Index
+from modules.Combined_Match import analyze_similarity
+from modules.Smoothing import SmoothingEngine
+from modules.Trend_Index import TrendIndex, TrendQuery, pack_trend, packed_trend, popcount, window_counts
+
+
+def brute_counts(trend, drawing_trend):
+    # Window by window over the float trends; a window containing a gap is NaN
+    n_windows = max(len(trend) - len(drawing_trend) + 1, 0)
+    counts = {key: np.full(n_windows, np.nan) for key in ("mismatch", "dot", "window_sq")}
+    for start in range(n_windows):
+        window = trend[start:start + len(drawing_trend)]
+        if np.isnan(window).any():
+            continue
+        counts["mismatch"][start] = np.abs(window - drawing_trend).sum()
+        counts["dot"][start] = np.dot(window, drawing_trend)
+        counts["window_sq"][start] = np.dot(window, window)
+    return counts
+
+
+def random_trend(rng, length, gaps=0):
+    trend = rng.integers(-1, 2, size=length).astype(np.float64)
+    trend[rng.choice(length, size=gaps, replace=False)] = np.nan
+    return trend
+
+
+@pytest.mark.parametrize('seed', range(10))
+@pytest.mark.parametrize('drawing_length', [1, 5, 31, 32, 33, 70])
+def test_window_counts_match_brute_force(seed, drawing_length):
+    rng = np.random.default_rng(seed)
+    trend = random_trend(rng, int(rng.integers(60, 400)), gaps=seed % 4)
+    drawing_trend = random_trend(rng, drawing_length)
+    counts = window_counts(pack_trend(trend), len(trend), drawing_trend)
+    expected = brute_counts(trend, drawing_trend)
+    for key in expected:
+        assert np.array_equal(counts[key], expected[key], equal_nan=True), key
+
+
+def test_blocks_and_query_reuse_do_not_change_counts():
+    rng = np.random.default_rng(1)
+    trend, drawing_trend = random_trend(rng, 1000, gaps=3), random_trend(rng, 45)
+    words, query = pack_trend(trend), TrendQuery(drawing_trend)
+    expected = window_counts(words, len(trend), drawing_trend)
+    # max_words small enough to score one block of words at a time
+    for counts in (window_counts(words, len(trend), query), window_counts(words, len(trend), query, max_words=1)):
+        for key in expected:
+            assert np.array_equal(counts[key], expected[key], equal_nan=True)
+
+
+def test_drawing_longer_than_curve_has_no_windows():
+    trend = np.array([1.0, -1.0, 0.0])
+    counts = window_counts(pack_trend(trend), len(trend), np.ones(5))
+    assert all(len(values) == 0 for values in counts.values())
+
+
+def test_popcount_byte_fallback(monkeypatch):
+    words = np.random.default_rng(2).integers(0, 2 ** 63, size=(7, 5), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    expected = np.array([[bin(int(word)).count('1') for word in row] for row in words])
+    assert np.array_equal(popcount(words), expected)
+    monkeypatch.delattr(np, 'bitwise_count', raising=False)
+    assert np.array_equal(Trend_Index.popcount(words), expected)
+
+
+def test_trend_index_scan(registry):
+    index = TrendIndex()
+    names = registry.names[:4]
+    for name in names:
+        index.add(name, registry.curve(name)[2])
+    assert len(index) == 4 and names[0] in index
+    _, _, values = registry.curve(names[2])
+    drawing_trend = np.sign(np.diff(values[1000:1090]))
+    scanned = dict(index.scan(drawing_trend))
+    assert list(scanned) == names
+    expected = brute_counts(np.sign(np.diff(values)), drawing_trend)
+    for key in expected:
+        assert np.array_equal(scanned[names[2]][key], expected[key], equal_nan=True)
+    # The window the drawing was cut from matches exactly
+    assert scanned[names[2]]["mismatch"][1000] == 0
+
+
+def test_smoothing_engine_packs_ladder_trends_once(registry, sketches):
+    engine = SmoothingEngine(registry)
+    engine.precompute()
+    name = registry.names[5]
+    for smoothness in (0.0, 0.35, 0.62):
+        words, length = engine.trend(name, smoothness)
+        expected_words, expected_length = packed_trend(engine.curve(name, smoothness)[2])
+        assert np.array_equal(words, expected_words) and length == expected_length
+    # Ladder levels are packed at precompute and reused by every query
+    assert engine.trend(name, 0.35)[0] is engine.trend(name, 0.35)[0]
+    curves = engine.curves(registry.names, 0.35)
+    uploaded = [curves[position] for position in range(len(curves))]
+    for drawing in sketches[:3]:
+        assert (run_analysis(analyze_similarity(drawing, curves, 0.35))
+                == run_analysis(analyze_similarity(drawing, uploaded, 0.35)))
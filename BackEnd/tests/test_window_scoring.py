@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from scipy.signal import savgol_filter
+from conftest import run_analysis
+from modules.Combined_Match import MATCHER_PARAMS, analyze_similarity, prepare_sketch
+from modules.Window_Scoring import prescreen_windows, score_windows
+
+N_CURVES = 10
+
+
+def baseline_sketch(drawing):
+    # The sketch preprocessing of the original run_similarity_analysis
+    path_data = drawing[0]["path"]
+    x = [command[1] for command in path_data if len(command) > 2]
+    y = [command[2] for command in path_data if len(command) > 2]
+    y = np.max(y) - np.array(y)
+    x = np.array(x) * 1.5
+    y_smooth, x_smooth = savgol_filter(y, 11, 3), savgol_filter(x, 11, 3)
+    return np.sign(np.diff(y_smooth)), (y_smooth[-1] - y_smooth[0]) / (x_smooth[-1] - x_smooth[0])
+
+
+def baseline_windows(values, drawing_trend, drawing_slope):
+    """
+    The original per-window loop: every window's trend, slope, cosine (zero vectors
+    count as norm 1, as in sklearn), Euclidean distance and prescreen verdict.
+    """
+    trend = np.sign(np.diff(values))
+    m = len(drawing_trend)
+    drawing_norm = np.linalg.norm(drawing_trend) or 1.0
+    windows = []
+    for i in range(len(trend) - m + 1):
+        segment_trend = trend[i:i + m]
+        segment_values = values[i:i + m + 1]
+        segment_slope = (segment_values[-1] - segment_values[0]) / (len(segment_values) - 1)
+        cosine = np.dot(drawing_trend, segment_trend) / drawing_norm / (np.linalg.norm(segment_trend) or 1.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope_similarity = 1 - np.abs(drawing_slope - segment_slope) / max(np.abs(drawing_slope), np.abs(segment_slope))
+        windows.append({
+            "index": i,
+            "cosine": cosine,
+            "euclidean": np.linalg.norm(drawing_trend - segment_trend),
+            "slope": segment_slope,
+            "slope_similarity": slope_similarity,
+            "passes": np.sum(np.abs(segment_trend - drawing_trend)) / m < 1.5,
+        })
+    return windows
+
+
+def baseline_analysis(drawing, curves):
+    """
+    The original analysis on top of baseline_windows: threshold 0.8 or the top 10,
+    then overlap suppression per curve in score order (user-015).
+    """
+    drawing_trend, drawing_slope = baseline_sketch(drawing)
+    m = len(drawing_trend)
+    by_curve = [baseline_windows(values, drawing_trend, drawing_slope) for _, _, values in curves]
+    max_euclidean = max(window["euclidean"] for windows in by_curve for window in windows)
+    results = []
+    for curve_number, windows in enumerate(by_curve):
+        for window in windows:
+            if window["passes"]:
+                combined = (window["cosine"] + 1 - window["euclidean"] / max_euclidean + window["slope_similarity"]) / 3
+                results.append((curve_number, window["index"], combined))
+    key = lambda result: -np.inf if np.isnan(result[2]) else result[2]
+    hits = [result for result in results if result[2] >= 0.8]
+    candidates = hits or sorted(results, key=key, reverse=True)[:10]
+    kept, used = [], {}
+    for result in sorted(candidates, key=key, reverse=True):
+        if all(abs(result[1] - index) > m for index in used.get(result[0], [])):
+            kept.append(result)
+            used.setdefault(result[0], []).append(result[1])
+    return sorted(kept) if hits else kept
+
+
+def test_window_scores_match_the_per_window_loop(registry, smoothing):
+    drawing = [{"path": [['M', 0, 0]] + [['L', i, -np.sin(i / 9) * 20] for i in range(1, 80)]}]
+    sketch = prepare_sketch(drawing)
+    for name in registry.names[:N_CURVES]:
+        _, _, values = smoothing.curve(name, 0.3)
+        expected = baseline_windows(values, sketch["trend"], sketch["slope"])
+        scores = score_windows(values, sketch["trend"], sketch["slope"])
+        for key in ("cosine", "euclidean", "slope", "slope_similarity"):
+            assert np.allclose(scores[key], [window[key] for window in expected], equal_nan=True)
+        indices, n_windows = prescreen_windows(values, sketch["trend"])
+        assert n_windows == len(expected)
+        assert indices.tolist() == [window["index"] for window in expected if window["passes"]]
+
+
+@pytest.mark.parametrize('sketch', range(4))
+def test_analysis_matches_the_per_window_loop(registry, smoothing, sketches, sketch):
+    curves = smoothing.curves(registry.names[:N_CURVES], 0.3)
+    rows = run_analysis(analyze_similarity(sketches[sketch], curves, 0.3, MATCHER_PARAMS))
+    expected = baseline_analysis(sketches[sketch], curves)
+    assert [(row["Hcn"], row["StartIndex"]) for row in rows] == [(curves[c][0], i) for c, i, _ in expected]
+    assert np.allclose([row["CombinedSimilarity"] for row in rows], [combined for _, _, combined in expected])
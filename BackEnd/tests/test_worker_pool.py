@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from conftest import run_analysis
+from modules.Combined_Match import analyze_similarity
+from modules.Smoothing import SmoothingEngine
+from modules.Worker_Pool import CurvePool, _worker
+
+
+def smoothing_state(values, position):
+    # Run in a worker: the curve it was given and how many levels it had to smooth itself
+    return values.copy(), len(_worker["smoothing"]._arrays)
+
+
+@pytest.fixture(scope='module')
+def pool(registry):
+    engine = SmoothingEngine(registry)
+    engine.precompute()
+    pool = CurvePool(registry, processes=2, smoothing=engine)
+    pool.start()
+    yield pool
+    pool.close()
+
+
+def test_workers_read_the_shared_ladder(pool, smoothing, registry):
+    names = registry.names[:6]
+    for smoothness in (0.3, 0.65):
+        results = dict(pool.map(smoothing_state, names, smoothness))
+        for position, name in enumerate(names):
+            values, smoothed_levels = results[position]
+            assert np.array_equal(values, smoothing.curve(name, smoothness)[2])
+            # Ladder levels come from shared memory; workers smooth nothing themselves
+            assert smoothed_levels == 0
+    # Off the ladder, workers continue from the nearest shared level and agree bit for bit
+    results = dict(pool.map(smoothing_state, names, 0.62))
+    assert all(np.array_equal(results[position][0], smoothing.curve(name, 0.62)[2])
+               for position, name in enumerate(names))
+
+
+def test_pool_matches_in_process_analysis(pool, smoothing, registry, sketches):
+    names = registry.names
+    for drawing in sketches[:4]:
+        for smoothness in (0.0, 0.4):
+            curves = smoothing.curves(names, smoothness)
+            expected = run_analysis(analyze_similarity(drawing, curves, smoothness))
+            assert run_analysis(analyze_similarity(drawing, curves, smoothness, pool=pool)) == expected
@@ -0,0 +1,23 @@
+import os
+import sys
+import scipy.io
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'BackEnd'))
+from modules.Dataset_Registry import save_store
+
+# Number of times the curves are repeated (100 gives the same data as ChangeDateToJson_100.py)
+REPEAT = 1
+# np.float32 halves the store size
+DTYPE = np.float64
+
+# Load data from MATLAB file
+mat_data = scipy.io.loadmat("hcnData.mat")
+hcn_data = np.tile(mat_data['hcn'], (REPEAT, 1))
+time_data = mat_data['time'].ravel()
+
+# Curve names as the frontend builds them
+names = [f'{4043 + row}/hcn_ne001' for row in range(len(hcn_data))]
+
+# Save the columnar store; NaN stays NaN and is also recorded in valid.npy
+save_store("hcnData" if REPEAT == 1 else f"hcnData{REPEAT}", hcn_data, time_data, names, DTYPE)
@@ -0,0 +1,48 @@
+import axios from 'axios';
+
+// Binary columnar payloads, see BackEnd/modules/Response_Encoding.py: 'V4NC', the uint32
+// length of a JSON header, the header, then raw little-endian arrays on 8-byte boundaries.
+// The header holds the payload with every array replaced by {"$column": i}.
+export const COLUMNS_MIMETYPE = 'application/x-vis4nfad-columns';
+const COLUMN_TYPES = { '<f4': Float32Array, '<f8': Float64Array };
+
+const align = offset => offset + (-offset & 7);
+
+export function decodeColumns(buffer) {
+  const decoder = new TextDecoder();
+  if (decoder.decode(new Uint8Array(buffer, 0, 4)) !== 'V4NC') {
+    throw new Error('Not a columnar payload');
+  }
+  const headerLength = new DataView(buffer).getUint32(4, true);
+  const header = JSON.parse(decoder.decode(new Uint8Array(buffer, 8, headerLength)));
+  let offset = align(8 + headerLength);
+  // Typed arrays read the platform byte order, which is little-endian in every browser
+  const columns = header.columns.map(([dtype, length]) => {
+    const ColumnType = COLUMN_TYPES[dtype];
+    const column = Array.from(new ColumnType(buffer, offset, length));
+    offset = align(offset + length * ColumnType.BYTES_PER_ELEMENT);
+    return column;
+  });
+  const restore = value => {
+    if (Array.isArray(value)) return value.map(restore);
+    if (value !== null && typeof value === 'object') {
+      const keys = Object.keys(value);
+      if (keys.length === 1 && keys[0] === '$column') return columns[value.$column];
+      return Object.fromEntries(keys.map(key => [key, restore(value[key])]));
+    }
+    return value;
+  };
+  return restore(header.payload);
+}
+
+// GET a payload, preferring the binary format; the server falls back to JSON
+export async function getPayload(url) {
+  const response = await axios.get(url, {
+    responseType: 'arraybuffer',
+    headers: { Accept: `${COLUMNS_MIMETYPE}, application/json;q=0.9` },
+  });
+  const contentType = response.headers['content-type'] || '';
+  return contentType.startsWith(COLUMNS_MIMETYPE)
+    ? decodeColumns(response.data)
+    : JSON.parse(new TextDecoder().decode(response.data));
+}
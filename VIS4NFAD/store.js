@@ -1,5 +1,6 @@
 import { createStore } from 'vuex';
 import axios from 'axios';
+import { getPayload } from './src/wire.js';
 
 export const store = createStore({
   state: {
@@ -8,6 +9,9 @@ export const store = createStore({
     smoothness: 0.0,
     isProcessing: false,
     progress: 0,
+    jobId: null,
+    topkSeq: 0, // number of the last streamed top-k update applied to tableData
+    clientId: Math.random().toString(36).slice(2), // this tab; its new query supersedes its running one
     tableData: [],
   },
   mutations: {
@@ -38,26 +42,63 @@ export const store = createStore({
     setProgress(state, progress) {
       state.progress = progress;
     },
+    setJobId(state, jobId) {
+      state.jobId = jobId;
+    },
     setTableData(state, tableData) {
       state.tableData = tableData;
     },
     clearTableData(state) {
       state.tableData = [];
+      state.topkSeq = 0;
+    },
+    applyTopkUpdate(state, { seq, snapshot, rows, added, removed }) {
+      // Best rows so far of the running job, kept ranked by combined similarity; a snapshot
+      // replaces them, an update changes the rows of the one before it
+      const current = snapshot ? rows : state.tableData.filter(row => !removed.includes(row.Key)).concat(added);
+      state.tableData = current.sort((a, b) => b.CombinedSimilarity - a.CombinedSimilarity);
+      state.topkSeq = seq;
     },
     updateSelectedSmoothedData(state, data) {
       state.selectedSmoothedData = data;
     },
   },
   actions: {
-    fetchData({ commit }) {
-      axios.get('http://127.0.0.1:5000/get_table_data')
-        .then(response => {
-          commit('setTableData', response.data);
+    fetchData({ commit, state }) {
+      if (!state.jobId) return;
+      // Rows reference their segment; its samples are fetched when a row is expanded
+      getPayload(`http://127.0.0.1:5000/jobs/${state.jobId}/results`)
+        .then(data => {
+          commit('setTableData', data.rows);
         })
         .catch(error => {
           console.error('Error fetching table data:', error);
         });
     },
+    cancelJob({ state }) {
+      // The job reports 'cancelled' through processing_complete once it has stopped
+      if (!state.jobId) return;
+      axios.post(`http://127.0.0.1:5000/jobs/${state.jobId}/cancel`)
+        .catch(error => {
+          console.error('Error cancelling job:', error);
+        });
+    },
+    async fetchSegment({ state }, row) {
+      // Time and measurement values of one result row, loaded once and kept on the row
+      if (!row.TimeValues && row.Row !== undefined) {
+        const data = await getPayload(`http://127.0.0.1:5000/jobs/${state.jobId}/results/${row.Row}`);
+        row.TimeValues = data.TimeValues;
+        row.MeasurementValues = data.MeasurementValues;
+      } else if (!row.TimeValues) {
+        // A streamed row of a running job: the server slices the segment from the job's smoothed curve
+        const data = await getPayload(
+          `http://127.0.0.1:5000/jobs/${state.jobId}/segment?hcn=${encodeURIComponent(row.Hcn)}` +
+          `&start=${row.StartIndex}&length=${row.Length}`);
+        row.TimeValues = data.TimeValues;
+        row.MeasurementValues = data.MeasurementValues;
+      }
+      return { TimeValues: row.TimeValues, MeasurementValues: row.MeasurementValues };
+    },
     updateHighlightedSegment({ commit }, payload) {
       commit('updateHighlightedSegment', payload);
     },